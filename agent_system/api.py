@@ -4,10 +4,11 @@ import logging
 from pathlib import Path
 from typing import Optional
 
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
 from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field, model_validator
+from pydantic import BaseModel, Field, ValidationError, model_validator
 import json
 import asyncio
 
@@ -345,8 +346,53 @@ async def health_check():
     }
 
 
+async def parse_query_request(http_request: Request) -> QueryRequest:
+    """
+    Read a QueryRequest from either a JSON body or a multipart/form-data body.
+    
+    The multipart form (sent by the RAG service when AGENT_STREAM_UPLOAD is on)
+    has one JSON "meta" part with every field except document_contents, followed
+    by one "documents" file part per document whose filename is the doc_id.
+    """
+    content_type = http_request.headers.get("content-type", "")
+    try:
+        if content_type.startswith("multipart/form-data"):
+            try:
+                form = await http_request.form()
+            except Exception as e:
+                raise HTTPException(status_code=400, detail=f"Invalid multipart body: {e}")
+            meta = form.get("meta")
+            if meta is None:
+                raise RequestValidationError([{
+                    "type": "missing",
+                    "loc": ("body", "meta"),
+                    "msg": "Field required",
+                    "input": None,
+                }])
+            if not isinstance(meta, str):
+                meta = (await meta.read()).decode("utf-8")
+            data = json.loads(meta)
+            documents = form.getlist("documents")
+            if documents:
+                data["document_contents"] = {
+                    upload.filename: (await upload.read()).decode("utf-8")
+                    for upload in documents
+                }
+            return QueryRequest.model_validate(data)
+        return QueryRequest.model_validate_json(await http_request.body())
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise RequestValidationError([{
+            "type": "json_invalid",
+            "loc": ("body",),
+            "msg": f"Invalid request body: {e}",
+            "input": None,
+        }])
+
+
 @app.post("/query/stream")
-async def process_query_stream(request: QueryRequest):
+async def process_query_stream(request: QueryRequest = Depends(parse_query_request)):
     """
     Process a user query with Server-Sent Events (SSE) streaming.
     
@@ -1,15 +1,37 @@
 """Database configuration and session management."""
+import uuid
+from typing import Any, Dict, List, Sequence
+from sqlalchemy import insert
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
 from .settings import settings
 
+def _connect_args() -> Dict[str, Any]:
+    """asyncpg connect args; pgBouncer transaction pooling cannot keep per-connection prepared statements."""
+    if not settings.DB_PGBOUNCER_TRANSACTION_MODE:
+        return {
+            # asyncpg 自身的预编译语句 LRU，以及 SQLAlchemy 方言层的 prepared statement 缓存
+            "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+            "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+        }
+    return {
+        "statement_cache_size": 0,
+        "prepared_statement_cache_size": 0,
+        # 同一个后端连接可能被多个客户端复用，语句名必须全局唯一
+        "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+    }
+
+
 # Create async engine
 engine = create_async_engine(
     settings.DATABASE_URL,
     pool_size=settings.DB_POOL_SIZE,
     max_overflow=settings.DB_MAX_OVERFLOW,
     pool_pre_ping=True,  # 检查连接是否有效，无效则重新创建
-    pool_recycle=3600,   # 每小时回收连接，防止数据库服务器关闭长时间空闲连接
+    pool_recycle=settings.DB_POOL_RECYCLE,  # 定期回收连接，防止数据库/pgBouncer 关闭长时间空闲连接
+    connect_args=_connect_args(),
+    insertmanyvalues_page_size=settings.DB_INSERTMANYVALUES_PAGE_SIZE,  # 批量插入每批行数
+    query_cache_size=settings.DB_QUERY_CACHE_SIZE,  # 编译缓存命中时跳过 SQL 编译
     echo=settings.DEBUG,
 )
 
@@ -20,16 +42,63 @@ AsyncSessionLocal = async_sessionmaker(
     expire_on_commit=False,
 )
 
+# Session factory for background jobs: every statement commits on its own, so progress
+# writes (e.g. document status) are visible immediately without explicit commits
+BackgroundSessionLocal = async_sessionmaker(
+    engine.execution_options(isolation_level="AUTOCOMMIT"),
+    class_=AsyncSession,
+    expire_on_commit=False,
+)
+
+
+class _ModelBase:
+    # 仓储层只 flush 不 commit：INSERT/UPDATE 通过 RETURNING 直接取回服务端默认值
+    # （created_at / updated_at 等），无需再 refresh 一次
+    __mapper_args__ = {"eager_defaults": True}
+
+
 # Base class for all models
-Base = declarative_base()
+Base = declarative_base(cls=_ModelBase)
+
+
+class BulkInsertMixin:
+    """Mixin adding a multi-row bulk insert for tables created in batches."""
+    
+    @classmethod
+    async def bulk_insert(cls, session: AsyncSession, rows: Sequence[Dict[str, Any]]) -> List[Any]:
+        """
+        批量插入多行（ORM bulk INSERT ... RETURNING，insertmanyvalues 按页合并为多行 VALUES）
+        
+        主键 id 在 Python 侧预先生成；返回的实例与 rows 顺序一致，且已带上
+        created_at 等服务端默认值，可直接序列化。
+        不会提交事务，由调用方决定何时 commit。
+        
+        Args:
+            session: 数据库会话
+            rows: 列名到值的字典列表
+            
+        Returns:
+            插入的模型实例列表（与 rows 顺序一致）
+        """
+        if not rows:
+            return []
+        rows = [row if row.get("id") is not None else {**row, "id": uuid.uuid4()} for row in rows]
+        result = await session.scalars(
+            insert(cls).returning(cls, sort_by_parameter_order=True),
+            rows
+        )
+        return list(result.all())
 
 
 async def get_db():
-    """Dependency for getting database session."""
+    """
+    Dependency for getting database session.
+    
+    One transaction per request: repositories only flush, the transaction commits
+    once when the endpoint returns and rolls back if it raises.
+    """
     async with AsyncSessionLocal() as session:
-        try:
+        async with session.begin():
             yield session
-        finally:
-            await session.close()
 
 
@@ -43,6 +43,7 @@ async def list_activation_codes(
     is_active: Optional[bool] = Query(None, description="Filter by active status"),
     page: int = Query(1, ge=1, description="Page number"),
     page_size: int = Query(20, ge=1, le=100, description="Page size"),
+    cursor: Optional[str] = Query(None, description="Keyset cursor (next_cursor of the previous page)"),
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
@@ -53,7 +54,8 @@ async def list_activation_codes(
         type=type,
         is_active=is_active,
         page=page,
-        page_size=page_size
+        page_size=page_size,
+        cursor=cursor
     )
     return result
 
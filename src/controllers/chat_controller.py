@@ -1,7 +1,8 @@
 """
 聊天会话控制器
 """
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 from typing import List, Optional
@@ -9,9 +10,11 @@ from uuid import UUID
 
 from config.database import get_db
 from middlewares.auth import get_current_user
+from models.chat_session import ChatSession
 from models.user import User
 from repositories.chat_repository import ChatRepository
 from services.chat_service import ChatService
+from utils.pagination import encode_cursor, next_cursor, parse_cursor
 
 
 router = APIRouter(prefix="/chat", tags=["Chat"])
@@ -41,28 +44,35 @@ class UpdateConfigRequest(BaseModel):
 async def list_sessions(
     page: int = 1,
     page_size: int = 50,
+    cursor: Optional[str] = None,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """获取用户的所有聊天会话"""
+    """获取用户的所有聊天会话（传回 nextCursor 作为 cursor 即按 keyset 翻页）"""
     chat_repo = ChatRepository(db)
     chat_service = ChatService(chat_repo)
     
-    sessions = await chat_service.list_sessions(current_user.id, page, page_size)
+    sessions = await chat_service.list_sessions(current_user.id, page, page_size, parse_cursor(cursor))
     
-    # 为每个会话获取统计信息
+    # 为每个会话获取统计信息（相对时间已由数据库计算）
     sessions_with_stats = []
     for session in sessions:
-        session_dict = session.to_dict(include_messages=False)
+        session_dict = ChatSession.row_to_dict(session, timestamp=session.relative_time)
         # 获取统计信息
         stats = await chat_repo.get_session_stats(session.id)
         session_dict.update(stats)
         sessions_with_stats.append(session_dict)
     
+    next_page_cursor = None
+    if len(sessions) == page_size:
+        last_session = sessions[-1]
+        next_page_cursor = encode_cursor(last_session.updated_at, last_session.id)
+    
     return {
         "sessions": sessions_with_stats,
         "page": page,
-        "pageSize": page_size
+        "pageSize": page_size,
+        "nextCursor": next_page_cursor
     }
 
 
@@ -159,18 +169,25 @@ async def delete_session(
 @router.get("/sessions/{session_id}/messages")
 async def get_messages(
     session_id: UUID,
+    limit: int = Query(200, ge=1, le=500),
+    cursor: Optional[str] = None,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """获取会话的所有消息"""
+    """获取会话消息（按时间正序分页，传回 nextCursor 作为 cursor 继续获取，为 null 时已取完）"""
     chat_repo = ChatRepository(db)
     chat_service = ChatService(chat_repo)
     
-    messages = await chat_service.get_messages(session_id, current_user.id)
+    session = await chat_service.get_session(session_id, current_user.id)
+    if not session:
+        return {"messages": [], "nextCursor": None}
     
-    return {
-        "messages": [msg.to_dict() for msg in messages]
-    }
+    messages = await chat_service.list_messages(session_id, limit, parse_cursor(cursor))
+    # to_dict 已只含 JSON 原生类型，直接交给 orjson
+    return ORJSONResponse({
+        "messages": [msg.to_dict() for msg in messages],
+        "nextCursor": next_cursor(messages, limit, "created_at"),
+    })
 
 
 @router.post("/sessions/{session_id}/messages")
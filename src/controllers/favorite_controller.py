@@ -1,5 +1,6 @@
 """Favorite API endpoints."""
 from fastapi import APIRouter, Depends, Query
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from config.database import get_db
 from middlewares.auth import get_current_user
@@ -43,12 +44,13 @@ async def list_favorite_knowledge_bases(
     """List favorite knowledge bases."""
     service = FavoriteService(db)
     items, total = await service.list_favorite_kbs(str(current_user.id), page, pageSize)
-    return {
+    # 列表项已只含 JSON 原生类型，直接交给 orjson，跳过 jsonable_encoder 的逐值遍历
+    return ORJSONResponse({
         "total": total,
         "page": page,
         "pageSize": pageSize,
         "items": items
-    }
+    })
 
 
 # ============ Document Favorites ============
@@ -86,12 +88,13 @@ async def list_favorite_documents(
     """List favorite documents."""
     service = FavoriteService(db)
     items, total = await service.list_favorite_docs(str(current_user.id), page, pageSize)
-    return {
+    # 列表项已只含 JSON 原生类型，直接交给 orjson，跳过 jsonable_encoder 的逐值遍历
+    return ORJSONResponse({
         "total": total,
         "page": page,
         "pageSize": pageSize,
         "items": items
-    }
+    })
 
 
 # ============ Batch Check ============
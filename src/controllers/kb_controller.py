@@ -1,5 +1,6 @@
 """Knowledge Base API endpoints."""
 from fastapi import APIRouter, Depends, Query, UploadFile, File, BackgroundTasks, HTTPException, status
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, List
 from config.database import get_db
@@ -9,6 +10,7 @@ from services.kb_service import KnowledgeBaseService
 from services.document_service import DocumentService
 from services.search_service import SearchService
 from schemas.schemas import UpdateKBVisibilityRequest, ShareToOrgsRequest
+from utils.pagination import parse_cursor
 
 router = APIRouter(prefix="/kb", tags=["Knowledge Base"])
 
@@ -140,13 +142,19 @@ async def list_documents(
     kbId: str,
     page: int = Query(1, ge=1),
     pageSize: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """List documents in knowledge base."""
+    """List documents in knowledge base (pass nextCursor back as cursor for keyset paging)."""
     service = DocumentService(db)
-    items, total = await service.list_documents(kbId, str(current_user.id), page, pageSize)
-    return {"total": total, "page": page, "pageSize": pageSize, "items": items}
+    items, total, next_page_cursor = await service.list_documents(
+        kbId, str(current_user.id), page, pageSize, parse_cursor(cursor)
+    )
+    # to_dict 已只含 JSON 原生类型，直接交给 orjson，跳过 jsonable_encoder 的逐值遍历
+    return ORJSONResponse({
+        "total": total, "page": page, "pageSize": pageSize, "items": items, "nextCursor": next_page_cursor
+    })
 
 
 @router.get("/{kbId}/documents/{docId}/status")
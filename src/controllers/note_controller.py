@@ -1,5 +1,6 @@
 """Notes API endpoints."""
 from fastapi import APIRouter, Depends, Query
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, List
 from config.database import get_db
@@ -7,6 +8,7 @@ from schemas.schemas import CreateNoteRequest, UpdateNoteRequest, NoteItem, Note
 from services.note_service import NoteService
 from middlewares.auth import get_current_user
 from models.user import User
+from utils.pagination import parse_cursor
 
 router = APIRouter(prefix="/notes", tags=["Notes"])
 
@@ -65,15 +67,26 @@ async def list_notes(
     query: Optional[str] = Query(None),
     page: int = Query(1, ge=1),
     pageSize: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+    includeTotal: bool = Query(False),
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """List notes with pagination."""
+    """
+    List notes with pagination (pass nextCursor back as cursor for keyset paging).
+    
+    total is only counted when includeTotal=true; otherwise it is null and
+    hasMore tells whether another page follows.
+    """
     service = NoteService(db)
-    items, total = await service.list_notes(
-        str(current_user.id), folderId, query, page, pageSize
+    items, total, has_more, next_page_cursor = await service.list_notes(
+        str(current_user.id), folderId, query, page, pageSize, parse_cursor(cursor), includeTotal
     )
-    return {"total": total, "page": page, "pageSize": pageSize, "items": items}
+    # to_dict 已只含 JSON 原生类型，直接交给 orjson，跳过 jsonable_encoder 的逐值遍历
+    return ORJSONResponse({
+        "total": total, "page": page, "pageSize": pageSize, "items": items,
+        "hasMore": has_more, "nextCursor": next_page_cursor
+    })
 
 
 @router.get("/{noteId}", response_model=NoteItem)
@@ -2,7 +2,7 @@
 import logging
 from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse
 from contextlib import asynccontextmanager
 
 from config.settings import settings
@@ -16,6 +16,7 @@ logging.basicConfig(
 from config.database import engine, Base
 from config.redis import get_redis_client, close_redis
 from utils.external_services import close_http_client
+from rag.agent_client import agent_client
 
 # Import controllers
 from controllers import (
@@ -51,6 +52,7 @@ async def lifespan(app: FastAPI):
     # Shutdown
     print("🛑 Shutting down...")
     await close_http_client()
+    await agent_client.close()
     await close_redis()
     await engine.dispose()
     print("✅ Cleanup completed")
@@ -61,6 +63,7 @@ app = FastAPI(
     title=settings.APP_NAME,
     version=settings.APP_VERSION,
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,  # orjson 在 C 中完成序列化，列表接口更快
     docs_url=f"{settings.API_PREFIX}/docs",
     redoc_url=f"{settings.API_PREFIX}/redoc",
     openapi_url=f"{settings.API_PREFIX}/openapi.json"
@@ -2,8 +2,18 @@
 -- Date: 2025-12-09
 -- Description: 为用户表添加等级、会员到期时间、激活历史等字段
 
--- 1. 添加用户名唯一约束和索引
-ALTER TABLE users ADD CONSTRAINT users_name_unique UNIQUE (name);
+-- 1. 添加用户名唯一约束和索引（约束已存在时跳过，保证可重复执行）
+DO $$
+BEGIN
+  IF NOT EXISTS (
+    SELECT 1 FROM pg_constraint
+     WHERE conname = 'users_name_unique'
+       AND conrelid = 'users'::regclass
+  ) THEN
+    ALTER TABLE users ADD CONSTRAINT users_name_unique UNIQUE (name);
+  END IF;
+END;
+$$;
 CREATE INDEX IF NOT EXISTS idx_users_name ON users(name);
 
 -- 2. 添加用户等级相关字段
@@ -0,0 +1,15 @@
+-- Migration: 为高频查询添加复合/部分索引
+-- Date: 2026-10-17
+-- Description: 广场热门知识库排序与收藏列表查询的索引优化
+
+-- 1. 公开知识库热门排序（部分索引，仅包含 visibility='public' 的行）
+CREATE INDEX IF NOT EXISTS idx_kb_public_hot
+    ON knowledge_bases (subscribers_count DESC, created_at DESC)
+    WHERE visibility = 'public';
+
+-- 2. 收藏列表：按 (user_id, item_type) 过滤并按 created_at DESC 排序
+CREATE INDEX IF NOT EXISTS idx_fav_user_type_created
+    ON favorites (user_id, item_type, created_at DESC);
+
+-- 新索引以 (user_id, item_type) 为前缀，完全覆盖旧索引
+DROP INDEX IF EXISTS idx_favorites_user_type;
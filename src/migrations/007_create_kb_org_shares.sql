@@ -0,0 +1,43 @@
+-- Migration: 知识库组织共享关系规范化
+-- Date: 2026-10-17
+-- Description: 新增 kb_org_shares(kb_id, org_id) 关联表，由触发器根据 knowledge_bases.shared_to_orgs 自动维护
+
+-- 1. 创建关联表
+CREATE TABLE IF NOT EXISTS kb_org_shares (
+    kb_id UUID NOT NULL REFERENCES knowledge_bases(id) ON DELETE CASCADE,
+    org_id UUID NOT NULL,
+    PRIMARY KEY (kb_id, org_id)
+);
+
+-- 2. 反向索引：按组织查知识库
+CREATE INDEX IF NOT EXISTS idx_kb_org_shares_org_kb ON kb_org_shares(org_id, kb_id);
+
+-- 3. 同步触发器：shared_to_orgs 变化时增量更新关联表
+CREATE OR REPLACE FUNCTION sync_kb_org_shares()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP = 'UPDATE' AND NEW.shared_to_orgs IS NOT DISTINCT FROM OLD.shared_to_orgs THEN
+    RETURN NEW;
+  END IF;
+  DELETE FROM kb_org_shares
+   WHERE kb_id = NEW.id
+     AND NOT (org_id = ANY(COALESCE(NEW.shared_to_orgs, '{}')));
+  INSERT INTO kb_org_shares (kb_id, org_id)
+  SELECT DISTINCT NEW.id, o FROM unnest(COALESCE(NEW.shared_to_orgs, '{}')) AS o
+  ON CONFLICT DO NOTHING;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_kb_org_shares_sync ON knowledge_bases;
+CREATE TRIGGER trg_kb_org_shares_sync
+  AFTER INSERT OR UPDATE OF shared_to_orgs ON knowledge_bases
+  FOR EACH ROW EXECUTE FUNCTION sync_kb_org_shares();
+
+-- 4. 回填已有数据
+INSERT INTO kb_org_shares (kb_id, org_id)
+SELECT DISTINCT id, unnest(shared_to_orgs) FROM knowledge_bases
+ON CONFLICT DO NOTHING;
+
+-- 5. 添加注释
+COMMENT ON TABLE kb_org_shares IS '知识库共享到组织的关联表（由 shared_to_orgs 触发器维护，只读）';
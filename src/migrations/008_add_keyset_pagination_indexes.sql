@@ -0,0 +1,15 @@
+-- Migration: keyset 分页索引
+-- Date: 2026-10-17
+-- Description: 会话 / 文档 / 激活码列表改为 (排序列, id) keyset 分页，索引与 ORDER BY 完全一致
+
+-- 1. 会话列表：WHERE user_id = ? ORDER BY updated_at DESC, id DESC
+CREATE INDEX IF NOT EXISTS idx_chat_sessions_user_updated
+    ON chat_sessions (user_id, updated_at DESC, id DESC);
+
+-- 2. 知识库文档列表：WHERE kb_id = ? ORDER BY created_at DESC, id DESC
+CREATE INDEX IF NOT EXISTS idx_kb_documents_kb_created
+    ON kb_documents (kb_id, created_at DESC, id DESC);
+
+-- 3. 激活码列表：ORDER BY created_at DESC, id DESC
+CREATE INDEX IF NOT EXISTS idx_activation_codes_created
+    ON activation_codes (created_at DESC, id DESC);
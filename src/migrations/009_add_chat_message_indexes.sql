@@ -0,0 +1,14 @@
+-- Migration: 聊天消息热路径索引
+-- Date: 2026-10-17
+-- Description: 消息列表 / 会话统计 / 删除最后一条 AI 回复改为索引查找，不再过滤扫描 + 排序
+
+-- 1. 会话消息按时间读取：WHERE session_id = ? ORDER BY created_at
+CREATE INDEX IF NOT EXISTS idx_chat_messages_session_created
+    ON chat_messages (session_id, created_at);
+
+-- 2. 最后一条 AI 回复：WHERE session_id = ? AND role = 'assistant' ORDER BY created_at DESC LIMIT 1
+CREATE INDEX IF NOT EXISTS idx_chat_messages_session_role_created
+    ON chat_messages (session_id, role, created_at DESC);
+
+-- 3. session_id 单列索引已被 (1) 的前缀覆盖
+DROP INDEX IF EXISTS ix_chat_messages_session_id;
@@ -0,0 +1,13 @@
+-- Migration: 知识库名称 / 描述搜索的 trigram 索引
+-- Date: 2026-10-17
+-- Description: ILIKE '%q%' 前导通配符无法使用 B-tree 索引，改用 pg_trgm GIN 索引避免全表扫描
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- 1. 名称搜索（我的知识库 / 广场 / 可见知识库列表）
+CREATE INDEX IF NOT EXISTS idx_kb_name_trgm
+    ON knowledge_bases USING gin (name gin_trgm_ops);
+
+-- 2. 描述搜索（广场 / 可见知识库列表，与名称 OR 组合，走 BitmapOr）
+CREATE INDEX IF NOT EXISTS idx_kb_description_trgm
+    ON knowledge_bases USING gin (description gin_trgm_ops);
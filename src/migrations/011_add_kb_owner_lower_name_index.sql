@@ -0,0 +1,6 @@
+-- Migration: 知识库同名检查索引
+-- Date: 2026-10-17
+-- Description: check_name_exists 按 owner_id + lower(name) 查找，函数索引让等值比较走索引查找而非扫描
+
+CREATE INDEX IF NOT EXISTS idx_kb_owner_lower_name
+    ON knowledge_bases (owner_id, lower(name));
@@ -0,0 +1,11 @@
+-- Migration: 我的知识库列表排序索引
+-- Date: 2026-10-17
+-- Description: list_kbs 按 owner_id 过滤并按 created_at DESC 分页，复合索引让分页变成索引范围扫描
+-- （广场列表的 visibility='public' ORDER BY subscribers_count DESC, created_at DESC 已由 006 的 idx_kb_public_hot 覆盖）
+
+-- 1. WHERE owner_id = ? ORDER BY created_at DESC
+CREATE INDEX IF NOT EXISTS idx_kb_owner_created
+    ON knowledge_bases (owner_id, created_at DESC);
+
+-- 2. owner_id 单列索引已被 (1) 的前缀覆盖
+DROP INDEX IF EXISTS ix_knowledge_bases_owner_id;
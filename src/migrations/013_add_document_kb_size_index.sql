@@ -0,0 +1,10 @@
+-- Migration: 用户存储用量统计索引
+-- Date: 2026-10-17
+-- Description: calculate_total_size 改为 SUM(size) WHERE kb_id IN (用户的知识库)，覆盖索引支持 index-only scan，无需回表
+
+-- 1. (kb_id) INCLUDE (size)
+CREATE INDEX IF NOT EXISTS idx_kb_documents_kb_size
+    ON kb_documents (kb_id) INCLUDE (size);
+
+-- 2. kb_id 单列索引已被 (1) 覆盖
+DROP INDEX IF EXISTS ix_kb_documents_kb_id;
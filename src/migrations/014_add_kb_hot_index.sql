@@ -0,0 +1,11 @@
+-- Migration: 精选知识库排序索引
+-- Date: 2026-10-17
+-- Description: list_featured_kbs 按 subscribers_count DESC, created_at DESC 分页；管理员视图不带过滤条件，
+-- 普通用户视图包含组织共享知识库，都用不上 idx_kb_public_hot 这个 visibility='public' 部分索引
+
+-- 1. 全表热度排序
+CREATE INDEX IF NOT EXISTS idx_kb_hot
+    ON knowledge_bases (subscribers_count DESC, created_at DESC);
+
+-- 2. subscribers_count 单列索引已被 (1) 的前缀覆盖
+DROP INDEX IF EXISTS ix_knowledge_bases_subscribers_count;
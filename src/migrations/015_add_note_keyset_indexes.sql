@@ -0,0 +1,14 @@
+-- Migration: 笔记列表 keyset 分页索引
+-- Date: 2026-10-17
+-- Description: 笔记列表改为 (updated_at, id) keyset 分页，索引与 ORDER BY 完全一致
+
+-- 1. WHERE user_id = ? ORDER BY updated_at DESC, id DESC
+CREATE INDEX IF NOT EXISTS idx_notes_user_updated
+    ON notes (user_id, updated_at DESC, id DESC);
+
+-- 2. WHERE user_id = ? AND folder_id = ? ORDER BY updated_at DESC, id DESC
+CREATE INDEX IF NOT EXISTS idx_notes_user_folder_updated
+    ON notes (user_id, folder_id, updated_at DESC, id DESC);
+
+-- 3. user_id 单列索引已被 (1) 的前缀覆盖
+DROP INDEX IF EXISTS ix_notes_user_id;
@@ -0,0 +1,6 @@
+-- Migration: 用户名不区分大小写检查索引
+-- Date: 2026-10-17
+-- Description: check_username_available 按 lower(name) 查找，原 name 唯一索引用不上，函数索引让它变成索引查找
+
+CREATE INDEX IF NOT EXISTS idx_users_lower_name
+    ON users (lower(name));
@@ -0,0 +1,16 @@
+-- Migration: 组织成员覆盖索引
+-- Date: 2026-10-17
+-- Description: 按 user_id 查用户所在组织只读 org_id / role，INCLUDE 后可走 index-only scan；
+--              organizations 的部分索引让 is_deleted = false 的判断也不必回表
+
+-- 1. WHERE user_id = ? 读取 org_id, role
+CREATE INDEX IF NOT EXISTS idx_org_members_user_covering
+    ON organization_members (user_id) INCLUDE (org_id, role);
+
+-- 2. JOIN organizations ON id = ? AND is_deleted = false
+CREATE INDEX IF NOT EXISTS idx_organizations_active_id
+    ON organizations (id) WHERE is_deleted = false;
+
+-- 3. user_id 单列索引已被 (1) 覆盖
+DROP INDEX IF EXISTS idx_org_members_user;
+DROP INDEX IF EXISTS ix_organization_members_user_id;
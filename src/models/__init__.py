@@ -2,7 +2,7 @@
 from .user import User
 from .note import Note, NoteFolder
 from .favorite import Favorite
-from .knowledge_base import KnowledgeBase, KnowledgeBaseSubscription
+from .knowledge_base import KnowledgeBase, KnowledgeBaseSubscription, KBOrgShare
 from .document import Document
 from .chat_session import ChatSession, ChatMessage
 from .activation_code import ActivationCode
@@ -16,6 +16,7 @@ __all__ = [
     "Favorite",
     "KnowledgeBase",
     "KnowledgeBaseSubscription",
+    "KBOrgShare",
     "Document",
     "ChatSession",
     "ChatMessage",
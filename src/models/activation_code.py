@@ -1,8 +1,8 @@
 """Activation code model for membership activation."""
-from sqlalchemy import Column, String, Integer, DateTime, Boolean, ForeignKey, func
+from sqlalchemy import Column, String, Integer, DateTime, Boolean, ForeignKey, Index, func
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
-from config.database import Base
+from config.database import Base, BulkInsertMixin
 import uuid
 from datetime import datetime, timezone, timedelta
 from typing import Optional
@@ -10,7 +10,7 @@ import secrets
 import string
 
 
-class ActivationCode(Base):
+class ActivationCode(Base, BulkInsertMixin):
     """Activation code model for membership."""
     __tablename__ = "activation_codes"
     
@@ -28,49 +28,79 @@ class ActivationCode(Base):
     # 关系
     creator = relationship("User", foreign_keys=[created_by])
     
+    __table_args__ = (
+        # 激活码列表 keyset 分页：ORDER BY created_at DESC, id DESC
+        Index('idx_activation_codes_created', created_at.desc(), id.desc()),
+    )
+    
     def to_dict(self):
         """Convert to dictionary."""
+        return ActivationCode.row_to_dict(self)
+    
+    @classmethod
+    def columns_for_list(cls) -> tuple:
+        """
+        激活码列表所需的列
+        
+        select(*ActivationCode.columns_for_list()) 返回轻量 Row 元组而不是 ORM 实例，再交给 row_to_dict 序列化。
+        """
+        return (
+            cls.id, cls.code, cls.type, cls.duration_days, cls.max_usage, cls.used_count,
+            cls.created_by, cls.created_at, cls.expires_at, cls.is_active,
+        )
+    
+    @staticmethod
+    def row_to_dict(row) -> dict:
+        """ActivationCode 实例或 columns_for_list() Row 转字典"""
         return {
-            "id": str(self.id),
-            "code": self.code,
-            "type": self.type,
-            "duration_days": self.duration_days,
-            "max_usage": self.max_usage,
-            "used_count": self.used_count,
-            "created_by": str(self.created_by) if self.created_by else None,
-            "created_at": self.created_at.isoformat() if self.created_at else None,
-            "expires_at": self.expires_at.isoformat() if self.expires_at else None,
-            "is_active": self.is_active,
-            "is_valid": self.is_valid(),
+            "id": str(row.id),
+            "code": row.code,
+            "type": row.type,
+            "duration_days": row.duration_days,
+            "max_usage": row.max_usage,
+            "used_count": row.used_count,
+            "created_by": str(row.created_by) if row.created_by else None,
+            "created_at": row.created_at.isoformat() if row.created_at else None,
+            "expires_at": row.expires_at.isoformat() if row.expires_at else None,
+            "is_active": row.is_active,
+            "is_valid": ActivationCode._row_is_valid(row),
         }
     
     # === 辅助方法 ===
     
+    @staticmethod
+    def _expires_at_aware(expires_at: Optional[datetime]) -> Optional[datetime]:
+        """过期时间补齐时区（naive 视为 UTC）"""
+        if expires_at is None or expires_at.tzinfo is not None:
+            return expires_at
+        return expires_at.replace(tzinfo=timezone.utc)
+    
     def _get_expires_at_aware(self) -> Optional[datetime]:
         """获取带时区的过期时间"""
-        if self.expires_at is None:
-            return None
-        if self.expires_at.tzinfo is None:
-            return self.expires_at.replace(tzinfo=timezone.utc)
-        return self.expires_at
+        return ActivationCode._expires_at_aware(self.expires_at)
     
-    def is_valid(self) -> bool:
-        """检查激活码是否有效（综合检查）"""
+    @staticmethod
+    def _row_is_valid(row) -> bool:
+        """检查激活码（实例或 Row）是否有效（综合检查）"""
         # 检查是否被作废
-        if not self.is_active:
+        if not row.is_active:
             return False
         
         # 检查是否过期
-        expires_at = self._get_expires_at_aware()
+        expires_at = ActivationCode._expires_at_aware(row.expires_at)
         if expires_at and expires_at <= datetime.now(timezone.utc):
             return False
         
         # 检查使用次数
-        if self.used_count >= self.max_usage:
+        if row.used_count >= row.max_usage:
             return False
         
         return True
     
+    def is_valid(self) -> bool:
+        """检查激活码是否有效（综合检查）"""
+        return ActivationCode._row_is_valid(self)
+    
     def can_use(self) -> tuple[bool, Optional[str]]:
         """
         检查激活码是否可以使用
@@ -1,15 +1,33 @@
 """
 聊天会话模型
 """
+from bisect import bisect_right
 from datetime import datetime
-from sqlalchemy import Column, String, DateTime, ForeignKey, Text, Integer, ARRAY
+import logging
+import time
+from types import MappingProxyType
+from typing import Optional
+from sqlalchemy import Column, String, DateTime, ForeignKey, Text, Integer, ARRAY, Index, case, cast, func, literal
 from sqlalchemy.dialects.postgresql import UUID, JSONB
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.orm.exc import DetachedInstanceError
 from sqlalchemy.orm import relationship
 import uuid
 
 from config.database import Base
 
 
+logger = logging.getLogger(__name__)
+
+# 会话未设置 config 时共享的只读空配置
+_EMPTY_CONFIG = MappingProxyType({})
+
+# 相对时间分桶：阈值（秒）与对应的 (除数, 单位)
+_EPOCH = datetime(1970, 1, 1)
+_TIMESTAMP_THRESHOLDS = (60, 3600, 86400)
+_TIMESTAMP_UNITS = ((1, None), (60, "分钟"), (3600, "小时"), (86400, "天"))
+
+
 class ChatSession(Base):
     """聊天会话"""
     __tablename__ = "chat_sessions"
@@ -33,53 +51,75 @@ class ChatSession(Base):
     # }
     
     # 关系（使用 lazy loading）
-    messages = relationship("ChatMessage", back_populates="session", cascade="all, delete-orphan", lazy="select")
+    messages = relationship(
+        "ChatMessage", back_populates="session", cascade="all, delete-orphan",
+        lazy="select", order_by="ChatMessage.created_at"
+    )
     user = relationship("User", back_populates="chat_sessions", lazy="select")
 
-    def to_dict(self, include_messages=False):
-        """转换为字典"""
-        result = {
-            "id": str(self.id),
-            "title": self.title,
-            "lastMessage": "",
-            "timestamp": self._format_timestamp(self.updated_at),
-            "createdAt": self.created_at.isoformat(),
-            "updatedAt": self.updated_at.isoformat(),
-            "messageCount": 0,
-            "config": self.config or {}  # 添加配置信息
-        }
+    __table_args__ = (
+        # 会话列表 keyset 分页：WHERE user_id = ? AND (updated_at, id) < cursor ORDER BY updated_at DESC, id DESC
+        Index('idx_chat_sessions_user_updated', user_id, updated_at.desc(), id.desc()),
+    )
+
+    def to_dict(self, include_messages=False, now_ts: Optional[float] = None, timestamp: Optional[str] = None):
+        """
+        转换为字典
+        
+        Args:
+            include_messages: 是否访问 messages 关系统计最后一条消息
+            now_ts: 当前 UTC 时间戳；列表接口应在调用方计算一次后传入
+            timestamp: 数据库已算好的相对时间（见 RELATIVE_TIME_EXPR），传入时跳过 Python 计算
+        """
+        result = ChatSession.row_to_dict(self, now_ts, timestamp)
         
         # 只在明确需要时才访问关系属性
         if include_messages:
             try:
-                messages_list = list(self.messages)
-                if messages_list:
-                    last_message = messages_list[-1]
-                    result["lastMessage"] = last_message.content[:50]
-                    result["messageCount"] = len(messages_list)
-            except:
-                pass
+                # messages 已按 created_at 排序，直接索引，无需复制成新列表
+                messages = self.messages
+                if messages:
+                    result["lastMessage"] = messages[-1].content[:50]
+                    result["messageCount"] = len(messages)
+            except (DetachedInstanceError, InvalidRequestError) as e:
+                # messages 未预加载且无法懒加载（如异步会话 / 已分离实例）
+                logger.warning(f"ChatSession.to_dict: messages not loaded for session {self.id}: {e}")
         
         return result
     
-    @staticmethod
-    def _format_timestamp(dt: datetime) -> str:
-        """格式化时间戳为相对时间"""
-        now = datetime.utcnow()
-        diff = now - dt
+    @classmethod
+    def columns_for_list(cls) -> tuple:
+        """
+        会话列表所需的列
         
-        if diff.days > 7:
-            return f"{diff.days} 天前"
-        elif diff.days > 0:
-            return f"{diff.days} 天前"
-        elif diff.seconds >= 3600:
-            hours = diff.seconds // 3600
-            return f"{hours} 小时前"
-        elif diff.seconds >= 60:
-            minutes = diff.seconds // 60
-            return f"{minutes} 分钟前"
-        else:
+        select(*ChatSession.columns_for_list()) 返回轻量 Row 元组而不是 ORM 实例，再交给 row_to_dict 序列化。
+        """
+        return (cls.id, cls.title, cls.created_at, cls.updated_at, cls.config)
+    
+    @staticmethod
+    def row_to_dict(row, now_ts: Optional[float] = None, timestamp: Optional[str] = None) -> dict:
+        """ChatSession 实例或 columns_for_list() Row 转字典（不含消息统计）"""
+        return {
+            "id": str(row.id),
+            "title": row.title,
+            "lastMessage": "",
+            "timestamp": timestamp if timestamp is not None else ChatSession._format_timestamp(row.updated_at, now_ts),
+            "createdAt": row.created_at.isoformat(),
+            "updatedAt": row.updated_at.isoformat(),
+            "messageCount": 0,
+            "config": row.config if row.config is not None else _EMPTY_CONFIG  # 添加配置信息
+        }
+    
+    @staticmethod
+    def _format_timestamp(dt: datetime, now_ts: Optional[float] = None) -> str:
+        """格式化时间戳（naive UTC）为相对时间"""
+        if now_ts is None:
+            now_ts = time.time()
+        delta = int(now_ts - (dt - _EPOCH).total_seconds())
+        divisor, unit = _TIMESTAMP_UNITS[bisect_right(_TIMESTAMP_THRESHOLDS, delta)]
+        if unit is None:
             return "刚刚"
+        return f"{delta // divisor} {unit}前"
 
 
 class ChatMessage(Base):
@@ -87,7 +127,7 @@ class ChatMessage(Base):
     __tablename__ = "chat_messages"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    session_id = Column(UUID(as_uuid=True), ForeignKey("chat_sessions.id", ondelete="CASCADE"), nullable=False, index=True)
+    session_id = Column(UUID(as_uuid=True), ForeignKey("chat_sessions.id", ondelete="CASCADE"), nullable=False)
     role = Column(String(20), nullable=False)  # 'user' | 'assistant'
     content = Column(Text, nullable=False)
     thinking = Column(Text, nullable=True)  # AI 的思考过程
@@ -101,6 +141,13 @@ class ChatMessage(Base):
     # 关系
     session = relationship("ChatSession", back_populates="messages")
 
+    __table_args__ = (
+        # 按会话顺序读取消息 / 统计；前缀覆盖原 session_id 单列索引
+        Index('idx_chat_messages_session_created', session_id, created_at),
+        # delete_last_assistant_message：WHERE session_id = ? AND role = 'assistant' ORDER BY created_at DESC LIMIT 1
+        Index('idx_chat_messages_session_role_created', session_id, role, created_at.desc()),
+    )
+
     def to_dict(self):
         """转换为字典"""
         return {
@@ -113,3 +160,15 @@ class ChatMessage(Base):
             "documentSummaries": self.document_summaries  # 添加文档总结
         }
 
+
+# 数据库端计算的相对时间（与 ChatSession._format_timestamp 分桶一致），列表查询中作为附加列 SELECT
+_elapsed_seconds = cast(
+    func.extract('epoch', func.timezone('UTC', func.now()) - ChatSession.updated_at),
+    Integer,
+)
+RELATIVE_TIME_EXPR = case(
+    (_elapsed_seconds < 60, literal("刚刚")),
+    (_elapsed_seconds < 3600, func.concat(_elapsed_seconds // 60, " 分钟前")),
+    (_elapsed_seconds < 86400, func.concat(_elapsed_seconds // 3600, " 小时前")),
+    else_=func.concat(_elapsed_seconds // 86400, " 天前"),
+).label("relative_time")
@@ -1,5 +1,5 @@
 """Document database model."""
-from sqlalchemy import Column, String, Integer, DateTime, ForeignKey, func, BigInteger, Text
+from sqlalchemy import Column, String, Integer, DateTime, ForeignKey, Index, func, BigInteger, Text
 from sqlalchemy.dialects.postgresql import UUID
 from config.database import Base
 import uuid
@@ -18,7 +18,7 @@ class Document(Base):
     STATUS_FAILED = "failed"
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    kb_id = Column(UUID(as_uuid=True), ForeignKey("knowledge_bases.id", ondelete="CASCADE"), nullable=False, index=True)
+    kb_id = Column(UUID(as_uuid=True), ForeignKey("knowledge_bases.id", ondelete="CASCADE"), nullable=False)
     name = Column(String, nullable=False)
     size = Column(BigInteger, nullable=False, default=0)
     status = Column(String, nullable=False, default=STATUS_UPLOADING)
@@ -32,16 +32,40 @@ class Document(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
     
+    __table_args__ = (
+        # Document list keyset pagination: (kb_id) filter + (created_at, id) DESC ordering
+        Index('idx_kb_documents_kb_created', kb_id, created_at.desc(), id.desc()),
+        # Per-owner storage sum: SUM(size) WHERE kb_id IN (...) answered from the index alone
+        # (index-only scan); also serves plain kb_id lookups, replacing the single-column index
+        Index('idx_kb_documents_kb_size', kb_id, postgresql_include=['size']),
+    )
+    
     def to_dict(self):
         """Convert to dictionary."""
+        return Document.row_to_dict(self)
+    
+    @classmethod
+    def columns_for_list(cls) -> tuple:
+        """
+        Columns needed by list endpoints.
+        
+        select(*Document.columns_for_list()) yields lightweight Rows instead of ORM
+        instances (no identity map / instance state); serialize them with row_to_dict.
+        """
+        return (cls.id, cls.kb_id, cls.name, cls.size, cls.status, cls.chunk_count, cls.created_at)
+    
+    @staticmethod
+    def row_to_dict(row) -> dict:
+        """Convert a Document instance or a columns_for_list() Row to dictionary."""
+        created_at = row.created_at.isoformat()
         return {
-            "id": str(self.id),
-            "kbId": str(self.kb_id),
-            "name": self.name,
-            "size": self.size,
-            "status": self.status,
-            "chunkCount": self.chunk_count,
-            "uploadedAt": self.created_at.isoformat(),
-            "createdAt": self.created_at.isoformat(),  # Keep for compatibility
+            "id": str(row.id),
+            "kbId": str(row.kb_id),
+            "name": row.name,
+            "size": row.size,
+            "status": row.status,
+            "chunkCount": row.chunk_count,
+            "uploadedAt": created_at,
+            "createdAt": created_at,  # Keep for compatibility
         }
 
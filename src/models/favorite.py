@@ -26,7 +26,8 @@ class Favorite(Base):
     
     __table_args__ = (
         UniqueConstraint('user_id', 'item_type', 'item_id', name='uq_user_item_favorite'),
-        Index('idx_favorites_user_type', 'user_id', 'item_type'),
+        # 覆盖 (user_id, item_type) 过滤 + created_at DESC 排序的收藏列表查询
+        Index('idx_fav_user_type_created', user_id, item_type, created_at.desc()),
     )
     
     def to_dict(self):
@@ -1,9 +1,9 @@
 """Knowledge Base database model with visibility and organization sharing support."""
-from sqlalchemy import Column, String, Integer, DateTime, ForeignKey, Boolean, func, UniqueConstraint, ARRAY
+from sqlalchemy import Column, String, Integer, DateTime, ForeignKey, Boolean, func, UniqueConstraint, ARRAY, Index, text, DDL, event
 from sqlalchemy.dialects.postgresql import UUID
 from config.database import Base
 import uuid
-from typing import List, Optional
+from typing import FrozenSet, Iterable, Optional
 
 
 # 知识库分类常量
@@ -18,7 +18,7 @@ class KnowledgeBase(Base):
     __tablename__ = "knowledge_bases"
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    owner_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    owner_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     name = Column(String, nullable=False)
     description = Column(String, nullable=True)
     category = Column(String(50), nullable=False, default="其它", index=True)  # 知识库分类
@@ -28,7 +28,7 @@ class KnowledgeBase(Base):
     visibility = Column(String(20), nullable=False, default='private', index=True)  # private/organization/public
     shared_to_orgs = Column(ARRAY(UUID(as_uuid=True)), nullable=False, default=list)  # 共享到的组织ID列表
     
-    subscribers_count = Column(Integer, nullable=False, default=0, index=True)  # 订阅数
+    subscribers_count = Column(Integer, nullable=False, default=0)  # 订阅数
     view_count = Column(Integer, nullable=False, default=0)  # 浏览量
     contents_count = Column(Integer, nullable=False, default=0)
     avatar = Column(String, nullable=True)
@@ -36,36 +36,101 @@ class KnowledgeBase(Base):
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
     last_updated_at = Column(DateTime(timezone=True), nullable=True)  # 最后内容更新时间
     
+    __table_args__ = (
+        # 广场热门排序（visibility='public' ORDER BY subscribers_count DESC, created_at DESC）；
+        # 部分索引只包含公开知识库，体积小且免去排序步骤
+        Index(
+            'idx_kb_public_hot',
+            subscribers_count.desc(),
+            created_at.desc(),
+            postgresql_where=text("visibility = 'public'"),
+        ),
+        # 精选列表（管理员无过滤 / 普通用户 public + 组织共享）同样按热度排序：
+        # 全表版本的排序索引，取代原 subscribers_count 单列索引
+        Index('idx_kb_hot', subscribers_count.desc(), created_at.desc()),
+        # "我的知识库" 列表（owner_id = ? ORDER BY created_at DESC）：索引顺序扫描，免排序；
+        # 同时覆盖原 owner_id 单列索引
+        Index('idx_kb_owner_created', owner_id, created_at.desc()),
+        # 同名检查 check_name_exists：owner_id = ? AND lower(name) = lower(?)
+        Index('idx_kb_owner_lower_name', owner_id, func.lower(name)),
+        # 名称 / 描述的 ILIKE '%q%' 搜索：前导通配符用不了 B-tree，pg_trgm GIN 索引可以直接支持
+        # （与 tsvector 不同，不依赖分词，中文子串同样可用）
+        Index('idx_kb_name_trgm', name, postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        Index(
+            'idx_kb_description_trgm',
+            description,
+            postgresql_using='gin',
+            postgresql_ops={'description': 'gin_trgm_ops'},
+        ),
+    )
+    
     def to_dict(self, include_owner=False):
         """Convert to dictionary."""
+        return KnowledgeBase.row_to_dict(self, include_owner)
+    
+    @classmethod
+    def columns_for_list(cls) -> tuple:
+        """
+        列表接口所需的列
+        
+        select(*KnowledgeBase.columns_for_list()) 返回轻量 Row 元组而不是 ORM 实例
+        （无 identity map / instance state 开销），再交给 row_to_dict 序列化。
+        """
+        return (
+            cls.id, cls.owner_id, cls.name, cls.description, cls.category, cls.is_public,
+            cls.visibility, cls.shared_to_orgs, cls.subscribers_count, cls.view_count,
+            cls.contents_count, cls.avatar, cls.created_at, cls.updated_at,
+        )
+    
+    @staticmethod
+    def row_to_dict(row, include_owner=False) -> dict:
+        """Convert a KnowledgeBase instance or a columns_for_list() Row to dictionary."""
         result = {
-            "id": str(self.id),
-            "name": self.name,
-            "description": self.description or "",
-            "category": self.category,
-            "isPublic": self.is_public,  # 保持兼容
-            "visibility": self.visibility,
-            "shared_to_orgs": [str(org_id) for org_id in (self.shared_to_orgs or [])],
-            "subscribersCount": self.subscribers_count,
-            "viewCount": self.view_count,
-            "contents": self.contents_count,
-            "avatar": self.avatar or "/kb.png",
-            "createdAt": self.created_at.strftime("%Y-%m-%d"),
-            "updatedAt": self.updated_at.strftime("%Y-%m-%d"),
+            "id": str(row.id),
+            "name": row.name,
+            "description": row.description or "",
+            "category": row.category,
+            "isPublic": row.is_public,  # 保持兼容
+            "visibility": row.visibility,
+            "shared_to_orgs": [str(org_id) for org_id in (row.shared_to_orgs or [])],
+            "subscribersCount": row.subscribers_count,
+            "viewCount": row.view_count,
+            "contents": row.contents_count,
+            "avatar": row.avatar or "/kb.png",
+            # date().isoformat() 走 C 实现，比 strftime 快且输出同为 YYYY-MM-DD
+            "createdAt": row.created_at.date().isoformat(),
+            "updatedAt": row.updated_at.date().isoformat(),
         }
         if include_owner:
-            result["ownerId"] = str(self.owner_id)
+            result["ownerId"] = str(row.owner_id)
         return result
     
     # === 辅助方法 ===
     
-    def is_visible_to_user(self, user_id: uuid.UUID, user_org_ids: List[uuid.UUID], is_admin: bool = False) -> bool:
+    def shared_org_set(self) -> FrozenSet[uuid.UUID]:
+        """
+        获取共享组织ID的 frozenset（按 shared_to_orgs 列表对象缓存）
+        
+        shared_to_orgs 被重新赋值时缓存自动失效。
+        """
+        shared = self.shared_to_orgs
+        cached = self.__dict__.get('_shared_org_cache')
+        if cached is None or cached[0] is not shared:
+            cached = (shared, frozenset(shared or ()))
+            self.__dict__['_shared_org_cache'] = cached
+        return cached[1]
+    
+    def is_shared_with_any(self, org_ids: Iterable[uuid.UUID]) -> bool:
+        """检查知识库是否共享给了任一指定组织"""
+        return not self.shared_org_set().isdisjoint(org_ids)
+    
+    def is_visible_to_user(self, user_id: uuid.UUID, user_org_ids: Iterable[uuid.UUID], is_admin: bool = False) -> bool:
         """
         检查知识库对指定用户是否可见
         
         Args:
             user_id: 用户ID
-            user_org_ids: 用户所在的组织ID列表
+            user_org_ids: 用户所在的组织ID集合（建议传入 set）
             is_admin: 用户是否为管理员
             
         Returns:
@@ -85,15 +150,13 @@ class KnowledgeBase(Base):
         
         # organization: 组织可见
         if self.visibility == 'organization':
-            # 检查用户是否在共享的组织中
-            if not self.shared_to_orgs:
-                return False
-            return any(org_id in self.shared_to_orgs for org_id in user_org_ids)
+            # 检查用户是否在共享的组织中（哈希查找，避免嵌套扫描）
+            return self.is_shared_with_any(user_org_ids)
         
         # private: 仅所有者可见
         return False
     
-    def share_to_organizations(self, org_ids: List[uuid.UUID]) -> None:
+    def share_to_organizations(self, org_ids: Iterable[uuid.UUID]) -> None:
         """
         共享知识库到指定组织
         
@@ -101,7 +164,7 @@ class KnowledgeBase(Base):
             org_ids: 组织ID列表
         """
         self.visibility = 'organization'
-        self.shared_to_orgs = org_ids
+        self.shared_to_orgs = list(org_ids)
     
     def set_public(self, is_public: bool) -> None:
         """
@@ -149,3 +212,65 @@ class KnowledgeBaseSubscription(Base):
             "lastViewedAt": self.last_viewed_at.isoformat() if self.last_viewed_at else None,
         }
 
+
+
+class KBOrgShare(Base):
+    """
+    Knowledge Base ⇄ Organization share rows (normalized form of shared_to_orgs).
+    
+    由 knowledge_bases 上的触发器根据 shared_to_orgs 自动维护，应用层只写 shared_to_orgs；
+    "某组织下共享了哪些知识库" 之类的查询走 (org_id, kb_id) 索引，而不是扫描数组。
+    """
+    __tablename__ = "kb_org_shares"
+    
+    kb_id = Column(UUID(as_uuid=True), ForeignKey("knowledge_bases.id", ondelete="CASCADE"), primary_key=True)
+    org_id = Column(UUID(as_uuid=True), primary_key=True)
+    
+    __table_args__ = (
+        Index('idx_kb_org_shares_org_kb', 'org_id', 'kb_id'),
+    )
+
+
+# shared_to_orgs → kb_org_shares 同步触发器及已有数据回填（与 migrations/007 保持一致）。
+# 已有库启动时 create_all 新建的是空表，必须回填，否则升级前已共享的知识库在按组织过滤时全部消失。
+# 拆成多条 DDL：asyncpg 以预编译方式执行，不支持单次多语句。
+KB_ORG_SHARES_SYNC_DDL = (
+    """
+CREATE OR REPLACE FUNCTION sync_kb_org_shares()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP = 'UPDATE' AND NEW.shared_to_orgs IS NOT DISTINCT FROM OLD.shared_to_orgs THEN
+    RETURN NEW;
+  END IF;
+  DELETE FROM kb_org_shares
+   WHERE kb_id = NEW.id
+     AND NOT (org_id = ANY(COALESCE(NEW.shared_to_orgs, '{}')));
+  INSERT INTO kb_org_shares (kb_id, org_id)
+  SELECT DISTINCT NEW.id, o FROM unnest(COALESCE(NEW.shared_to_orgs, '{}')) AS o
+  ON CONFLICT DO NOTHING;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql
+""",
+    "DROP TRIGGER IF EXISTS trg_kb_org_shares_sync ON knowledge_bases",
+    """
+CREATE TRIGGER trg_kb_org_shares_sync
+  AFTER INSERT OR UPDATE OF shared_to_orgs ON knowledge_bases
+  FOR EACH ROW EXECUTE FUNCTION sync_kb_org_shares()
+""",
+    """
+INSERT INTO kb_org_shares (kb_id, org_id)
+SELECT DISTINCT id, unnest(shared_to_orgs) FROM knowledge_bases
+ON CONFLICT DO NOTHING
+""",
+)
+
+for _ddl in KB_ORG_SHARES_SYNC_DDL:
+    event.listen(KBOrgShare.__table__, "after_create", DDL(_ddl).execute_if(dialect="postgresql"))
+
+# idx_kb_*_trgm 依赖 pg_trgm 扩展（与 migrations/010 保持一致）
+event.listen(
+    KnowledgeBase.__table__,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+)
@@ -1,12 +1,12 @@
 """Note and NoteFolder database models."""
-from sqlalchemy import Column, String, Text, DateTime, ForeignKey, func, UniqueConstraint
+from sqlalchemy import Column, String, Text, DateTime, ForeignKey, Index, func, UniqueConstraint
 from sqlalchemy.dialects.postgresql import UUID, ARRAY
 from sqlalchemy.orm import relationship
-from config.database import Base
+from config.database import Base, BulkInsertMixin
 import uuid
 
 
-class NoteFolder(Base):
+class NoteFolder(Base, BulkInsertMixin):
     """Note folder model."""
     __tablename__ = "note_folders"
     
@@ -28,7 +28,7 @@ class Note(Base):
     __tablename__ = "notes"
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     folder_id = Column(UUID(as_uuid=True), ForeignKey("note_folders.id", ondelete="SET NULL"), nullable=True, index=True)
     title = Column(String, nullable=False)
     content = Column(Text, nullable=False, default="")
@@ -38,6 +38,12 @@ class Note(Base):
     
     folder = relationship("NoteFolder", back_populates="notes")
     
+    __table_args__ = (
+        # Note list keyset pagination: (user_id[, folder_id]) filter + (updated_at, id) DESC ordering
+        Index('idx_notes_user_updated', user_id, updated_at.desc(), id.desc()),
+        Index('idx_notes_user_folder_updated', user_id, folder_id, updated_at.desc(), id.desc()),
+    )
+    
     def to_dict(self):
         """Convert to dictionary."""
         return {
@@ -1,5 +1,5 @@
 """Organization model for user groups."""
-from sqlalchemy import Column, String, Integer, DateTime, Boolean, ForeignKey, func, Text
+from sqlalchemy import Column, String, Integer, DateTime, Boolean, ForeignKey, func, Text, Index, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from config.database import Base
@@ -10,6 +10,10 @@ import secrets
 import string
 
 
+# 组织码字符表：大写字母和数字，排除易混淆的字符
+ORG_CODE_CHARS = string.ascii_uppercase.replace('O', '').replace('I', '') + string.digits.replace('0', '')
+
+
 class Organization(Base):
     """Organization model."""
     __tablename__ = "organizations"
@@ -26,6 +30,11 @@ class Organization(Base):
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
     is_deleted = Column(Boolean, default=False, nullable=False, index=True)  # 软删除
     
+    # 成员查询 JOIN organizations 时只关心未删除组织，部分索引避免回表检查 is_deleted
+    __table_args__ = (
+        Index('idx_organizations_active_id', 'id', postgresql_where=text('is_deleted = false')),
+    )
+    
     # 关系
     owner = relationship("User", back_populates="owned_organizations", foreign_keys=[owner_id])
     members = relationship("OrganizationMember", back_populates="organization", cascade="all, delete-orphan")
@@ -145,14 +154,17 @@ class Organization(Base):
         """
         生成随机组织码
         
+        一次性从 urandom 取字节后映射到字符表；丢弃超出字符表整数倍的字节，避免取模偏差。
+        
         Args:
             length: 组织码长度，默认8位
             
         Returns:
             随机组织码字符串
         """
-        # 使用大写字母和数字，排除易混淆的字符
-        chars = string.ascii_uppercase.replace('O', '').replace('I', '') + string.digits.replace('0', '')
-        code = ''.join(secrets.choice(chars) for _ in range(length))
-        return code
-
+        chars = ORG_CODE_CHARS
+        limit = 256 - 256 % len(chars)
+        code = []
+        while len(code) < length:
+            code.extend(chars[b % len(chars)] for b in secrets.token_bytes(length * 2) if b < limit)
+        return ''.join(code[:length])
@@ -1,5 +1,5 @@
 """Organization member model for managing user-organization relationships."""
-from sqlalchemy import Column, String, DateTime, ForeignKey, func, UniqueConstraint
+from sqlalchemy import Column, String, DateTime, ForeignKey, func, UniqueConstraint, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from config.database import Base
@@ -12,13 +12,15 @@ class OrganizationMember(Base):
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     org_id = Column(UUID(as_uuid=True), ForeignKey('organizations.id', ondelete='CASCADE'), nullable=False, index=True)
-    user_id = Column(UUID(as_uuid=True), ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    user_id = Column(UUID(as_uuid=True), ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     role = Column(String(20), default='member', nullable=False, index=True)  # 'owner', 'member'
     joined_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
     
     # 唯一约束：同一用户不能重复加入同一组织
     __table_args__ = (
         UniqueConstraint('org_id', 'user_id', name='uq_org_user'),
+        # 按用户查所在组织只读 org_id / role，覆盖索引避免回表
+        Index('idx_org_members_user_covering', 'user_id', postgresql_include=['org_id', 'role']),
     )
     
     # 关系
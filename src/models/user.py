@@ -1,11 +1,20 @@
 """User database model with membership and admin support."""
-from sqlalchemy import Column, String, DateTime, Boolean, ARRAY, func
+from sqlalchemy import Column, String, DateTime, Boolean, ARRAY, Index, func
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from config.database import Base
 import uuid
 from datetime import datetime, timezone
-from typing import Optional
+from types import MappingProxyType
+from typing import Mapping, Optional
+import math
+
+
+# 各等级的组织限制（只读常量，按引用返回，避免每次调用重新分配）
+_LIMITS_ADMIN = MappingProxyType({'can_create': math.inf, 'can_join': math.inf, 'max_members': math.inf})
+_LIMITS_PREMIUM = MappingProxyType({'can_create': 2, 'can_join': 10, 'max_members': 500})
+_LIMITS_MEMBER = MappingProxyType({'can_create': 1, 'can_join': 3, 'max_members': 100})
+_LIMITS_BASIC = MappingProxyType({'can_create': 0, 'can_join': 1, 'max_members': 50})
 
 
 class User(Base):
@@ -29,6 +38,11 @@ class User(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
     
+    __table_args__ = (
+        # 用户名可用性检查 check_username_available：lower(name) = lower(?)，不区分大小写
+        Index('idx_users_lower_name', func.lower(name)),
+    )
+    
     # 关系
     chat_sessions = relationship("ChatSession", back_populates="user", cascade="all, delete-orphan")
     owned_organizations = relationship("Organization", back_populates="owner", foreign_keys="Organization.owner_id")
@@ -122,9 +136,9 @@ class User(Base):
         # 具体的组织数量限制在service层实现
         return True, None
     
-    def get_organization_limits(self) -> dict:
+    def get_organization_limits(self) -> Mapping[str, float]:
         """
-        获取用户的组织限制
+        获取用户的组织限制（只读映射，调用方不可修改）
         返回: {
             'can_create': int,  # 可创建组织数
             'can_join': int,    # 可加入组织数
@@ -132,29 +146,10 @@ class User(Base):
         }
         """
         if self.is_admin:
-            return {
-                'can_create': float('inf'),
-                'can_join': float('inf'),
-                'max_members': float('inf'),
-            }
-        
+            return _LIMITS_ADMIN
         if self.is_premium():
-            return {
-                'can_create': 2,
-                'can_join': 10,
-                'max_members': 500,
-            }
-        
+            return _LIMITS_PREMIUM
         if self.is_member():
-            return {
-                'can_create': 1,
-                'can_join': 3,
-                'max_members': 100,
-            }
-        
+            return _LIMITS_MEMBER
         # 普通用户
-        return {
-            'can_create': 0,
-            'can_join': 1,
-            'max_members': 50,
-        }
+        return _LIMITS_BASIC
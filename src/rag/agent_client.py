@@ -4,19 +4,217 @@ Agent System客户端适配器
 """
 import httpx
 import logging
-import json
-from typing import AsyncGenerator, List, Optional
+import orjson
+import secrets
+from dataclasses import dataclass
+from typing import AsyncGenerator, AsyncIterable, AsyncIterator, List, Optional, Tuple
 from .config import rag_settings
 from .schemas import StreamChunk
 
 logger = logging.getLogger(__name__)
 
+# 流式对话：读超时需覆盖整段长回答；连接/连接池等待快速失败
+STREAM_TIMEOUT = httpx.Timeout(connect=5.0, read=3000.0, write=30.0, pool=5.0)
+CANCEL_TIMEOUT = 10.0
+# HTTP/1.1：每个并发对话占一条连接，max_connections 即并发对话上限；
+# HTTP/2：少量连接即可多路复用全部对话与取消请求
+CLIENT_LIMITS = httpx.Limits(max_connections=200, max_keepalive_connections=50)
+# SSE 响应不压缩：避免服务端为压缩攒批输出，读出的每个网络块即可直接切行
+STREAM_HEADERS = {"accept-encoding": "identity"}
+JSON_HEADERS = {**STREAM_HEADERS, "content-type": "application/json"}
+
+
+def _dumps(obj) -> str:
+    """orjson 序列化为 str（StreamChunk.content 为 str）"""
+    return orjson.dumps(obj).decode()
+
+
+def _join_ids(ids: Optional[List[str]]) -> str:
+    """逗号拼接 ID 列表（单元素时直接返回，是索引名的常见情况）"""
+    if not ids:
+        return ""
+    if len(ids) == 1:
+        return ids[0]
+    return ",".join(ids)
+
+
+async def _iter_document_contents(document_contents: dict) -> AsyncIterator[Tuple[str, bytes]]:
+    """已加载的 {doc_id: markdown} 转为与流式加载相同的 (doc_id, bytes) 迭代器"""
+    for doc_id, markdown in document_contents.items():
+        yield doc_id, markdown.encode("utf-8")
+
+
+async def _iter_multipart(
+    boundary: bytes,
+    meta: bytes,
+    documents: AsyncIterable[Tuple[str, bytes]]
+) -> AsyncIterator[bytes]:
+    """
+    流式生成 multipart/form-data 请求体
+    
+    一个 JSON "meta" part，随后每个文档一个 "documents" part（filename 为 doc_id，
+    文档名称在 meta.document_names 中）。文档到达即发送，内存占用为单个文档大小。
+    """
+    delimiter = b"--" + boundary + b"\r\n"
+    yield (
+        delimiter
+        + b'Content-Disposition: form-data; name="meta"\r\n'
+        + b"Content-Type: application/json\r\n\r\n"
+        + meta + b"\r\n"
+    )
+    async for doc_id, markdown_bytes in documents:
+        yield (
+            delimiter
+            + b'Content-Disposition: form-data; name="documents"; filename="'
+            + doc_id.encode() + b'"\r\n'
+            + b"Content-Type: text/markdown\r\n\r\n"
+        )
+        yield markdown_bytes
+        yield b"\r\n"
+    yield b"--" + boundary + b"--\r\n"
+
+
+async def _iter_sse_lines(response: httpx.Response) -> AsyncIterator[bytes]:
+    """
+    按行切分 SSE 字节流（不做 UTF-8 解码）
+    
+    单个大事件可能跨越多个 TCP 块，用 bytearray 累积，避免 str 拼接的 O(N²) 开销。
+    返回的行不含行尾的 \n / \r\n，调用方无需再 strip。
+    """
+    buf = bytearray()
+    # 不传 chunk_size：httpx 会攒满 chunk_size 才产出，token 流会被卡住；
+    # 未压缩时每次产出即一次 socket 读（HTTP/1.1 单次最多 64 KiB），大事件由 bytearray 拼接
+    async for chunk in response.aiter_bytes():
+        buf += chunk
+        start = 0
+        while (nl := buf.find(b"\n", start)) != -1:
+            end = nl - 1 if nl > start and buf[nl - 1] == 0x0D else nl
+            yield bytes(buf[start:end])
+            start = nl + 1
+        if start:
+            del buf[:start]
+    if buf:
+        yield bytes(buf)
+
+
+@dataclass
+class FollowUpQuestion:
+    """follow_up_question 事件的 content（orjson 原生序列化 dataclass，无中间 dict）"""
+    __slots__ = ("question", "index")
+    question: str
+    index: int
+
+
+@dataclass
+class FinalAnswer:
+    """final_answer 事件的 content"""
+    __slots__ = ("answer", "session_id", "follow_up_questions", "detected_intent")
+    answer: str
+    session_id: str
+    follow_up_questions: list
+    detected_intent: str
+
+
+# 原样透传的事件类型：data 段的 JSON 文本直接作为 content，不做解析/重新序列化
+_PASSTHROUGH_JSON = frozenset({
+    "doc_summary_init",
+    "doc_summary_start",
+    "doc_summary_chunk",
+    "doc_summary_complete",
+    "doc_summary_error",
+    "cancelled",
+})
+
+# 事件类型 -> 转换函数；未登记的类型（thinking_start / thinking_end 等）返回 None
+_HANDLERS = {
+    "answer_chunk": lambda d: StreamChunk(type="token", content=d.get("content", "")),
+    "thought_chunk": lambda d: StreamChunk(type="thinking", content=d.get("content", "")),
+    "follow_up_question": lambda d: StreamChunk(
+        type="follow_up_question",
+        content=_dumps(FollowUpQuestion(
+            d.get("question", ""),
+            d.get("index", 0)
+        ))
+    ),
+    "final_answer": lambda d: StreamChunk(
+        type="final_answer",
+        content=_dumps(FinalAnswer(
+            d.get("answer", ""),
+            d.get("session_id", ""),
+            d.get("follow_up_questions", []),
+            d.get("detected_intent", "")
+        ))
+    ),
+    "error": lambda d: StreamChunk(type="error", content=d.get("message", "Unknown error")),
+}
+
+
+# 状态码 -> 错误块；Agent System 故障时大量请求返回同一状态码，复用同一个对象
+_HTTP_ERROR_CHUNKS: dict = {}
+
+
+def _error_chunk(e: Exception) -> StreamChunk:
+    """异常 -> 发给前端的错误块"""
+    if isinstance(e, httpx.HTTPStatusError):
+        code = e.response.status_code
+        chunk = _HTTP_ERROR_CHUNKS.get(code)
+        if chunk is None:
+            chunk = _HTTP_ERROR_CHUNKS[code] = StreamChunk(type="error", content=f"Agent System error: {code}")
+        return chunk
+    if isinstance(e, httpx.RequestError):
+        return StreamChunk(type="error", content=f"Failed to connect to Agent System: {e}")
+    return StreamChunk(type="error", content=f"Unexpected error: {e}")
+
 
 class AgentClient:
     """Agent System客户端"""
     
     def __init__(self):
         self.base_url = rag_settings.AGENT_SYSTEM_URL
+        # 长连接复用：所有请求共享同一个连接池，避免每次对话重新握手
+        self._client = self._build_client(self.base_url)
+        self._static_request = self._build_static_request()
+    
+    @staticmethod
+    def _build_client(base_url: str) -> httpx.AsyncClient:
+        """创建共享 HTTP 客户端；开启 AGENT_HTTP2 时对明文地址使用 h2c（禁用 HTTP/1.1 协商）"""
+        http2 = rag_settings.AGENT_HTTP2
+        return httpx.AsyncClient(
+            timeout=STREAM_TIMEOUT,
+            limits=CLIENT_LIMITS,
+            http2=http2,
+            http1=not (http2 and base_url.startswith("http://")),
+        )
+    
+    @staticmethod
+    def _build_static_request() -> dict:
+        """请求中与单次对话无关的固定字段（召回 / Embedding / Rerank / 搜索引擎配置）"""
+        return {
+            "search_engine": rag_settings.SEARCH_ENGINE,
+            "recall_api_url": rag_settings.RECALL_API_URL,
+            "recall_es_host": rag_settings.ES_HOST,
+            "recall_top_n": rag_settings.RECALL_TOP_N,
+            "recall_similarity_threshold": rag_settings.RECALL_SIMILARITY_THRESHOLD,
+            "recall_vector_similarity_weight": rag_settings.RECALL_VECTOR_SIMILARITY_WEIGHT,
+            "recall_model_factory": rag_settings.EMBEDDING_MODEL_FACTORY,
+            "recall_model_name": rag_settings.EMBEDDING_MODEL_NAME,
+            "recall_model_base_url": rag_settings.EMBEDDING_BASE_URL,
+            "recall_api_key": rag_settings.EMBEDDING_API_KEY,
+            "recall_use_rerank": rag_settings.RECALL_USE_RERANK,
+            "recall_rerank_factory": rag_settings.RERANK_FACTORY,
+            "recall_rerank_model_name": rag_settings.RERANK_MODEL_NAME,
+            "recall_rerank_base_url": rag_settings.RERANK_BASE_URL,
+            "recall_rerank_api_key": rag_settings.RERANK_API_KEY,
+        }
+    
+    def reload(self) -> None:
+        """配置变更后重建缓存的固定请求字段"""
+        self.base_url = rag_settings.AGENT_SYSTEM_URL
+        self._static_request = self._build_static_request()
+    
+    async def close(self) -> None:
+        """Close the shared HTTP client on shutdown."""
+        await self._client.aclose()
     
     async def stream_chat_completion(
         self,
@@ -25,8 +223,10 @@ class AgentClient:
         mode: str,
         index_names: List[str],
         doc_ids: Optional[List[str]] = None,
+        doc_ids_joined: Optional[str] = None,
         content: Optional[str] = None,
         document_contents: Optional[dict] = None,
+        document_stream: Optional[AsyncIterable[Tuple[str, bytes]]] = None,
         document_names: Optional[dict] = None,
         kb_id: Optional[str] = None,
         user_id: Optional[str] = None,
@@ -34,19 +234,25 @@ class AgentClient:
         show_thinking: bool = True,
         mode_type: Optional[str] = None,
         refresh_summary_cache: bool = False,
-        is_member: bool = False
+        is_member: bool = False,
+        llm_config: Optional[Tuple[str, str, str, int]] = None
     ) -> AsyncGenerator[StreamChunk, None]:
         """
         调用Agent System的流式对话接口
+        
+        doc_ids_joined 为调用方已缓存的 ",".join(doc_ids)，传入时不再重复拼接。
+        llm_config 为调用方已解析的 rag_settings.get_llm_config(...)，传入时忽略 is_member。
+        document_stream 为边加载边产出的 (doc_id, markdown_bytes)，仅在 AGENT_STREAM_UPLOAD 模式下使用。
         """
         url = f"{self.base_url}/query/stream"
         
         try:
-            model_name, model_url, api_key, max_context_tokens = rag_settings.get_llm_config(is_member)
+            model_name, model_url, api_key, max_context_tokens = llm_config or rag_settings.get_llm_config(is_member)
             
             logger.debug(f"Agent request: session={session_id}, model={model_name}")
             
             agent_request = {
+                **self._static_request,
                 "user_query": user_query,
                 "session_id": session_id,
                 "mode_type": mode_type,
@@ -62,106 +268,66 @@ class AgentClient:
                 "openai_api_base": model_url,
                 "model_name": model_name,
                 "max_context_tokens": max_context_tokens,
-                "search_engine": rag_settings.SEARCH_ENGINE,
                 "search_engine_api_key": rag_settings.SEARCH_ENGINE_API_KEY if enable_web_search else None,
-                "recall_api_url": rag_settings.RECALL_API_URL,
-                "recall_index_names": ",".join(index_names),
-                "recall_doc_ids": ",".join(doc_ids) if doc_ids else "",
-                "recall_es_host": rag_settings.ES_HOST,
-                "recall_top_n": rag_settings.RECALL_TOP_N,
-                "recall_similarity_threshold": rag_settings.RECALL_SIMILARITY_THRESHOLD,
-                "recall_vector_similarity_weight": rag_settings.RECALL_VECTOR_SIMILARITY_WEIGHT,
-                "recall_model_factory": rag_settings.EMBEDDING_MODEL_FACTORY,
-                "recall_model_name": rag_settings.EMBEDDING_MODEL_NAME,
-                "recall_model_base_url": rag_settings.EMBEDDING_BASE_URL,
-                "recall_api_key": rag_settings.EMBEDDING_API_KEY,
-                "recall_use_rerank": rag_settings.RECALL_USE_RERANK,
-                "recall_rerank_factory": rag_settings.RERANK_FACTORY,
-                "recall_rerank_model_name": rag_settings.RERANK_MODEL_NAME,
-                "recall_rerank_base_url": rag_settings.RERANK_BASE_URL,
-                "recall_rerank_api_key": rag_settings.RERANK_API_KEY,
+                "recall_index_names": _join_ids(index_names),
+                "recall_doc_ids": doc_ids_joined if doc_ids_joined is not None else _join_ids(doc_ids),
             }
             
-            async with httpx.AsyncClient(timeout=3000.0) as client:
-                async with client.stream("POST", url, json=agent_request) as response:
-                    response.raise_for_status()
-                    
-                    current_event = None
+            if document_stream is None and document_contents and rag_settings.AGENT_STREAM_UPLOAD:
+                document_stream = _iter_document_contents(document_contents)
+            
+            if document_stream is not None:
+                # multipart：每个文档一个 part，元数据单独一个 JSON part，不再拼出整段大 JSON
+                agent_request["document_contents"] = None
+                boundary = secrets.token_hex(16).encode()
+                request_kwargs = {
+                    "content": _iter_multipart(boundary, orjson.dumps(agent_request), document_stream),
+                    "headers": {
+                        **STREAM_HEADERS,
+                        "content-type": f"multipart/form-data; boundary={boundary.decode()}",
+                    },
+                }
+            else:
+                # 一次性 orjson 序列化（多文档模式下 document_contents 可达数 MB），避免 httpx 走 stdlib json
+                request_kwargs = {"content": orjson.dumps(agent_request), "headers": JSON_HEADERS}
+            
+            async with self._client.stream("POST", url, **request_kwargs) as response:
+                response.raise_for_status()
+                
+                current_event = None
+                
+                async for line in _iter_sse_lines(response):
+                    if not line:
+                        continue
                     
-                    async for line in response.aiter_lines():
-                        line = line.strip()
-                        if not line:
+                    if line.startswith(b"event: "):
+                        current_event = line[7:].decode()
+                    elif line.startswith(b"data: "):
+                        data = line[6:]
+                        if current_event in _PASSTHROUGH_JSON:
+                            yield StreamChunk(type=current_event, content=data.decode())
+                            continue
+                        # orjson 直接解析 bytes，无需先解码成 str
+                        try:
+                            event_data = orjson.loads(data)
+                            chunk = self._convert_event(current_event, event_data)
+                            if chunk:
+                                yield chunk
+                        except orjson.JSONDecodeError as e:
+                            logger.warning(f"Failed to parse data: {e}")
                             continue
-                        
-                        if line.startswith("event: "):
-                            current_event = line[7:].strip()
-                        elif line.startswith("data: "):
-                            data = line[6:].strip()
-                            try:
-                                event_data = json.loads(data)
-                                chunk = self._convert_event(current_event, event_data)
-                                if chunk:
-                                    yield chunk
-                            except json.JSONDecodeError as e:
-                                logger.warning(f"Failed to parse data: {e}")
-                                continue
         
-        except httpx.HTTPStatusError as e:
-            logger.error(f"Agent System HTTP error: {e}")
-            yield StreamChunk(type="error", content=f"Agent System error: {e.response.status_code}")
-        except httpx.RequestError as e:
-            logger.error(f"Agent System request error: {e}")
-            yield StreamChunk(type="error", content=f"Failed to connect to Agent System: {str(e)}")
         except Exception as e:
-            logger.error(f"Unexpected error: {e}", exc_info=True)
-            yield StreamChunk(type="error", content=f"Unexpected error: {str(e)}")
+            if isinstance(e, httpx.HTTPError):
+                logger.error(f"Agent System error: {e}")
+            else:
+                logger.error(f"Unexpected error: {e}", exc_info=True)
+            yield _error_chunk(e)
     
     def _convert_event(self, event_type: str, event_data: dict) -> Optional[StreamChunk]:
-        """转换Agent System事件为StreamChunk格式"""
-        if not event_type:
-            return None
-
-        if event_type == "answer_chunk":
-            return StreamChunk(type="token", content=event_data.get("content", ""))
-        elif event_type == "thought_chunk":
-            return StreamChunk(type="thinking", content=event_data.get("content", ""))
-        elif event_type in ["thinking_start", "thinking_end"]:
-            return None
-        elif event_type == "doc_summary_init":
-            return StreamChunk(type="doc_summary_init", content=json.dumps(event_data))
-        elif event_type == "doc_summary_start":
-            return StreamChunk(type="doc_summary_start", content=json.dumps(event_data))
-        elif event_type == "doc_summary_chunk":
-            #logger.info(f"📤 [agent_client] doc_summary_chunk event: doc_id={event_data.get('doc_id')}, content_len={len(event_data.get('content', ''))}")
-            return StreamChunk(type="doc_summary_chunk", content=json.dumps(event_data))
-        elif event_type == "doc_summary_complete":
-            return StreamChunk(type="doc_summary_complete", content=json.dumps(event_data))
-        elif event_type == "doc_summary_error":
-            return StreamChunk(type="doc_summary_error", content=json.dumps(event_data))
-        elif event_type == "follow_up_question":
-            return StreamChunk(
-                type="follow_up_question",
-                content=json.dumps({
-                    "question": event_data.get("question", ""),
-                    "index": event_data.get("index", 0)
-                })
-            )
-        elif event_type == "final_answer":
-            return StreamChunk(
-                type="final_answer",
-                content=json.dumps({
-                    "answer": event_data.get("answer", ""),
-                    "session_id": event_data.get("session_id", ""),
-                    "follow_up_questions": event_data.get("follow_up_questions", []),
-                    "detected_intent": event_data.get("detected_intent", "")
-                })
-            )
-        elif event_type == "error":
-            return StreamChunk(type="error", content=event_data.get("message", "Unknown error"))
-        elif event_type == "cancelled":
-            return StreamChunk(type="cancelled", content=json.dumps(event_data))
-        else:
-            return None
+        """转换Agent System事件为StreamChunk格式（透传事件已在解析循环中处理）"""
+        handler = _HANDLERS.get(event_type)
+        return handler(event_data) if handler else None
     
     async def cancel_generation(self, session_id: str) -> dict:
         """
@@ -176,10 +342,9 @@ class AgentClient:
         url = f"{self.base_url}/cancel/{session_id}"
         
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.post(url)
-                response.raise_for_status()
-                return response.json()
+            response = await self._client.post(url, timeout=CANCEL_TIMEOUT)
+            response.raise_for_status()
+            return response.json()
         except httpx.HTTPStatusError as e:
             logger.error(f"Agent System cancel HTTP error: {e}")
             return {"success": False, "error": f"HTTP error: {e.response.status_code}"}
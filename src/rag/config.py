@@ -7,168 +7,101 @@ from config.settings import settings
 
 
 class RAGSettings:
-    """RAG 服务配置 - 代理到主 settings"""
-    
-    # ============================================================================
-    # Agent System 配置
-    # ============================================================================
-    @property
-    def AGENT_SYSTEM_URL(self) -> str:
-        return settings.AGENT_SYSTEM_URL
-    
-    # ============================================================================
-    # LLM 配置 - 普通用户
-    # ============================================================================
-    @property
-    def LLM_MODEL_NAME(self) -> str:
-        return settings.LLM_MODEL_NAME
-    
-    @property
-    def LLM_MODEL_URL(self) -> str:
-        return settings.LLM_MODEL_URL
-    
-    @property
-    def LLM_API_KEY(self) -> str:
-        return settings.LLM_API_KEY
-    
-    @property
-    def LLM_TEMPERATURE(self) -> float:
-        return settings.LLM_TEMPERATURE
-    
-    @property
-    def LLM_TOP_P(self) -> float:
-        return settings.LLM_TOP_P
-    
-    @property
-    def LLM_MAX_TOKENS(self) -> int:
-        return settings.LLM_MAX_TOKENS
-    
-    @property
-    def LLM_MAX_CONTEXT_TOKENS(self) -> int:
-        return settings.LLM_MAX_CONTEXT_TOKENS
-    
-    # ============================================================================
-    # LLM 配置 - 会员用户
-    # ============================================================================
-    @property
-    def MEMBER_LLM_MODEL_NAME(self) -> str:
-        return settings.MEMBER_LLM_MODEL_NAME
-    
-    @property
-    def MEMBER_LLM_MODEL_URL(self) -> str:
-        return settings.MEMBER_LLM_MODEL_URL
-    
-    @property
-    def MEMBER_LLM_API_KEY(self) -> str:
-        return settings.MEMBER_LLM_API_KEY
-    
-    @property
-    def MEMBER_LLM_MAX_CONTEXT_TOKENS(self) -> int:
-        return settings.MEMBER_LLM_MAX_CONTEXT_TOKENS
-    
+    """RAG 服务配置 - 启动时从主 settings 复制为普通属性（热路径上只是一次属性读取）"""
+
+    def __init__(self):
+        self.refresh()
+
+    def refresh(self) -> None:
+        """重新从主 settings 读取全部配置（运行时修改 settings 后调用）"""
+        # ============================================================================
+        # Agent System 配置
+        # ============================================================================
+        self.AGENT_SYSTEM_URL: str = settings.AGENT_SYSTEM_URL
+        self.AGENT_STREAM_UPLOAD: bool = settings.AGENT_STREAM_UPLOAD
+        self.AGENT_HTTP2: bool = settings.AGENT_HTTP2
+        self.SSE_COALESCE_WINDOW: float = settings.RAG_SSE_COALESCE_MS / 1000
+
+        # ============================================================================
+        # LLM 配置 - 普通用户
+        # ============================================================================
+        self.LLM_MODEL_NAME: str = settings.LLM_MODEL_NAME
+        self.LLM_MODEL_URL: str = settings.LLM_MODEL_URL
+        self.LLM_API_KEY: str = settings.LLM_API_KEY
+        self.LLM_TEMPERATURE: float = settings.LLM_TEMPERATURE
+        self.LLM_TOP_P: float = settings.LLM_TOP_P
+        self.LLM_MAX_TOKENS: int = settings.LLM_MAX_TOKENS
+        self.LLM_MAX_CONTEXT_TOKENS: int = settings.LLM_MAX_CONTEXT_TOKENS
+
+        # ============================================================================
+        # LLM 配置 - 会员用户
+        # ============================================================================
+        self.MEMBER_LLM_MODEL_NAME: str = settings.MEMBER_LLM_MODEL_NAME
+        self.MEMBER_LLM_MODEL_URL: str = settings.MEMBER_LLM_MODEL_URL
+        self.MEMBER_LLM_API_KEY: str = settings.MEMBER_LLM_API_KEY
+        self.MEMBER_LLM_MAX_CONTEXT_TOKENS: int = settings.MEMBER_LLM_MAX_CONTEXT_TOKENS
+
+        # ============================================================================
+        # Recall 配置
+        # ============================================================================
+        self.RECALL_API_URL: str = settings.RECALL_API_URL
+        self.RECALL_TOP_N: int = settings.RECALL_TOP_N
+        self.RECALL_SIMILARITY_THRESHOLD: float = settings.RECALL_SIMILARITY_THRESHOLD
+        self.RECALL_VECTOR_SIMILARITY_WEIGHT: float = settings.RECALL_VECTOR_SIMILARITY_WEIGHT
+        self.RECALL_USE_RERANK: bool = settings.RECALL_USE_RERANK
+
+        # ============================================================================
+        # Embedding 模型配置
+        # ============================================================================
+        self.EMBEDDING_MODEL_FACTORY: str = settings.EMBEDDING_MODEL_FACTORY
+        self.EMBEDDING_MODEL_NAME: str = settings.EMBEDDING_MODEL_NAME
+        self.EMBEDDING_BASE_URL: str = settings.EMBEDDING_BASE_URL
+        self.EMBEDDING_API_KEY: str = settings.EMBEDDING_API_KEY
+
+        # ============================================================================
+        # Rerank 模型配置
+        # ============================================================================
+        self.RERANK_FACTORY: str = settings.RERANK_FACTORY
+        self.RERANK_MODEL_NAME: str = settings.RERANK_MODEL_NAME
+        self.RERANK_BASE_URL: str = settings.RERANK_BASE_URL
+        self.RERANK_API_KEY: str = settings.RERANK_API_KEY
+
+        # ============================================================================
+        # Elasticsearch 配置
+        # ============================================================================
+        self.ES_HOST: str = settings.ES_HOST
+
+        # ============================================================================
+        # 搜索引擎配置
+        # ============================================================================
+        self.SEARCH_ENGINE: str = settings.SEARCH_ENGINE
+        self.SEARCH_ENGINE_API_KEY: str = settings.SEARCH_ENGINE_API_KEY
+
+        # 预先组装两档 LLM 配置，get_llm_config 直接返回
+        self._member_llm_config: Tuple[str, str, str, int] = (
+            self.MEMBER_LLM_MODEL_NAME,
+            self.MEMBER_LLM_MODEL_URL,
+            self.MEMBER_LLM_API_KEY,
+            self.MEMBER_LLM_MAX_CONTEXT_TOKENS
+        )
+        self._llm_config: Tuple[str, str, str, int] = (
+            self.LLM_MODEL_NAME,
+            self.LLM_MODEL_URL,
+            self.LLM_API_KEY,
+            self.LLM_MAX_CONTEXT_TOKENS
+        )
+
     def get_llm_config(self, is_member: bool = False) -> Tuple[str, str, str, int]:
         """
         根据用户等级获取 LLM 配置
-        
+
         Args:
             is_member: 是否为会员用户（member 或 premium）
-            
+
         Returns:
             Tuple[model_name, model_url, api_key, max_context_tokens]
         """
-        if is_member:
-            return (
-                self.MEMBER_LLM_MODEL_NAME,
-                self.MEMBER_LLM_MODEL_URL,
-                self.MEMBER_LLM_API_KEY,
-                self.MEMBER_LLM_MAX_CONTEXT_TOKENS
-            )
-        else:
-            return (
-                self.LLM_MODEL_NAME,
-                self.LLM_MODEL_URL,
-                self.LLM_API_KEY,
-                self.LLM_MAX_CONTEXT_TOKENS
-            )
-    
-    # ============================================================================
-    # Recall 配置
-    # ============================================================================
-    @property
-    def RECALL_API_URL(self) -> str:
-        return settings.RECALL_API_URL
-    
-    @property
-    def RECALL_TOP_N(self) -> int:
-        return settings.RECALL_TOP_N
-    
-    @property
-    def RECALL_SIMILARITY_THRESHOLD(self) -> float:
-        return settings.RECALL_SIMILARITY_THRESHOLD
-    
-    @property
-    def RECALL_VECTOR_SIMILARITY_WEIGHT(self) -> float:
-        return settings.RECALL_VECTOR_SIMILARITY_WEIGHT
-    
-    @property
-    def RECALL_USE_RERANK(self) -> bool:
-        return settings.RECALL_USE_RERANK
-    
-    # ============================================================================
-    # Embedding 模型配置
-    # ============================================================================
-    @property
-    def EMBEDDING_MODEL_FACTORY(self) -> str:
-        return settings.EMBEDDING_MODEL_FACTORY
-    
-    @property
-    def EMBEDDING_MODEL_NAME(self) -> str:
-        return settings.EMBEDDING_MODEL_NAME
-    
-    @property
-    def EMBEDDING_BASE_URL(self) -> str:
-        return settings.EMBEDDING_BASE_URL
-    
-    @property
-    def EMBEDDING_API_KEY(self) -> str:
-        return settings.EMBEDDING_API_KEY
-    
-    # ============================================================================
-    # Rerank 模型配置
-    # ============================================================================
-    @property
-    def RERANK_FACTORY(self) -> str:
-        return settings.RERANK_FACTORY
-    
-    @property
-    def RERANK_MODEL_NAME(self) -> str:
-        return settings.RERANK_MODEL_NAME
-    
-    @property
-    def RERANK_BASE_URL(self) -> str:
-        return settings.RERANK_BASE_URL
-    
-    @property
-    def RERANK_API_KEY(self) -> str:
-        return settings.RERANK_API_KEY
-    
-    # ============================================================================
-    # Elasticsearch 配置
-    # ============================================================================
-    @property
-    def ES_HOST(self) -> str:
-        return settings.ES_HOST
-    
-    # ============================================================================
-    # 搜索引擎配置
-    # ============================================================================
-    @property
-    def SEARCH_ENGINE(self) -> str:
-        return settings.SEARCH_ENGINE
-    
-    @property
-    def SEARCH_ENGINE_API_KEY(self) -> str:
-        return settings.SEARCH_ENGINE_API_KEY
+        return self._member_llm_config if is_member else self._llm_config
 
 
 # 全局配置实例
@@ -1,7 +1,10 @@
 """
 RAG API 控制器
 """
+import asyncio
 import logging
+import orjson
+from typing import AsyncIterator, Optional
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -9,6 +12,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from config.database import get_db
 from middlewares.auth import get_current_user
 from models.user import User
+from .config import rag_settings
 from .schemas import ChatRequest, StreamChunk
 from .service import RAGService
 from .agent_client import agent_client
@@ -17,6 +21,96 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/rag", tags=["RAG"])
 
+# SSE 帧直接以 bytes 输出，StreamingResponse 不再逐块做 UTF-8 编码
+SSE_PREFIX = b"data: "
+SSE_SUFFIX = b"\n\n"
+SSE_DONE = b"data: [DONE]\n\n"
+
+
+def sse_frame(chunk: StreamChunk) -> bytes:
+    """StreamChunk -> SSE 帧；字段固定，直接用 orjson 序列化，绕过 Pydantic 序列化器"""
+    return SSE_PREFIX + orjson.dumps({"type": chunk.type, "content": chunk.content}) + SSE_SUFFIX
+
+
+# 合并缓冲达到该大小时立即写出
+SSE_COALESCE_MAX_BYTES = 4096
+
+
+async def _next_chunk(it: AsyncIterator[StreamChunk]) -> Optional[StreamChunk]:
+    try:
+        return await it.__anext__()
+    except StopAsyncIteration:
+        return None
+
+
+async def coalesce_sse(
+    chunks: AsyncIterator[StreamChunk],
+    window: Optional[float] = None,
+    max_bytes: int = SSE_COALESCE_MAX_BYTES
+) -> AsyncIterator[bytes]:
+    """
+    StreamChunk 流 -> SSE 字节流，合并短时间内连续到达的 token 帧
+    
+    第一个 token 进入缓冲后最多等待 window 秒（不依赖下一个 token 到达），
+    缓冲满 max_bytes 或遇到非 token 块时立即写出；帧顺序不变。window <= 0 时逐帧写出。
+    """
+    if window is None:
+        window = rag_settings.SSE_COALESCE_WINDOW
+    if window <= 0:
+        async for chunk in chunks:
+            yield sse_frame(chunk)
+        return
+    
+    loop = asyncio.get_running_loop()
+    it = chunks.__aiter__()
+    pending = bytearray()
+    deadline = 0.0
+    next_task = None
+    try:
+        while True:
+            if next_task is None:
+                next_task = asyncio.ensure_future(_next_chunk(it))
+            if pending:
+                done, _ = await asyncio.wait((next_task,), timeout=max(deadline - loop.time(), 0))
+                if not done:
+                    # 窗口到期，下一个块仍未到达：先把已缓冲的 token 写出
+                    yield bytes(pending)
+                    pending.clear()
+                    continue
+            
+            task, next_task = next_task, None
+            try:
+                chunk = await task
+            except Exception:
+                # 上游出错：先写出已缓冲的 token，调用方随后发出的错误帧仍排在它们之后
+                if pending:
+                    yield bytes(pending)
+                    pending.clear()
+                raise
+            if chunk is None:
+                break
+            
+            frame = sse_frame(chunk)
+            if chunk.type == "token":
+                if not pending:
+                    deadline = loop.time() + window
+                pending += frame
+                if len(pending) < max_bytes:
+                    continue
+            elif pending:
+                pending += frame
+            else:
+                yield frame
+                continue
+            yield bytes(pending)
+            pending.clear()
+        
+        if pending:
+            yield bytes(pending)
+    finally:
+        if next_task is not None:
+            next_task.cancel()
+
 
 @router.post("/chat/stream")
 async def chat_stream(
@@ -44,13 +138,13 @@ async def chat_stream(
         
         async def generate():
             try:
-                async for chunk in rag_service.chat_stream(request, current_user):
-                    yield f"data: {chunk.model_dump_json()}\n\n"
-                yield "data: [DONE]\n\n"
+                async for frame in coalesce_sse(rag_service.chat_stream(request, current_user, is_member)):
+                    yield frame
+                yield SSE_DONE
             except Exception as e:
                 logger.error(f"Stream error: {e}", exc_info=True)
                 error_chunk = StreamChunk(type="error", content=str(e))
-                yield f"data: {error_chunk.model_dump_json()}\n\n"
+                yield sse_frame(error_chunk)
         
         return StreamingResponse(
             generate(),
@@ -1,20 +1,46 @@
 """
 RAG 服务层
 """
+import asyncio
 import logging
-from typing import AsyncGenerator, List, Optional
+from typing import AsyncGenerator, AsyncIterator, Dict, List, Optional, Tuple, TypedDict
 from uuid import UUID
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from .agent_client import agent_client
+from .config import rag_settings
 from .schemas import ChatRequest, StreamChunk
+from config.database import AsyncSessionLocal
 from repositories.kb_repository import KnowledgeBaseRepository
 from repositories.document_repository import DocumentRepository
 from utils.es_utils import get_user_es_index
+from utils.ttl_cache import TTLCache
 from models.user import User
 
 logger = logging.getLogger(__name__)
 
+# kb_id -> (doc_ids, 逗号拼接的 doc_ids)；同一会话连续提问时复用。
+# 文档增删/移动时由 DocumentService 调用 invalidate_kb_doc_ids 清除，TTL 只兜底其他 worker 的副本。
+_kb_doc_ids_cache = TTLCache(maxsize=1024, ttl=30)
+
+# kb_id -> 知识库所有者的 ES 索引名；kb 归属不可变（目前没有转移知识库的入口），可以长时间缓存。
+# 不存在的 kb 缓存为 _KB_MISSING（短 TTL），避免重复查库。
+_kb_owner_index_cache = TTLCache(maxsize=10_000, ttl=300)
+_KB_MISSING = ""
+_KB_MISSING_TTL = 30
+
+
+def invalidate_kb_doc_ids(kb_id) -> None:
+    """知识库文档集合变化后清除其 doc_ids 缓存"""
+    _kb_doc_ids_cache.pop(str(kb_id))
+
+
+class DocumentsBatch(TypedDict):
+    """_get_multiple_documents_content 的返回结构"""
+    documents: Dict[str, str]  # doc_id -> markdown
+    document_names: Dict[str, str]  # doc_id -> 文档名称
+    failed: List[str]
+
 
 class RAGService:
     """RAG 服务"""
@@ -40,21 +66,36 @@ class RAGService:
         """
         # 如果指定了知识库，使用知识库所有者的索引
         if kb_id:
-            kb = await self.kb_repo.get_by_id_any(kb_id)
-            if kb:
-                owner_id = str(kb.owner_id)
-                owner_index = get_user_es_index(owner_id)
+            owner_index = await self._resolve_owner_index(kb_id)
+            if owner_index:
                 return [owner_index]
         
         # 默认使用当前用户的索引
         user_index = get_user_es_index(str(user_id))
         return [user_index]
     
+    async def _resolve_owner_index(self, kb_id: str) -> Optional[str]:
+        """知识库所有者的 ES 索引名（带 TTL 缓存），知识库不存在时返回 None"""
+        owner_index = _kb_owner_index_cache.get(kb_id)
+        if owner_index is not None:
+            return owner_index or None
+        
+        # 使用独立会话查询，便于与 _get_doc_ids 并发执行（AsyncSession 不能被并发使用）
+        async with AsyncSessionLocal() as db:
+            kb = await KnowledgeBaseRepository(db).get_by_id_any(kb_id)
+        if not kb:
+            _kb_owner_index_cache.set(kb_id, _KB_MISSING, ttl=_KB_MISSING_TTL)
+            return None
+        
+        owner_index = get_user_es_index(str(kb.owner_id))
+        _kb_owner_index_cache.set(kb_id, owner_index)
+        return owner_index
+    
     async def _get_doc_ids(
         self, 
         kb_id: Optional[str] = None, 
         doc_ids: Optional[List[str]] = None
-    ) -> Optional[List[str]]:
+    ) -> Tuple[Optional[List[str]], Optional[str]]:
         """
         获取文档ID列表
         
@@ -63,25 +104,34 @@ class RAGService:
             doc_ids: 明确指定的文档ID列表（可选）
             
         Returns:
-            Optional[List[str]]: 文档ID列表，None 表示不限制
+            (文档ID列表, 逗号拼接的ID字符串)；列表为 None 表示不限制
         """
         if doc_ids:
             # 如果明确指定了文档ID，直接返回
-            return doc_ids
+            return doc_ids, None
         
         if kb_id:
+            cached = _kb_doc_ids_cache.get(kb_id)
+            if cached is not None:
+                return cached
+            
             # 如果指定了知识库，返回该知识库下的所有文档ID
             try:
                 # 直接使用get_all_doc_ids方法（返回字符串ID列表）
                 doc_ids_list = await self.doc_repo.get_all_doc_ids(kb_id)
                 logger.info(f"Found {len(doc_ids_list)} documents in kb {kb_id}")
-                return doc_ids_list if doc_ids_list else None
+                if not doc_ids_list:
+                    # 空结果不缓存：(None, None) 表示“不限制”，首个文档上传后必须立即生效
+                    return None, None
+                result = (doc_ids_list, ",".join(doc_ids_list))
+                _kb_doc_ids_cache.set(kb_id, result)
+                return result
             except Exception as e:
                 logger.error(f"Failed to get doc IDs for kb {kb_id}: {e}", exc_info=True)
-                return None
+                return None, None
         
         # 不限制文档范围
-        return None
+        return None, None
     
     async def _get_single_document_content(
         self,
@@ -126,7 +176,7 @@ class RAGService:
         doc_ids: List[str],
         kb_id: str,
         user_id: UUID
-    ) -> dict:
+    ) -> DocumentsBatch:
         """
         批量获取多个文档的markdown内容（用于多文档总结模式）
         
@@ -173,11 +223,37 @@ class RAGService:
             logger.error(f"Failed to batch load markdown content: {e}")
             return {"documents": {}, "document_names": {}, "failed": []}
     
+    async def _stream_multiple_documents_content(
+        self,
+        doc_ids: List[str],
+        kb_id: str,
+        user_id: UUID
+    ) -> Tuple[Dict[str, str], Optional[AsyncIterator[Tuple[str, bytes]]]]:
+        """
+        流式获取多个文档的markdown内容（AGENT_STREAM_UPLOAD 模式）
+        
+        Returns:
+            (文档名称映射, 按下载完成顺序产出 (doc_id, markdown_bytes) 的异步迭代器)
+        """
+        try:
+            from services.document_service import DocumentService
+            
+            doc_service = DocumentService(self.db)
+            return await doc_service.stream_documents_markdown(
+                doc_ids=doc_ids,
+                kb_id=kb_id,
+                user_id=str(user_id)
+            )
+        except Exception as e:
+            logger.error(f"Failed to prepare markdown stream: {e}")
+            return {}, None
+    
     
     async def chat_stream(
         self,
         request: ChatRequest,
-        user: User
+        user: User,
+        is_member: Optional[bool] = None
     ) -> AsyncGenerator[StreamChunk, None]:
         """
         流式聊天（使用Agent System）
@@ -185,27 +261,34 @@ class RAGService:
         Args:
             request: 前端聊天请求
             user: 用户对象（包含会员等级信息）
+            is_member: 调用方已计算的会员状态（不传则由 user 计算）
             
         Yields:
             StreamChunk: 流式响应块
         """
         user_id = user.id
-        is_member = user.is_member()
+        if is_member is None:
+            is_member = user.is_member()
+        llm_config = rag_settings.get_llm_config(is_member)
         
         logger.info(f"Chat stream: user={user.email}, is_member={is_member}")
         
         try:
-            index_names = await self._get_es_index_names(user_id, request.kb_id)
-            
             doc_ids = None
+            doc_ids_joined = None
             content = None
             document_contents = None
+            document_stream = None
             document_names = None
             
             if request.mode == 'search':
                 logger.info(f"Web search mode: session={request.session_id}")
+                index_names = await self._get_es_index_names(user_id, request.kb_id)
             else:
-                doc_ids = await self._get_doc_ids(request.kb_id, request.doc_ids)
+                index_names, (doc_ids, doc_ids_joined) = await asyncio.gather(
+                    self._get_es_index_names(user_id, request.kb_id),
+                    self._get_doc_ids(request.kb_id, request.doc_ids)
+                )
                 
                 logger.info(f"KB mode: session={request.session_id}, kb={request.kb_id}, docs={len(doc_ids) if doc_ids else 0}")
                 
@@ -215,14 +298,21 @@ class RAGService:
                         kb_id=request.kb_id,
                         user_id=user_id
                     )
+                elif doc_ids and len(doc_ids) > 1 and request.kb_id and rag_settings.AGENT_STREAM_UPLOAD:
+                    # 边下载边上传：Agent System 无需等待最慢的文档加载完成
+                    document_names, document_stream = await self._stream_multiple_documents_content(
+                        doc_ids=doc_ids,
+                        kb_id=request.kb_id,
+                        user_id=user_id
+                    )
                 elif doc_ids and len(doc_ids) > 1 and request.kb_id:
                     batch_result = await self._get_multiple_documents_content(
                         doc_ids=doc_ids,
                         kb_id=request.kb_id,
                         user_id=user_id
                     )
-                    document_contents = batch_result.get("documents", {}) if isinstance(batch_result, dict) else batch_result
-                    document_names = batch_result.get("document_names", {}) if isinstance(batch_result, dict) else {}
+                    document_contents = batch_result["documents"]
+                    document_names = batch_result["document_names"]
             
             async for chunk in agent_client.stream_chat_completion(
                 user_query=request.message,
@@ -230,8 +320,10 @@ class RAGService:
                 mode=request.mode,
                 index_names=index_names,
                 doc_ids=doc_ids,
+                doc_ids_joined=doc_ids_joined,
                 content=content,
                 document_contents=document_contents,
+                document_stream=document_stream,
                 document_names=document_names,
                 kb_id=request.kb_id,
                 user_id=str(user_id),
@@ -239,7 +331,7 @@ class RAGService:
                 show_thinking=request.show_thinking,
                 mode_type=request.mode_type,
                 refresh_summary_cache=request.refresh_summary_cache,
-                is_member=is_member
+                llm_config=llm_config
             ):
                 yield chunk
         
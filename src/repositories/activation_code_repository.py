@@ -1,11 +1,16 @@
 """Activation code repository for database operations."""
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, or_
+from sqlalchemy import Row, bindparam, select, update, and_, or_, tuple_
 from typing import Optional, List
 from datetime import datetime, timezone
 from models.activation_code import ActivationCode
+from utils.pagination import Cursor
 import uuid
 
+# Point lookups built once; only the bound parameters change per call
+_GET_BY_CODE = select(ActivationCode).where(ActivationCode.code == bindparam("code"))
+_GET_BY_ID = select(ActivationCode).where(ActivationCode.id == bindparam("code_id"))
+
 
 class ActivationCodeRepository:
     """Repository for ActivationCode model."""
@@ -47,22 +52,48 @@ class ActivationCodeRepository:
             used_count=0,
         )
         self.db.add(activation_code)
-        await self.db.commit()
-        await self.db.refresh(activation_code)
+        await self.db.flush()
         return activation_code
     
+    async def create_many(
+        self,
+        codes: List[str],
+        type: str,
+        duration_days: Optional[int],
+        max_usage: int,
+        created_by: Optional[uuid.UUID],
+        expires_at: Optional[datetime] = None
+    ) -> List[ActivationCode]:
+        """
+        Create a batch of activation codes sharing the same settings.
+        
+        One multi-row INSERT ... RETURNING instead of one INSERT per code.
+        
+        Returns:
+            Created activation codes, in the order of `codes`
+        """
+        return await ActivationCode.bulk_insert(self.db, [
+            {
+                "code": code,
+                "type": type,
+                "duration_days": duration_days,
+                "max_usage": max_usage,
+                "created_by": created_by,
+                "expires_at": expires_at,
+                "is_active": True,
+                "used_count": 0,
+            }
+            for code in codes
+        ])
+    
     async def get_by_code(self, code: str) -> Optional[ActivationCode]:
         """Get activation code by code string."""
-        result = await self.db.execute(
-            select(ActivationCode).where(ActivationCode.code == code)
-        )
+        result = await self.db.execute(_GET_BY_CODE, {"code": code})
         return result.scalar_one_or_none()
     
     async def get_by_id(self, code_id: uuid.UUID) -> Optional[ActivationCode]:
         """Get activation code by ID."""
-        result = await self.db.execute(
-            select(ActivationCode).where(ActivationCode.id == code_id)
-        )
+        result = await self.db.execute(_GET_BY_ID, {"code_id": code_id})
         return result.scalar_one_or_none()
     
     async def list_codes(
@@ -70,21 +101,23 @@ class ActivationCodeRepository:
         type: Optional[str] = None,
         is_active: Optional[bool] = None,
         limit: int = 100,
-        offset: int = 0
-    ) -> List[ActivationCode]:
+        offset: int = 0,
+        cursor: Optional[Cursor] = None
+    ) -> List[Row]:
         """
-        List activation codes with filters.
+        List activation codes with filters (ActivationCode.columns_for_list() Rows, read-only).
         
         Args:
             type: Filter by type (member/premium)
             is_active: Filter by active status
             limit: Maximum number of codes to return
-            offset: Offset for pagination
+            offset: Offset for pagination (ignored when cursor is given)
+            cursor: (created_at, id) of the previous page's last row for keyset pagination
             
         Returns:
             List of activation codes
         """
-        query = select(ActivationCode)
+        query = select(*ActivationCode.columns_for_list())
         
         # Apply filters
         filters = []
@@ -92,18 +125,22 @@ class ActivationCodeRepository:
             filters.append(ActivationCode.type == type)
         if is_active is not None:
             filters.append(ActivationCode.is_active == is_active)
+        if cursor is not None:
+            filters.append(tuple_(ActivationCode.created_at, ActivationCode.id) < cursor)
         
         if filters:
             query = query.where(and_(*filters))
         
         # Order by created_at descending
-        query = query.order_by(ActivationCode.created_at.desc())
+        query = query.order_by(ActivationCode.created_at.desc(), ActivationCode.id.desc())
         
         # Apply pagination
-        query = query.limit(limit).offset(offset)
+        query = query.limit(limit)
+        if cursor is None:
+            query = query.offset(offset)
         
         result = await self.db.execute(query)
-        return list(result.scalars().all())
+        return list(result.all())
     
     async def deactivate(self, code: str) -> bool:
         """
@@ -115,13 +152,14 @@ class ActivationCodeRepository:
         Returns:
             True if deactivated, False if not found
         """
-        activation_code = await self.get_by_code(code)
-        if not activation_code:
-            return False
-        
-        activation_code.is_active = False
-        await self.db.commit()
-        return True
+        result = await self.db.execute(
+            update(ActivationCode)
+            .where(ActivationCode.code == code)
+            .values(is_active=False)
+            .returning(ActivationCode.id)
+        )
+        deactivated = result.scalar_one_or_none() is not None
+        return deactivated
     
     async def increment_usage(self, code_id: uuid.UUID) -> ActivationCode:
         """
@@ -133,13 +171,18 @@ class ActivationCodeRepository:
         Returns:
             Updated activation code
         """
-        activation_code = await self.get_by_id(code_id)
-        if not activation_code:
+        # Atomic read-modify-write in the database; concurrent activations can't lose an increment
+        result = await self.db.execute(
+            update(ActivationCode)
+            .where(ActivationCode.id == code_id)
+            .values(used_count=ActivationCode.used_count + 1)
+            .returning(ActivationCode)
+            .execution_options(populate_existing=True)
+        )
+        activation_code = result.scalar_one_or_none()
+        if activation_code is None:
             raise ValueError("Activation code not found")
         
-        activation_code.used_count += 1
-        await self.db.commit()
-        await self.db.refresh(activation_code)
         return activation_code
     
     async def count_by_type(self, type: str) -> int:
@@ -147,7 +190,8 @@ class ActivationCodeRepository:
         from sqlalchemy import func
         
         result = await self.db.execute(
-            select(func.count(ActivationCode.id))
+            select(func.count())
+            .select_from(ActivationCode)
             .where(ActivationCode.type == type)
         )
         return result.scalar() or 0
@@ -2,17 +2,31 @@
 聊天会话数据访问层
 """
 from typing import List, Optional, Dict
-from uuid import UUID
+from uuid import UUID, uuid4
 from datetime import datetime, timezone
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, desc, func, update, delete
-from sqlalchemy.orm import joinedload
+from sqlalchemy import Row, select, desc, func, insert, literal, update, delete, tuple_
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import raiseload, selectinload
 
-from models.chat_session import ChatSession, ChatMessage
+from models.chat_session import ChatSession, ChatMessage, RELATIVE_TIME_EXPR
+from utils.pagination import Cursor
+
+# _insert_message 中 INSERT ... SELECT 的列顺序
+_MESSAGE_INSERT_COLUMNS = (
+    "id", "session_id", "role", "content", "thinking", "mode", "created_at", "document_summaries"
+)
 
 
 class ChatRepository:
-    """聊天会话仓储"""
+    """
+    聊天会话仓储
+    
+    依赖的索引（见模型 __table_args__ 与 migrations/008、009）：
+    - chat_sessions (user_id, updated_at DESC, id DESC)：会话列表 keyset 分页
+    - chat_messages (session_id, created_at)：消息列表 / 会话统计
+    - chat_messages (session_id, role, created_at DESC)：删除最后一条 AI 回复
+    """
     
     def __init__(self, db: AsyncSession):
         self.db = db
@@ -30,96 +44,91 @@ class ChatRepository:
             config=config or {}
         )
         self.db.add(session)
-        await self.db.commit()
-        await self.db.refresh(session)
+        await self.db.flush()
         return session
     
     async def get_session(self, session_id: UUID) -> Optional[ChatSession]:
-        """获取聊天会话"""
+        """获取聊天会话（仅会话本身，不加载消息；访问关系属性会直接报错而不是隐式懒加载）"""
+        stmt = select(ChatSession).where(ChatSession.id == session_id).options(raiseload("*"))
+        result = await self.db.execute(stmt)
+        return result.scalar_one_or_none()
+    
+    async def get_session_with_messages(self, session_id: UUID) -> Optional[ChatSession]:
+        """获取聊天会话及其全部消息（selectinload：额外一条 IN 查询，避免 JOIN 按消息数放大会话行）"""
         stmt = select(ChatSession).where(ChatSession.id == session_id).options(
-            joinedload(ChatSession.messages)
+            selectinload(ChatSession.messages)
         )
         result = await self.db.execute(stmt)
-        return result.unique().scalar_one_or_none()
+        return result.scalar_one_or_none()
     
     async def list_user_sessions(
         self, 
         user_id: UUID, 
         page: int = 1, 
-        page_size: int = 50
-    ) -> List[ChatSession]:
-        """获取用户的所有聊天会话"""
+        page_size: int = 50,
+        cursor: Optional[Cursor] = None
+    ) -> List[Row]:
+        """
+        获取用户的所有聊天会话（ChatSession.columns_for_list() + relative_time 的只读 Row）
+        
+        传入 cursor（上一页最后一行的 (updated_at, id)）时使用 keyset 分页，忽略 page。
+        """
         stmt = (
-            select(ChatSession)
+            select(*ChatSession.columns_for_list(), RELATIVE_TIME_EXPR)
             .where(ChatSession.user_id == user_id)
-            .order_by(desc(ChatSession.updated_at))
-            .offset((page - 1) * page_size)
+            .order_by(desc(ChatSession.updated_at), desc(ChatSession.id))
             .limit(page_size)
         )
+        if cursor is not None:
+            stmt = stmt.where(tuple_(ChatSession.updated_at, ChatSession.id) < cursor)
+        else:
+            stmt = stmt.offset((page - 1) * page_size)
         result = await self.db.execute(stmt)
-        return list(result.scalars().all())
+        return list(result.all())
     
     async def update_session_title(self, session_id: UUID, title: str) -> Optional[ChatSession]:
         """更新会话标题"""
-        session = await self.get_session(session_id)
-        if not session:
-            return None
-
-        session.title = title
-        await self.db.commit()
-        await self.db.refresh(session)
+        result = await self.db.execute(
+            update(ChatSession)
+            .where(ChatSession.id == session_id)
+            .values(title=title)
+            .returning(ChatSession)
+            .execution_options(populate_existing=True)
+        )
+        session = result.scalar_one_or_none()
         return session
 
     async def update_session_config(self, session_id: UUID, config_updates: Dict) -> Optional[ChatSession]:
         """更新会话配置（部分更新）"""
-        # 只查询会话本身，不加载消息
-        stmt = select(ChatSession).where(ChatSession.id == session_id)
-        result = await self.db.execute(stmt)
-        session = result.scalar_one_or_none()
-
-        if not session:
-            return None
-
-        # 合并配置：保留原有配置，只更新传入的字段
-        current_config = session.config or {}
-        updated_config = {**current_config, **config_updates}
-
-        session.config = updated_config
-        await self.db.commit()
-        await self.db.refresh(session)
-        return session
+        # 合并配置在数据库内完成：config || updates 为浅合并，等价于 {**current, **updates}
+        # 单条 UPDATE ... RETURNING，不必先查出会话，也不会与并发更新互相覆盖
+        merged = func.coalesce(ChatSession.config, literal({}, JSONB)).op("||", return_type=JSONB)(
+            literal(config_updates, JSONB)
+        )
+        result = await self.db.execute(
+            update(ChatSession)
+            .where(ChatSession.id == session_id)
+            .values(config=merged)
+            .returning(ChatSession)
+            .execution_options(populate_existing=True)
+        )
+        return result.scalar_one_or_none()
     
     async def delete_session(self, session_id: UUID) -> bool:
         """删除聊天会话"""
-        # ✅ 修复：只查询会话本身，不加载消息（性能优化）
+        # 直接 DELETE，不加载会话或消息（ORM 级联删除会先加载全部消息）
         # 数据库的 CASCADE DELETE 会自动删除关联消息
-        stmt = select(ChatSession).where(ChatSession.id == session_id)
+        stmt = delete(ChatSession).where(ChatSession.id == session_id)
         result = await self.db.execute(stmt)
-        session = result.scalar_one_or_none()
-
-        if not session:
-            return False
-
-        await self.db.delete(session)
-        await self.db.commit()
-        return True
+        return result.rowcount > 0
 
     async def delete_all_user_sessions(self, user_id: UUID) -> int:
         """删除用户的所有聊天会话"""
-        from sqlalchemy import delete
-        
-        # 先统计要删除的数量
-        count_stmt = select(ChatSession).where(ChatSession.user_id == user_id)
-        result = await self.db.execute(count_stmt)
-        sessions = result.scalars().all()
-        deleted_count = len(sessions)
-        
-        # 删除所有会话（CASCADE 会自动删除关联消息）
+        # 删除所有会话（CASCADE 会自动删除关联消息），删除数量直接取 rowcount，无需先查出全部会话
         delete_stmt = delete(ChatSession).where(ChatSession.user_id == user_id)
-        await self.db.execute(delete_stmt)
-        await self.db.commit()
+        result = await self.db.execute(delete_stmt)
         
-        return deleted_count
+        return result.rowcount
     
     async def add_message(
         self,
@@ -129,30 +138,12 @@ class ChatRepository:
         thinking: Optional[str] = None,
         mode: Optional[str] = None,
         document_summaries: Optional[list] = None
-    ) -> ChatMessage:
-        """添加消息到会话"""
-        message = ChatMessage(
-            session_id=session_id,
-            role=role,
-            content=content,
-            thinking=thinking,
-            mode=mode,
-            document_summaries=document_summaries
-        )
-        self.db.add(message)
-        await self.db.flush()  # ✅ 确保 message.created_at 已生成
-
-        # ✅ 修复：使用 update 语句直接更新，避免加载所有消息（性能优化）
-        update_stmt = (
-            update(ChatSession)
-            .where(ChatSession.id == session_id)
-            .values(updated_at=message.created_at)
+    ) -> Optional[ChatMessage]:
+        """添加消息到会话（会话不存在时返回 None）"""
+        return await self._insert_message(
+            [ChatSession.id == session_id],
+            role, content, thinking, mode, document_summaries
         )
-        await self.db.execute(update_stmt)
-
-        await self.db.commit()
-        await self.db.refresh(message)
-        return message
 
     async def add_message_with_ownership_check(
         self,
@@ -165,40 +156,54 @@ class ChatRepository:
         document_summaries: Optional[list] = None
     ) -> Optional[ChatMessage]:
         """✅ 原子性地验证会话所有权并添加消息"""
-        # 使用子查询验证所有权，避免额外的数据库查询
-        stmt = select(ChatSession.id).where(
-            ChatSession.id == session_id,
-            ChatSession.user_id == user_id
+        return await self._insert_message(
+            [ChatSession.id == session_id, ChatSession.user_id == user_id],
+            role, content, thinking, mode, document_summaries
         )
-        result = await self.db.execute(stmt)
-        session_exists = result.scalar_one_or_none()
 
-        if not session_exists:
-            return None
-
-        # 会话存在且属于用户，添加消息
-        message = ChatMessage(
-            session_id=session_id,
-            role=role,
-            content=content,
-            thinking=thinking,
-            mode=mode,
-            document_summaries=document_summaries
-        )
-        self.db.add(message)
-        await self.db.flush()  # ✅ 确保 message.created_at 已生成
-
-        # ✅ 修复：使用 update 语句直接更新，避免加载所有消息（性能优化）
-        update_stmt = (
+    async def _insert_message(
+        self,
+        session_filters: list,
+        role: str,
+        content: str,
+        thinking: Optional[str],
+        mode: Optional[str],
+        document_summaries: Optional[list]
+    ) -> Optional[ChatMessage]:
+        """
+        单条语句完成：校验会话 + 更新会话 updated_at + 插入消息并 RETURNING
+        
+        WITH owned AS (UPDATE chat_sessions SET updated_at = :now WHERE ... RETURNING id)
+        INSERT INTO chat_messages (...) SELECT ... FROM owned RETURNING *
+        会话不存在（或不属于该用户）时 owned 为空，不插入任何行，返回 None。
+        """
+        now = datetime.utcnow()
+        owned = (
             update(ChatSession)
-            .where(ChatSession.id == session_id)
-            .values(updated_at=message.created_at)
+            .where(*session_filters)
+            .values(updated_at=now)
+            .returning(ChatSession.id)
+            .cte("owned")
         )
-        await self.db.execute(update_stmt)
-
-        await self.db.commit()
-        await self.db.refresh(message)
-        return message
+        # 参数按列类型绑定（asyncpg 方言渲染为 $n::TYPE），INSERT ... SELECT 的投影无需再推断类型
+        columns = ChatMessage.__table__.c
+        values = select(
+            literal(uuid4(), columns.id.type),
+            owned.c.id,
+            literal(role, columns.role.type),
+            literal(content, columns.content.type),
+            literal(thinking, columns.thinking.type),
+            literal(mode, columns.mode.type),
+            literal(now, columns.created_at.type),
+            literal(document_summaries, columns.document_summaries.type),
+        )
+        stmt = (
+            insert(ChatMessage)
+            .from_select(_MESSAGE_INSERT_COLUMNS, values)
+            .add_cte(owned)
+            .returning(ChatMessage)
+        )
+        return (await self.db.execute(stmt)).scalar_one_or_none()
 
     async def get_session_messages(self, session_id: UUID) -> List[ChatMessage]:
         """获取会话的所有消息"""
@@ -210,26 +215,47 @@ class ChatRepository:
         result = await self.db.execute(stmt)
         return list(result.scalars().all())
     
-    async def get_session_stats(self, session_id: UUID) -> Dict:
-        """获取会话统计信息（消息数量和最后一条消息）"""
-        # 获取消息数量
-        count_stmt = select(func.count(ChatMessage.id)).where(ChatMessage.session_id == session_id)
-        count_result = await self.db.execute(count_stmt)
-        message_count = count_result.scalar() or 0
+    async def list_session_messages(
+        self,
+        session_id: UUID,
+        limit: int = 200,
+        cursor: Optional[Cursor] = None
+    ) -> List[ChatMessage]:
+        """
+        按时间正序分页读取会话消息（keyset：传入上一页最后一行的 (created_at, id)）
         
-        # 获取最后一条消息
-        last_msg_stmt = (
+        每页一次普通查询，不占用服务端游标，长会话也只物化 limit 行。
+        """
+        stmt = (
             select(ChatMessage)
             .where(ChatMessage.session_id == session_id)
+            .order_by(ChatMessage.created_at, ChatMessage.id)
+            .limit(limit)
+        )
+        if cursor is not None:
+            stmt = stmt.where(tuple_(ChatMessage.created_at, ChatMessage.id) > cursor)
+        result = await self.db.execute(stmt)
+        return list(result.scalars().all())
+    
+    async def get_session_stats(self, session_id: UUID) -> Dict:
+        """获取会话统计信息（消息数量和最后一条消息）"""
+        # 一次查询：窗口函数在 LIMIT 之前计算，count(*) OVER () 即会话的消息总数
+        stmt = (
+            select(
+                func.count(ChatMessage.id).over().label("cnt"),
+                func.left(ChatMessage.content, 50).label("content")
+            )
+            .where(ChatMessage.session_id == session_id)
             .order_by(desc(ChatMessage.created_at))
             .limit(1)
         )
-        last_msg_result = await self.db.execute(last_msg_stmt)
-        last_message = last_msg_result.scalar_one_or_none()
+        row = (await self.db.execute(stmt)).first()
+        if row is None:
+            return {"messageCount": 0, "lastMessage": ""}
         
         return {
-            "messageCount": message_count,
-            "lastMessage": last_message.content[:50] if last_message else ""
+            "messageCount": row.cnt,
+            "lastMessage": row.content or ""
         }
 
     async def delete_last_assistant_message(
@@ -247,45 +273,42 @@ class ChatRepository:
         Returns:
             被删除的消息ID，如果没有找到则返回 None
         """
-        # 先验证会话所有权
-        session_stmt = select(ChatSession.id).where(
-            ChatSession.id == session_id,
-            ChatSession.user_id == user_id
-        )
-        session_result = await self.db.execute(session_stmt)
-        if not session_result.scalar_one_or_none():
-            return None
+        messages = ChatMessage.__table__
+        sessions = ChatSession.__table__
         
-        # 查找最后一条 assistant 消息
-        last_assistant_stmt = (
-            select(ChatMessage)
+        # 单条语句完成：所有权校验 + 定位最后一条 assistant 消息 + 删除 + 更新会话 updated_at
+        owned = (
+            select(sessions.c.id)
+            .where(sessions.c.id == session_id, sessions.c.user_id == user_id)
+            .exists()
+        )
+        victim = (
+            select(messages.c.id)
             .where(
-                ChatMessage.session_id == session_id,
-                ChatMessage.role == 'assistant'
+                messages.c.session_id == session_id,
+                messages.c.role == 'assistant',
+                owned
             )
-            .order_by(desc(ChatMessage.created_at))
+            .order_by(desc(messages.c.created_at))
             .limit(1)
+            .cte("victim")
         )
-        result = await self.db.execute(last_assistant_stmt)
-        last_assistant_message = result.scalar_one_or_none()
-        
-        if not last_assistant_message:
-            return None
-        
-        deleted_id = str(last_assistant_message.id)
-        
-        # 删除该消息
-        await self.db.delete(last_assistant_message)
-        
-        # 更新会话的 updated_at 时间戳
-        update_stmt = (
-            update(ChatSession)
-            .where(ChatSession.id == session_id)
+        deleted = (
+            delete(messages)
+            .where(messages.c.id.in_(select(victim.c.id)))
+            .returning(messages.c.id)
+            .cte("deleted")
+        )
+        touched = (
+            update(sessions)
+            .where(sessions.c.id == session_id, select(deleted.c.id).exists())
             .values(updated_at=datetime.utcnow())
+            .returning(sessions.c.id)
+            .cte("touched")
         )
-        await self.db.execute(update_stmt)
+        stmt = select(deleted.c.id).add_cte(touched)
         
-        await self.db.commit()
+        deleted_id = (await self.db.execute(stmt)).scalar_one_or_none()
         
-        return deleted_id
+        return str(deleted_id) if deleted_id else None
 
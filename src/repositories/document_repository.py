@@ -1,8 +1,16 @@
 """Document repository for database operations."""
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, delete as sql_delete
+from sqlalchemy.orm import raiseload
+from sqlalchemy import Row, String, cast, select, func, update, tuple_, delete as sql_delete
 from typing import Optional, List, Tuple
 from models.document import Document
+from utils.pagination import Cursor
+
+# Mapped column attributes accepted by update_status(**kwargs)
+_DOCUMENT_COLUMNS = frozenset(Document.__mapper__.column_attrs.keys())
+
+# Max IDs per DELETE statement in batch_delete
+BATCH_DELETE_CHUNK_SIZE = 1000
 
 
 class DocumentRepository:
@@ -17,7 +25,7 @@ class DocumentRepository:
             select(Document).where(
                 Document.id == doc_id,
                 Document.kb_id == kb_id
-            )
+            ).options(raiseload("*"))
         )
         return result.scalar_one_or_none()
     
@@ -25,30 +33,48 @@ class DocumentRepository:
         self,
         kb_id: str,
         page: int = 1,
-        page_size: int = 20
-    ) -> Tuple[List[Document], int]:
-        """List documents in knowledge base."""
-        stmt = select(Document).where(Document.kb_id == kb_id)
+        page_size: int = 20,
+        cursor: Optional[Cursor] = None
+    ) -> Tuple[List[Row], int]:
+        """
+        List documents in knowledge base (Document.columns_for_list() Rows, read-only).
         
+        With a cursor (created_at, id of the previous page's last row) the page is
+        fetched by keyset and `page` is ignored.
+        """
         # Count total
-        count_stmt = select(func.count()).select_from(stmt.subquery())
+        count_stmt = select(func.count()).select_from(Document).where(Document.kb_id == kb_id)
         total = (await self.db.execute(count_stmt)).scalar()
         
         # Paginate
-        stmt = stmt.order_by(Document.created_at.desc())
-        stmt = stmt.limit(page_size).offset((page - 1) * page_size)
+        stmt = select(*Document.columns_for_list()).where(Document.kb_id == kb_id).order_by(Document.created_at.desc(), Document.id.desc())
+        if cursor is not None:
+            stmt = stmt.where(tuple_(Document.created_at, Document.id) < cursor).limit(page_size)
+        else:
+            stmt = stmt.limit(page_size).offset((page - 1) * page_size)
         
         result = await self.db.execute(stmt)
-        documents = result.scalars().all()
-        
-        return list(documents), total or 0
+        return list(result.all()), total or 0
+    
+    async def get_by_ids(self, doc_ids: List[str], kb_id: str) -> List[Document]:
+        """Get multiple documents by ID within specific KB in one query."""
+        if not doc_ids:
+            return []
+        result = await self.db.execute(
+            select(Document).where(
+                Document.id.in_(doc_ids),
+                Document.kb_id == kb_id
+            )
+        )
+        return list(result.scalars().all())
     
     async def get_all_doc_ids(self, kb_id: str) -> List[str]:
-        """Get all document IDs in a knowledge base."""
+        """Get all document IDs in a knowledge base as strings."""
+        # Cast in SQL so the driver returns str directly (no UUID object + str() per row)
         result = await self.db.execute(
-            select(Document.id).where(Document.kb_id == kb_id)
+            select(cast(Document.id, String)).where(Document.kb_id == kb_id)
         )
-        return [str(doc_id) for doc_id in result.scalars().all()]
+        return list(result.scalars().all())
     
     async def create(
         self,
@@ -68,8 +94,7 @@ class DocumentRepository:
             status=Document.STATUS_UPLOADING
         )
         self.db.add(document)
-        await self.db.commit()
-        await self.db.refresh(document)
+        await self.db.flush()
         return document
     
     async def update_status(
@@ -79,40 +104,57 @@ class DocumentRepository:
         **kwargs
     ) -> Document:
         """Update document status and related fields."""
-        doc.status = status
-        for key, value in kwargs.items():
-            if hasattr(doc, key):
-                setattr(doc, key, value)
-        await self.db.commit()
-        await self.db.refresh(doc)
-        return doc
+        values = {key: value for key, value in kwargs.items() if key in _DOCUMENT_COLUMNS}
+        values["status"] = status
+        return await self._update_returning(doc, values)
     
     async def update_markdown_path(self, doc: Document, markdown_path: str) -> Document:
         """Update document markdown path."""
-        doc.markdown_path = markdown_path
-        await self.db.commit()
-        await self.db.refresh(doc)
-        return doc
+        return await self._update_returning(doc, {"markdown_path": markdown_path})
     
     async def delete(self, doc: Document):
         """Delete a document."""
         await self.db.delete(doc)
-        await self.db.commit()
+        await self.db.flush()
     
-    async def batch_delete(self, kb_id: str, doc_ids: List[str]):
-        """Batch delete documents."""
-        await self.db.execute(
-            sql_delete(Document).where(
-                Document.kb_id == kb_id,
-                Document.id.in_(doc_ids)
+    async def batch_delete(self, kb_id: str, doc_ids: List[str]) -> List[str]:
+        """
+        Batch delete documents, returning the IDs that were actually deleted.
+        
+        IDs are deleted in chunks of BATCH_DELETE_CHUNK_SIZE within one transaction,
+        so very large selections don't produce a single huge IN list.
+        """
+        deleted: List[str] = []
+        for start in range(0, len(doc_ids), BATCH_DELETE_CHUNK_SIZE):
+            result = await self.db.execute(
+                sql_delete(Document)
+                .where(
+                    Document.kb_id == kb_id,
+                    Document.id.in_(doc_ids[start:start + BATCH_DELETE_CHUNK_SIZE])
+                )
+                .returning(cast(Document.id, String))
             )
-        )
-        await self.db.commit()
+            deleted.extend(result.scalars().all())
+        return deleted
     
     async def update_kb_id(self, doc: Document, new_kb_id: str) -> Document:
         """Move document to another knowledge base."""
-        doc.kb_id = new_kb_id
-        await self.db.commit()
-        await self.db.refresh(doc)
-        return doc
+        return await self._update_returning(doc, {"kb_id": new_kb_id})
+    
+    async def _update_returning(self, doc: Document, values: dict) -> Document:
+        """
+        Single UPDATE ... RETURNING for one document.
+        
+        populate_existing refreshes the caller's instance (same identity) from the
+        returned row, so no separate SELECT/refresh is needed.
+        """
+        result = await self.db.execute(
+            update(Document)
+            .where(Document.id == doc.id)
+            .values(**values)
+            .returning(Document)
+            .execution_options(populate_existing=True)
+        )
+        updated = result.scalar_one_or_none()
+        return updated or doc
 
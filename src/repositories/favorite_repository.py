@@ -1,7 +1,7 @@
 """Favorite repository for database operations."""
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete, func, desc
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy import Row, bindparam, select, delete, exists, func, desc
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from typing import Optional, List, Tuple
 from models.favorite import Favorite
 from models.knowledge_base import KnowledgeBase
@@ -11,6 +11,13 @@ import uuid
 
 logger = logging.getLogger(__name__)
 
+# Point lookup built once; only the bound parameters change per call
+_GET_FAVORITE = select(Favorite).where(
+    Favorite.user_id == bindparam("user_id"),
+    Favorite.item_type == bindparam("item_type"),
+    Favorite.item_id == bindparam("item_id")
+)
+
 
 class FavoriteRepository:
     """Repository for Favorite model."""
@@ -26,35 +33,28 @@ class FavoriteRepository:
         source: str = Favorite.SOURCE_MANUAL
     ) -> Favorite:
         """Add a favorite (idempotent - returns existing if already exists)."""
-        # Check if already exists
-        existing = await self.get_favorite(user_id, item_type, item_id)
-        if existing:
-            logger.info(f"Favorite already exists: user={user_id}, type={item_type}, item={item_id}")
-            return existing
-        
-        try:
-            # Convert string IDs to UUID
-            user_uuid = uuid.UUID(user_id) if isinstance(user_id, str) else user_id
-            item_uuid = uuid.UUID(item_id) if isinstance(item_id, str) else item_id
-            
-            favorite = Favorite(
-                user_id=user_uuid,
+        # Single statement on the common path; a concurrent duplicate is absorbed by the unique constraint
+        stmt = (
+            pg_insert(Favorite)
+            .values(
+                id=uuid.uuid4(),
+                user_id=user_id,
                 item_type=item_type,
-                item_id=item_uuid,
+                item_id=item_id,
                 source=source
             )
-            self.db.add(favorite)
-            await self.db.commit()
-            await self.db.refresh(favorite)
+            .on_conflict_do_nothing(index_elements=["user_id", "item_type", "item_id"])
+            .returning(Favorite)
+        )
+        favorite = (await self.db.execute(stmt)).scalar_one_or_none()
+        
+        if favorite is None:
+            logger.info(f"Favorite already exists: user={user_id}, type={item_type}, item={item_id}")
+            favorite = await self.get_favorite(user_id, item_type, item_id)
+        else:
             logger.info(f"Created favorite: user={user_id}, type={item_type}, item={item_id}, source={source}")
-            return favorite
-        except IntegrityError:
-            await self.db.rollback()
-            # Race condition: another request created it
-            existing = await self.get_favorite(user_id, item_type, item_id)
-            if existing:
-                return existing
-            raise
+        
+        return favorite
     
     async def remove_favorite(
         self,
@@ -63,18 +63,13 @@ class FavoriteRepository:
         item_id: str
     ) -> bool:
         """Remove a favorite."""
-        # Convert string IDs to UUID
-        user_uuid = uuid.UUID(user_id) if isinstance(user_id, str) else user_id
-        item_uuid = uuid.UUID(item_id) if isinstance(item_id, str) else item_id
-        
         stmt = delete(Favorite).where(
-            Favorite.user_id == user_uuid,
+            Favorite.user_id == user_id,
             Favorite.item_type == item_type,
-            Favorite.item_id == item_uuid
+            Favorite.item_id == item_id
         )
         
         result = await self.db.execute(stmt)
-        await self.db.commit()
         deleted = result.rowcount > 0
         if deleted:
             logger.info(f"Removed favorite: user={user_id}, type={item_type}, item={item_id}")
@@ -89,16 +84,9 @@ class FavoriteRepository:
         item_id: str
     ) -> Optional[Favorite]:
         """Get a specific favorite."""
-        # Convert string IDs to UUID
-        user_uuid = uuid.UUID(user_id) if isinstance(user_id, str) else user_id
-        item_uuid = uuid.UUID(item_id) if isinstance(item_id, str) else item_id
-        
         result = await self.db.execute(
-            select(Favorite).where(
-                Favorite.user_id == user_uuid,
-                Favorite.item_type == item_type,
-                Favorite.item_id == item_uuid
-            )
+            _GET_FAVORITE,
+            {"user_id": user_id, "item_type": item_type, "item_id": item_id}
         )
         return result.scalar_one_or_none()
     
@@ -107,80 +95,68 @@ class FavoriteRepository:
         user_id: str,
         page: int = 1,
         page_size: int = 20
-    ) -> Tuple[List[KnowledgeBase], int]:
-        """List favorite knowledge bases with details."""
-        # Convert string ID to UUID
-        user_uuid = uuid.UUID(user_id) if isinstance(user_id, str) else user_id
-        
-        # Count total
-        count_stmt = select(func.count()).select_from(
-            select(Favorite.id)
-            .where(
-                Favorite.user_id == user_uuid,
-                Favorite.item_type == Favorite.ITEM_TYPE_KB
-            )
-            .subquery()
-        )
-        total = (await self.db.execute(count_stmt)).scalar()
-        
-        # Get favorites with KB details
+    ) -> Tuple[List[Row], int]:
+        """List favorite knowledge bases (KnowledgeBase.columns_for_list() Rows, read-only)."""
+        # Get favorites with KB details; total comes from a window count in the same query
         stmt = (
-            select(KnowledgeBase)
+            select(*KnowledgeBase.columns_for_list(), func.count().over().label("total"))
             .join(
                 Favorite,
                 (Favorite.item_id == KnowledgeBase.id) &
                 (Favorite.item_type == Favorite.ITEM_TYPE_KB)
             )
-            .where(Favorite.user_id == user_uuid)
+            .where(Favorite.user_id == user_id)
             .order_by(desc(Favorite.created_at))
             .limit(page_size)
             .offset((page - 1) * page_size)
         )
         
-        result = await self.db.execute(stmt)
-        kbs = result.scalars().all()
-        
-        return list(kbs), total or 0
+        rows = (await self.db.execute(stmt)).all()
+        if rows:
+            return list(rows), rows[0].total
+        if page > 1:
+            # Page past the end: no row carries the window total
+            return [], await self._count_joined_favorites(KnowledgeBase, Favorite.ITEM_TYPE_KB, user_id)
+        return [], 0
     
     async def list_doc_favorites(
         self,
         user_id: str,
         page: int = 1,
         page_size: int = 20
-    ) -> Tuple[List[Document], int]:
-        """List favorite documents with details."""
-        # Convert string ID to UUID
-        user_uuid = uuid.UUID(user_id) if isinstance(user_id, str) else user_id
-        
-        # Count total
-        count_stmt = select(func.count()).select_from(
-            select(Favorite.id)
-            .where(
-                Favorite.user_id == user_uuid,
-                Favorite.item_type == Favorite.ITEM_TYPE_DOC
-            )
-            .subquery()
-        )
-        total = (await self.db.execute(count_stmt)).scalar()
-        
-        # Get favorites with document details
+    ) -> Tuple[List[Row], int]:
+        """List favorite documents (Document.columns_for_list() Rows, read-only)."""
+        # Get favorites with document details; total comes from a window count in the same query
         stmt = (
-            select(Document)
+            select(*Document.columns_for_list(), func.count().over().label("total"))
             .join(
                 Favorite,
                 (Favorite.item_id == Document.id) &
                 (Favorite.item_type == Favorite.ITEM_TYPE_DOC)
             )
-            .where(Favorite.user_id == user_uuid)
+            .where(Favorite.user_id == user_id)
             .order_by(desc(Favorite.created_at))
             .limit(page_size)
             .offset((page - 1) * page_size)
         )
         
-        result = await self.db.execute(stmt)
-        docs = result.scalars().all()
-        
-        return list(docs), total or 0
+        rows = (await self.db.execute(stmt)).all()
+        if rows:
+            return list(rows), rows[0].total
+        if page > 1:
+            # Page past the end: no row carries the window total
+            return [], await self._count_joined_favorites(Document, Favorite.ITEM_TYPE_DOC, user_id)
+        return [], 0
+    
+    async def _count_joined_favorites(self, model, item_type: str, user_id) -> int:
+        """Count a user's favorites of one type whose target row still exists."""
+        stmt = (
+            select(func.count())
+            .select_from(Favorite)
+            .join(model, Favorite.item_id == model.id)
+            .where(Favorite.user_id == user_id, Favorite.item_type == item_type)
+        )
+        return (await self.db.execute(stmt)).scalar() or 0
     
     async def check_favorite(
         self,
@@ -189,5 +165,11 @@ class FavoriteRepository:
         item_id: str
     ) -> bool:
         """Check if an item is favorited."""
-        favorite = await self.get_favorite(user_id, item_type, item_id)
-        return favorite is not None
+        stmt = select(
+            exists().where(
+                Favorite.user_id == user_id,
+                Favorite.item_type == item_type,
+                Favorite.item_id == item_id
+            )
+        )
+        return bool((await self.db.execute(stmt)).scalar())
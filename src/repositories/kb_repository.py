@@ -1,12 +1,22 @@
 """Knowledge Base repository for database operations with visibility control."""
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, desc, or_, and_, any_
+from sqlalchemy import select, update, exists, func, case, desc, or_, and_, Row
 from typing import Optional, List, Tuple
-from models.knowledge_base import KnowledgeBase, KNOWLEDGE_CATEGORIES
+from models.knowledge_base import KnowledgeBase, KBOrgShare, KNOWLEDGE_CATEGORIES
 from models.document import Document
-from datetime import datetime, timedelta
+from datetime import timedelta
+import logging
 import uuid
 
+logger = logging.getLogger(__name__)
+
+
+def _shared_with_any_org(org_ids: List[uuid.UUID]):
+    """WHERE clause: KB is shared to at least one of org_ids (index lookup on kb_org_shares)."""
+    return KnowledgeBase.id.in_(
+        select(KBOrgShare.kb_id).where(KBOrgShare.org_id.in_(org_ids))
+    )
+
 
 class KnowledgeBaseRepository:
     """Repository for KnowledgeBase model."""
@@ -14,15 +24,45 @@ class KnowledgeBaseRepository:
     def __init__(self, db: AsyncSession):
         self.db = db
     
+    async def _fetch_page(self, stmt, page: int, page_size: int, *order_by) -> Tuple[List[Row], int]:
+        """
+        Fetch one page plus the total in a single query (count(*) OVER () as total_count).
+        
+        Each returned Row is stmt's columns followed by total_count.
+        """
+        rows = (await self.db.execute(
+            stmt.add_columns(func.count().over().label("total_count"))
+            .order_by(*order_by)
+            .limit(page_size)
+            .offset((page - 1) * page_size)
+        )).all()
+        if rows:
+            return rows, rows[0].total_count
+        if page > 1:
+            # Page past the end: no row carries the window total
+            count_stmt = stmt.with_only_columns(func.count(), maintain_column_froms=True)
+            return [], (await self.db.execute(count_stmt)).scalar() or 0
+        return [], 0
+    
+    async def _get_loaded(self, kb_id) -> Optional[KnowledgeBase]:
+        """
+        Primary-key lookup through the session identity map.
+        
+        The session is request-scoped, so a KB already loaded in this request
+        (owner check, then public/admin fallback, ...) is returned without another
+        SELECT; writes go through the same instance, so it never goes stale.
+        """
+        if not isinstance(kb_id, uuid.UUID):
+            try:
+                kb_id = uuid.UUID(str(kb_id))
+            except ValueError:
+                return None
+        return await self.db.get(KnowledgeBase, kb_id)
+    
     async def get_by_id(self, kb_id: str, owner_id: str) -> Optional[KnowledgeBase]:
         """Get knowledge base by ID for specific owner."""
-        result = await self.db.execute(
-            select(KnowledgeBase).where(
-                KnowledgeBase.id == kb_id,
-                KnowledgeBase.owner_id == owner_id
-            )
-        )
-        return result.scalar_one_or_none()
+        kb = await self._get_loaded(kb_id)
+        return kb if kb is not None and str(kb.owner_id) == str(owner_id) else None
     
     async def check_name_exists(self, owner_id: str, name: str, exclude_kb_id: Optional[str] = None) -> bool:
         """
@@ -36,32 +76,25 @@ class KnowledgeBaseRepository:
         Returns:
             True if name exists, False otherwise
         """
-        query = select(KnowledgeBase).where(
+        # EXISTS over idx_kb_owner_lower_name: one index probe, no row materialized
+        conditions = [
             KnowledgeBase.owner_id == owner_id,
             func.lower(KnowledgeBase.name) == func.lower(name)
-        )
+        ]
         if exclude_kb_id:
-            query = query.where(KnowledgeBase.id != exclude_kb_id)
+            conditions.append(KnowledgeBase.id != exclude_kb_id)
         
-        result = await self.db.execute(query)
-        return result.scalar_one_or_none() is not None
+        result = await self.db.execute(select(exists().where(*conditions)))
+        return result.scalar()
     
     async def get_by_id_public(self, kb_id: str) -> Optional[KnowledgeBase]:
         """Get public knowledge base by ID (no owner check, using visibility field)."""
-        result = await self.db.execute(
-            select(KnowledgeBase).where(
-                KnowledgeBase.id == kb_id,
-                KnowledgeBase.visibility == 'public'
-            )
-        )
-        return result.scalar_one_or_none()
+        kb = await self._get_loaded(kb_id)
+        return kb if kb is not None and kb.visibility == 'public' else None
     
     async def get_by_id_any(self, kb_id: str) -> Optional[KnowledgeBase]:
         """Get knowledge base by ID without any access checks (for admin users)."""
-        result = await self.db.execute(
-            select(KnowledgeBase).where(KnowledgeBase.id == kb_id)
-        )
-        return result.scalar_one_or_none()
+        return await self._get_loaded(kb_id)
     
     async def list_kbs(
         self,
@@ -69,25 +102,14 @@ class KnowledgeBaseRepository:
         query: Optional[str] = None,
         page: int = 1,
         page_size: int = 20
-    ) -> Tuple[List[KnowledgeBase], int]:
-        """List knowledge bases for user."""
-        stmt = select(KnowledgeBase).where(KnowledgeBase.owner_id == owner_id)
+    ) -> Tuple[List[Row], int]:
+        """List knowledge bases for user (plain rows of KnowledgeBase.columns_for_list(), read-only)."""
+        stmt = select(*KnowledgeBase.columns_for_list()).where(KnowledgeBase.owner_id == owner_id)
         
         if query:
             stmt = stmt.where(KnowledgeBase.name.ilike(f"%{query}%"))
         
-        # Count total
-        count_stmt = select(func.count()).select_from(stmt.subquery())
-        total = (await self.db.execute(count_stmt)).scalar()
-        
-        # Paginate
-        stmt = stmt.order_by(KnowledgeBase.created_at.desc())
-        stmt = stmt.limit(page_size).offset((page - 1) * page_size)
-        
-        result = await self.db.execute(stmt)
-        kbs = result.scalars().all()
-        
-        return list(kbs), total or 0
+        return await self._fetch_page(stmt, page, page_size, KnowledgeBase.created_at.desc())
     
     async def create(
         self,
@@ -108,8 +130,7 @@ class KnowledgeBaseRepository:
             category=category
         )
         self.db.add(kb)
-        await self.db.commit()
-        await self.db.refresh(kb)
+        await self.db.flush()
         return kb
     
     async def update(self, kb: KnowledgeBase, **kwargs) -> KnowledgeBase:
@@ -117,32 +138,43 @@ class KnowledgeBaseRepository:
         for key, value in kwargs.items():
             if hasattr(kb, key) and value is not None:
                 setattr(kb, key, value)
-        await self.db.commit()
-        await self.db.refresh(kb)
+        await self.db.flush()
         return kb
     
     async def delete(self, kb: KnowledgeBase):
         """Delete a knowledge base."""
         await self.db.delete(kb)
-        await self.db.commit()
+        await self.db.flush()
     
     async def calculate_total_size(self, owner_id: str) -> int:
         """Calculate total storage used by user."""
+        # Semi-join: owner's KB ids from idx_kb_owner_created, then an index-only
+        # SUM over idx_kb_documents_kb_size (kb_id INCLUDE size)
+        owner_kb_ids = select(KnowledgeBase.id).where(KnowledgeBase.owner_id == owner_id)
         result = await self.db.execute(
-            select(func.sum(Document.size)).select_from(Document).join(
-                KnowledgeBase
-            ).where(KnowledgeBase.owner_id == owner_id)
+            select(func.sum(Document.size)).where(Document.kb_id.in_(owner_kb_ids))
         )
         total = result.scalar()
         return total or 0
     
     async def increment_contents_count(self, kb_id: str, delta: int = 1):
-        """Increment contents count."""
-        kb = await self.db.get(KnowledgeBase, kb_id)
-        if kb:
-            kb.contents_count += delta
-            kb.last_updated_at = datetime.utcnow()
-            await self.db.commit()
+        """
+        Increment contents count (single atomic UPDATE, timestamp computed by the DB).
+        
+        RETURNING + populate_existing keeps an already-loaded instance of this KB
+        in sync, since now() cannot be evaluated in Python.
+        """
+        result = await self.db.execute(
+            update(KnowledgeBase)
+            .where(KnowledgeBase.id == kb_id)
+            .values(
+                contents_count=KnowledgeBase.contents_count + delta,
+                last_updated_at=func.now()
+            )
+            .returning(KnowledgeBase)
+            .execution_options(populate_existing=True)
+        )
+        result.scalar_one_or_none()
     
     async def toggle_public(self, kb: KnowledgeBase) -> KnowledgeBase:
         """
@@ -160,16 +192,16 @@ class KnowledgeBaseRepository:
             kb.is_public = True
             kb.shared_to_orgs = []  # 公开时清空组织共享
         
-        await self.db.commit()
-        await self.db.refresh(kb)
+        await self.db.flush()
         return kb
     
     async def increment_view_count(self, kb_id: str):
-        """Increment view count."""
-        kb = await self.db.get(KnowledgeBase, kb_id)
-        if kb:
-            kb.view_count += 1
-            await self.db.commit()
+        """Increment view count (single atomic UPDATE, no concurrent lost updates)."""
+        await self.db.execute(
+            update(KnowledgeBase)
+            .where(KnowledgeBase.id == kb_id)
+            .values(view_count=KnowledgeBase.view_count + 1)
+        )
     
     async def list_public_kbs(
         self,
@@ -190,18 +222,12 @@ class KnowledgeBaseRepository:
                 KnowledgeBase.description.ilike(f"%{query}%")
             )
         
-        # Count total
-        count_stmt = select(func.count()).select_from(stmt.subquery())
-        total = (await self.db.execute(count_stmt)).scalar()
-        
         # Paginate and order by subscribers
-        stmt = stmt.order_by(desc(KnowledgeBase.subscribers_count), desc(KnowledgeBase.created_at))
-        stmt = stmt.limit(page_size).offset((page - 1) * page_size)
-        
-        result = await self.db.execute(stmt)
-        kbs = result.scalars().all()
-        
-        return list(kbs), total or 0
+        rows, total = await self._fetch_page(
+            stmt, page, page_size,
+            desc(KnowledgeBase.subscribers_count), desc(KnowledgeBase.created_at)
+        )
+        return [row[0] for row in rows], total
     
     async def list_featured_kbs(
         self,
@@ -231,15 +257,10 @@ class KnowledgeBaseRepository:
             
             # 2. Organization shared KBs that user has access to
             if user_org_ids:
-                # Check if any of user's org IDs is in the shared_to_orgs array
-                org_conditions = [
-                    KnowledgeBase.shared_to_orgs.any(org_id)
-                    for org_id in user_org_ids
-                ]
                 conditions.append(
                     and_(
                         KnowledgeBase.visibility == 'organization',
-                        or_(*org_conditions) if org_conditions else False
+                        _shared_with_any_org(user_org_ids)
                     )
                 )
             
@@ -247,18 +268,12 @@ class KnowledgeBaseRepository:
             if conditions:
                 stmt = stmt.where(or_(*conditions))
         
-        # Count total
-        count_stmt = select(func.count()).select_from(stmt.subquery())
-        total = (await self.db.execute(count_stmt)).scalar()
-        
         # Order by: subscribers_count DESC, then created_at DESC
-        stmt = stmt.order_by(desc(KnowledgeBase.subscribers_count), desc(KnowledgeBase.created_at))
-        stmt = stmt.limit(page_size).offset((page - 1) * page_size)
-        
-        result = await self.db.execute(stmt)
-        kbs = result.scalars().all()
-        
-        return list(kbs), total or 0
+        rows, total = await self._fetch_page(
+            stmt, page, page_size,
+            desc(KnowledgeBase.subscribers_count), desc(KnowledgeBase.created_at)
+        )
+        return [row[0] for row in rows], total
     
     async def get_categories_stats(self) -> List[dict]:
         """Get statistics for each category (only public KBs)."""
@@ -319,8 +334,7 @@ class KnowledgeBaseRepository:
         if visibility in ('private', 'public'):
             kb.shared_to_orgs = []
         
-        await self.db.commit()
-        await self.db.refresh(kb)
+        await self.db.flush()
         return kb
     
     async def share_to_organizations(self, kb_id: uuid.UUID, org_ids: List[uuid.UUID]) -> KnowledgeBase:
@@ -334,15 +348,11 @@ class KnowledgeBaseRepository:
         Returns:
             Updated knowledge base
         """
-        import logging
-        logger = logging.getLogger(__name__)
-        
         kb = await self.db.get(KnowledgeBase, kb_id)
         if not kb:
             raise ValueError("Knowledge base not found")
         
-        logger.info(f"Sharing KB {kb_id} - Current shared_to_orgs: {kb.shared_to_orgs}")
-        logger.info(f"New org_ids to share: {org_ids}")
+        logger.debug("Sharing KB %s current=%s new=%s", kb_id, kb.shared_to_orgs, org_ids)
         
         # Merge existing and new org IDs to avoid overwriting
         existing_orgs = set(kb.shared_to_orgs or [])
@@ -353,12 +363,9 @@ class KnowledgeBaseRepository:
         kb.shared_to_orgs = merged_orgs
         kb.is_public = False  # Ensure is_public is False for organization sharing
         
-        logger.info(f"Updated KB {kb_id} shared_to_orgs: {merged_orgs}")
+        await self.db.flush()
         
-        await self.db.commit()
-        await self.db.refresh(kb)
-        
-        logger.info(f"After commit - KB {kb_id} shared_to_orgs: {kb.shared_to_orgs}")
+        logger.debug("Shared KB %s shared_to_orgs=%s", kb_id, kb.shared_to_orgs)
         
         return kb
     
@@ -374,14 +381,11 @@ class KnowledgeBaseRepository:
         Returns:
             Updated knowledge base
         """
-        import logging
-        logger = logging.getLogger(__name__)
-        
         kb = await self.db.get(KnowledgeBase, kb_id)
         if not kb:
             raise ValueError("Knowledge base not found")
         
-        logger.info(f"Setting KB {kb_id} shared_to_orgs from {kb.shared_to_orgs} to {org_ids}")
+        logger.debug("Setting KB %s shared_to_orgs from %s to %s", kb_id, kb.shared_to_orgs, org_ids)
         
         # Replace the entire list
         kb.shared_to_orgs = org_ids
@@ -394,10 +398,9 @@ class KnowledgeBaseRepository:
             kb.visibility = 'private'
             kb.is_public = False
         
-        await self.db.commit()
-        await self.db.refresh(kb)
+        await self.db.flush()
         
-        logger.info(f"After setting - KB {kb_id} shared_to_orgs: {kb.shared_to_orgs}, visibility: {kb.visibility}")
+        logger.debug("Set KB %s shared_to_orgs=%s visibility=%s", kb_id, kb.shared_to_orgs, kb.visibility)
         
         return kb
     
@@ -447,15 +450,10 @@ class KnowledgeBaseRepository:
             
             # 2. Organization shared KBs that user has access to
             if user_org_ids:
-                # Check if any of user's org IDs is in the shared_to_orgs array
-                org_conditions = [
-                    KnowledgeBase.shared_to_orgs.any(org_id)
-                    for org_id in user_org_ids
-                ]
                 conditions.append(
                     and_(
                         KnowledgeBase.visibility == 'organization',
-                        or_(*org_conditions) if org_conditions else False
+                        _shared_with_any_org(user_org_ids)
                     )
                 )
             
@@ -475,18 +473,12 @@ class KnowledgeBaseRepository:
                 )
             )
         
-        # Count total
-        count_stmt = select(func.count()).select_from(stmt.subquery())
-        total = (await self.db.execute(count_stmt)).scalar()
-        
         # Paginate and order
-        stmt = stmt.order_by(desc(KnowledgeBase.subscribers_count), desc(KnowledgeBase.created_at))
-        stmt = stmt.limit(page_size).offset((page - 1) * page_size)
-        
-        result = await self.db.execute(stmt)
-        kbs = list(result.scalars().all())
-        
-        return kbs, total or 0
+        rows, total = await self._fetch_page(
+            stmt, page, page_size,
+            desc(KnowledgeBase.subscribers_count), desc(KnowledgeBase.created_at)
+        )
+        return [row[0] for row in rows], total
     
     async def get_org_shared_kbs(
         self,
@@ -511,24 +503,50 @@ class KnowledgeBaseRepository:
         stmt = select(KnowledgeBase).where(
             and_(
                 KnowledgeBase.visibility == 'organization',
-                KnowledgeBase.shared_to_orgs.overlap(user_org_ids)
+                _shared_with_any_org(user_org_ids)
             )
         )
         
-        # Count total
-        count_stmt = select(func.count()).select_from(stmt.subquery())
-        total = (await self.db.execute(count_stmt)).scalar()
-        
         # Paginate
-        stmt = stmt.order_by(desc(KnowledgeBase.created_at))
-        stmt = stmt.limit(page_size).offset((page - 1) * page_size)
-        
-        result = await self.db.execute(stmt)
-        kbs = list(result.scalars().all())
-        
-        return kbs, total or 0
+        rows, total = await self._fetch_page(stmt, page, page_size, desc(KnowledgeBase.created_at))
+        return [row[0] for row in rows], total
 
 
+    async def _remove_org_from_kbs(self, org_id: uuid.UUID, *conditions) -> int:
+        """
+        单条 UPDATE：从匹配知识库的 shared_to_orgs 中移除 org_id，
+        移除后不再共享给任何组织的知识库改为私有（kb_org_shares 由触发器同步）。
+        
+        Returns:
+            int: 受影响的知识库数量
+        """
+        remaining_orgs = func.array_remove(
+            KnowledgeBase.shared_to_orgs, org_id, type_=KnowledgeBase.shared_to_orgs.type
+        )
+        now_unshared = func.cardinality(remaining_orgs) == 0
+        stmt = (
+            update(KnowledgeBase)
+            .where(
+                KnowledgeBase.visibility == 'organization',
+                _shared_with_any_org([org_id]),
+                *conditions
+            )
+            .values(
+                shared_to_orgs=remaining_orgs,
+                visibility=case((now_unshared, 'private'), else_=KnowledgeBase.visibility),
+                is_public=case((now_unshared, False), else_=KnowledgeBase.is_public)
+            )
+            .returning(KnowledgeBase.id, KnowledgeBase.visibility)
+            .execution_options(synchronize_session=False)
+        )
+        
+        rows = (await self.db.execute(stmt)).all()
+        for row in rows:
+            if row.visibility == 'private':
+                logger.info("KB %s no longer shared to any org, set to private", row.id)
+        
+        return len(rows)
+    
     async def remove_org_from_user_kbs(
         self,
         user_id: uuid.UUID,
@@ -545,39 +563,8 @@ class KnowledgeBaseRepository:
         Returns:
             int: 受影响的知识库数量
         """
-        import logging
-        logger = logging.getLogger(__name__)
-        
-        # 查找该用户拥有的、共享到该组织的所有知识库
-        stmt = select(KnowledgeBase).where(
-            and_(
-                KnowledgeBase.owner_id == user_id,
-                KnowledgeBase.visibility == 'organization',
-                KnowledgeBase.shared_to_orgs.any(org_id)
-            )
-        )
-        
-        result = await self.db.execute(stmt)
-        kbs = list(result.scalars().all())
-        
-        affected_count = 0
-        for kb in kbs:
-            # 从 shared_to_orgs 中移除该组织
-            new_shared_orgs = [oid for oid in (kb.shared_to_orgs or []) if oid != org_id]
-            kb.shared_to_orgs = new_shared_orgs
-            
-            # 如果没有共享到任何组织了，改为私有
-            if not new_shared_orgs:
-                kb.visibility = 'private'
-                kb.is_public = False
-                logger.info(f"KB {kb.id} no longer shared to any org, set to private")
-            
-            affected_count += 1
-            logger.info(f"Removed org {org_id} from KB {kb.id} shared_to_orgs")
-        
-        if affected_count > 0:
-            await self.db.commit()
-        
+        affected_count = await self._remove_org_from_kbs(org_id, KnowledgeBase.owner_id == user_id)
+        logger.info("Removed org %s from shared_to_orgs of %d KBs owned by %s", org_id, affected_count, user_id)
         return affected_count
     
     async def remove_org_from_all_kbs(
@@ -594,36 +581,6 @@ class KnowledgeBaseRepository:
         Returns:
             int: 受影响的知识库数量
         """
-        import logging
-        logger = logging.getLogger(__name__)
-        
-        # 查找所有共享到该组织的知识库
-        stmt = select(KnowledgeBase).where(
-            and_(
-                KnowledgeBase.visibility == 'organization',
-                KnowledgeBase.shared_to_orgs.any(org_id)
-            )
-        )
-        
-        result = await self.db.execute(stmt)
-        kbs = list(result.scalars().all())
-        
-        affected_count = 0
-        for kb in kbs:
-            # 从 shared_to_orgs 中移除该组织
-            new_shared_orgs = [oid for oid in (kb.shared_to_orgs or []) if oid != org_id]
-            kb.shared_to_orgs = new_shared_orgs
-            
-            # 如果没有共享到任何组织了，改为私有
-            if not new_shared_orgs:
-                kb.visibility = 'private'
-                kb.is_public = False
-                logger.info(f"KB {kb.id} no longer shared to any org, set to private")
-            
-            affected_count += 1
-            logger.info(f"Removed org {org_id} from KB {kb.id} shared_to_orgs (org dissolved)")
-        
-        if affected_count > 0:
-            await self.db.commit()
-        
+        affected_count = await self._remove_org_from_kbs(org_id)
+        logger.info("Removed org %s from shared_to_orgs of %d KBs (org dissolved)", org_id, affected_count)
         return affected_count
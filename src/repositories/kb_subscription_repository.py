@@ -1,10 +1,11 @@
 """Knowledge Base Subscription repository."""
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete, func
+from sqlalchemy import select, update, delete, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from typing import Optional, List, Tuple
 from models.knowledge_base import KnowledgeBaseSubscription, KnowledgeBase
 from sqlalchemy.orm import selectinload
-from datetime import datetime
+import uuid
 
 
 class KBSubscriptionRepository:
@@ -13,29 +14,37 @@ class KBSubscriptionRepository:
     def __init__(self, db: AsyncSession):
         self.db = db
     
-    async def subscribe(self, user_id: str, kb_id: str) -> KnowledgeBaseSubscription:
-        """Subscribe to a knowledge base."""
-        # Check if already subscribed
-        existing = await self.get_subscription(user_id, kb_id)
-        if existing:
-            return existing
+    async def _add_subscribers(self, kb_id: str, delta: int):
+        """
+        Atomically adjust subscribers_count (never below zero).
         
-        subscription = KnowledgeBaseSubscription(
-            user_id=user_id,
-            kb_id=kb_id
+        RETURNING + populate_existing refreshes an already-loaded instance of the KB,
+        so callers reading subscribers_count afterwards see the new value.
+        """
+        result = await self.db.execute(
+            update(KnowledgeBase)
+            .where(KnowledgeBase.id == kb_id)
+            .values(subscribers_count=func.greatest(KnowledgeBase.subscribers_count + delta, 0))
+            .returning(KnowledgeBase)
+            .execution_options(populate_existing=True)
         )
-        self.db.add(subscription)
-        
-        # Increment subscribers count
-        kb = await self.db.execute(
-            select(KnowledgeBase).where(KnowledgeBase.id == kb_id)
+        result.scalar_one_or_none()
+    
+    async def subscribe(self, user_id: str, kb_id: str) -> KnowledgeBaseSubscription:
+        """Subscribe to a knowledge base."""
+        # Single INSERT on the common path; an existing (or concurrent) subscription is absorbed by the unique constraint
+        stmt = (
+            pg_insert(KnowledgeBaseSubscription)
+            .values(id=uuid.uuid4(), user_id=user_id, kb_id=kb_id)
+            .on_conflict_do_nothing(index_elements=["user_id", "kb_id"])
+            .returning(KnowledgeBaseSubscription)
         )
-        kb_obj = kb.scalar_one_or_none()
-        if kb_obj:
-            kb_obj.subscribers_count += 1
+        subscription = (await self.db.execute(stmt)).scalar_one_or_none()
+        if subscription is None:
+            return await self.get_subscription(user_id, kb_id)
         
-        await self.db.commit()
-        await self.db.refresh(subscription)
+        # Only a newly inserted subscription bumps the counter
+        await self._add_subscribers(kb_id, 1)
         return subscription
     
     async def unsubscribe(self, user_id: str, kb_id: str) -> bool:
@@ -48,15 +57,7 @@ class KBSubscriptionRepository:
         )
         
         if result.rowcount > 0:
-            # Decrement subscribers count
-            kb = await self.db.execute(
-                select(KnowledgeBase).where(KnowledgeBase.id == kb_id)
-            )
-            kb_obj = kb.scalar_one_or_none()
-            if kb_obj and kb_obj.subscribers_count > 0:
-                kb_obj.subscribers_count -= 1
-            
-            await self.db.commit()
+            await self._add_subscribers(kb_id, -1)
             return True
         return False
     
@@ -81,17 +82,9 @@ class KBSubscriptionRepository:
         page_size: int = 20
     ) -> Tuple[List[KnowledgeBase], int]:
         """List all knowledge bases subscribed by a user."""
-        # Count total
-        count_stmt = select(func.count()).select_from(
-            select(KnowledgeBaseSubscription)
-            .where(KnowledgeBaseSubscription.user_id == user_id)
-            .subquery()
-        )
-        total = (await self.db.execute(count_stmt)).scalar()
-        
-        # Get subscribed KBs
+        # Subscribed KBs; total comes from a window count in the same query
         stmt = (
-            select(KnowledgeBase)
+            select(KnowledgeBase, func.count().over().label("total_count"))
             .join(
                 KnowledgeBaseSubscription,
                 KnowledgeBase.id == KnowledgeBaseSubscription.kb_id
@@ -102,15 +95,28 @@ class KBSubscriptionRepository:
             .offset((page - 1) * page_size)
         )
         
-        result = await self.db.execute(stmt)
-        kbs = result.scalars().all()
-        
-        return list(kbs), total or 0
+        rows = (await self.db.execute(stmt)).all()
+        if rows:
+            return [row[0] for row in rows], rows[0].total_count
+        if page > 1:
+            # Page past the end: no row carries the window total
+            count_stmt = (
+                select(func.count())
+                .select_from(KnowledgeBaseSubscription)
+                .where(KnowledgeBaseSubscription.user_id == user_id)
+            )
+            return [], (await self.db.execute(count_stmt)).scalar() or 0
+        return [], 0
     
     async def update_last_viewed(self, user_id: str, kb_id: str):
-        """Update last viewed timestamp."""
-        subscription = await self.get_subscription(user_id, kb_id)
-        if subscription:
-            subscription.last_viewed_at = datetime.utcnow()
-            await self.db.commit()
+        """Update last viewed timestamp (single UPDATE, no prior SELECT of the subscription)."""
+        await self.db.execute(
+            update(KnowledgeBaseSubscription)
+            .where(
+                KnowledgeBaseSubscription.user_id == user_id,
+                KnowledgeBaseSubscription.kb_id == kb_id
+            )
+            .values(last_viewed_at=func.now())
+            .execution_options(synchronize_session=False)
+        )
 
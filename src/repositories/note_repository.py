@@ -1,9 +1,11 @@
 """Note repository for database operations."""
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, delete
-from sqlalchemy.orm import selectinload
+from sqlalchemy import select, func, delete, tuple_
+from sqlalchemy.orm import raiseload, selectinload
 from typing import Optional, List, Tuple
 from models.note import Note, NoteFolder
+from utils.pagination import Cursor
+import uuid
 
 
 class NoteRepository:
@@ -16,7 +18,7 @@ class NoteRepository:
         """Get note by ID for specific user."""
         result = await self.db.execute(
             select(Note)
-            .options(selectinload(Note.folder))
+            .options(selectinload(Note.folder), raiseload("*"))
             .where(Note.id == note_id, Note.user_id == user_id)
         )
         return result.scalar_one_or_none()
@@ -27,40 +29,45 @@ class NoteRepository:
         folder_id: Optional[str] = None,
         query: Optional[str] = None,
         page: int = 1,
-        page_size: int = 20
-    ) -> Tuple[List[Note], int]:
-        """List notes with pagination."""
-        stmt = select(Note).options(selectinload(Note.folder)).where(Note.user_id == user_id)
+        page_size: int = 20,
+        cursor: Optional[Cursor] = None,
+        include_total: bool = False
+    ) -> Tuple[List[Note], Optional[int], bool]:
+        """
+        List notes with pagination.
         
-        if folder_id:
-            stmt = stmt.where(Note.folder_id == folder_id)
-        
-        if query:
-            stmt = stmt.where(Note.title.ilike(f"%{query}%"))
+        With a cursor (updated_at, id of the previous page's last row) the page is
+        fetched by keyset and `page` is ignored. One extra row is fetched to tell
+        whether another page follows; the COUNT query only runs when
+        `include_total` is set, otherwise the returned total is None.
         
-        # Count total
-        count_stmt = select(func.count()).select_from(
-            select(Note).where(Note.user_id == user_id).subquery()
-        )
+        Returns:
+            (notes, total, has_more)
+        """
+        filters = [Note.user_id == user_id]
         if folder_id:
-            count_stmt = select(func.count()).select_from(
-                select(Note).where(Note.user_id == user_id, Note.folder_id == folder_id).subquery()
-            )
+            filters.append(Note.folder_id == folder_id)
         if query:
-            count_stmt = select(func.count()).select_from(
-                select(Note).where(Note.user_id == user_id, Note.title.ilike(f"%{query}%")).subquery()
-            )
+            filters.append(Note.title.ilike(f"%{query}%"))
         
-        total = (await self.db.execute(count_stmt)).scalar()
+        total = None
+        if include_total:
+            count_stmt = select(func.count()).select_from(Note).where(*filters)
+            total = (await self.db.execute(count_stmt)).scalar() or 0
         
         # Paginate
-        stmt = stmt.order_by(Note.updated_at.desc())
-        stmt = stmt.limit(page_size).offset((page - 1) * page_size)
+        stmt = select(Note).options(selectinload(Note.folder), raiseload("*")).where(*filters)
+        stmt = stmt.order_by(Note.updated_at.desc(), Note.id.desc())
+        if cursor is not None:
+            stmt = stmt.where(tuple_(Note.updated_at, Note.id) < cursor).limit(page_size + 1)
+        else:
+            stmt = stmt.limit(page_size + 1).offset((page - 1) * page_size)
         
         result = await self.db.execute(stmt)
-        notes = result.scalars().all()
+        notes = list(result.scalars().all())
+        has_more = len(notes) > page_size
         
-        return list(notes), total or 0
+        return notes[:page_size], total, has_more
     
     async def create(
         self,
@@ -70,7 +77,13 @@ class NoteRepository:
         folder_id: Optional[str],
         tags: List[str]
     ) -> Note:
-        """Create a new note."""
+        """
+        Create a new note.
+        
+        The flush is a single INSERT ... RETURNING (eager_defaults); the folder
+        relationship is attached up front instead of refreshed afterwards.
+        """
+        folder = await self._resolve_folder(folder_id) if folder_id else None
         note = Note(
             user_id=user_id,
             folder_id=folder_id,
@@ -78,42 +91,53 @@ class NoteRepository:
             content=content,
             tags=tags
         )
+        # folder_id 指向不存在的文件夹时不设置关系，flush 时由外键报错
+        if folder is not None or folder_id is None:
+            note.folder = folder
         self.db.add(note)
-        await self.db.commit()
-        await self.db.refresh(note, ["folder"])
+        await self.db.flush()
         return note
     
+    async def _resolve_folder(self, folder_id) -> Optional[NoteFolder]:
+        """通过主键取文件夹，identity map 命中时不查库；非法 ID 返回 None"""
+        try:
+            return await self.db.get(NoteFolder, uuid.UUID(str(folder_id)))
+        except ValueError:
+            return None
+    
     async def update(self, note: Note, **kwargs) -> Note:
-        """Update note fields."""
+        """
+        Update note fields.
+        
+        The flush issues a single UPDATE ... RETURNING (eager_defaults), and the
+        folder relationship is kept in sync here so the caller can serialize the
+        note without re-selecting it.
+        """
+        # 换了文件夹时先解析新的 folder 关系；文件夹通常已在 identity map 中，命中则不查库
+        folder_id = kwargs.get("folder_id")
+        folder = None
+        if folder_id is not None and str(folder_id) != str(note.folder_id):
+            folder = await self._resolve_folder(folder_id)
+        
         for key, value in kwargs.items():
             if hasattr(note, key) and value is not None:
                 setattr(note, key, value)
+        if folder is not None:
+            note.folder = folder
         
-        # 在 commit 之前访问 folder 以避免 MissingGreenlet
-        folder_name = note.folder.name if note.folder else None
-        
-        await self.db.commit()
-        await self.db.refresh(note)
-        
-        # 重新查询以正确加载关系
-        result = await self.db.execute(
-            select(Note)
-            .options(selectinload(Note.folder))
-            .where(Note.id == note.id)
-        )
-        return result.scalar_one()
+        await self.db.flush()
+        return note
     
     async def delete(self, note: Note):
         """Delete a note."""
         await self.db.delete(note)
-        await self.db.commit()
+        await self.db.flush()
     
     async def batch_delete(self, user_id: str, note_ids: List[str]):
         """Batch delete notes."""
         await self.db.execute(
             delete(Note).where(Note.user_id == user_id, Note.id.in_(note_ids))
         )
-        await self.db.commit()
 
 
 class NoteFolderRepository:
@@ -124,10 +148,19 @@ class NoteFolderRepository:
     
     async def list_folders(self, user_id: str) -> List[Tuple[NoteFolder, int]]:
         """List folders with note count."""
-        stmt = select(
-            NoteFolder,
-            func.count(Note.id).label('count')
-        ).outerjoin(Note).where(NoteFolder.user_id == user_id).group_by(NoteFolder.id)
+        # Aggregate the user's notes once per folder on the (user_id, folder_id, ...) index,
+        # then join the (small) folder list instead of joining every note row before grouping
+        counts = (
+            select(Note.folder_id, func.count().label('count'))
+            .where(Note.user_id == user_id, Note.folder_id.is_not(None))
+            .group_by(Note.folder_id)
+            .subquery()
+        )
+        stmt = (
+            select(NoteFolder, func.coalesce(counts.c.count, 0))
+            .outerjoin(counts, counts.c.folder_id == NoteFolder.id)
+            .where(NoteFolder.user_id == user_id)
+        )
         
         result = await self.db.execute(stmt)
         return [(folder, count) for folder, count in result.all()]
@@ -143,19 +176,23 @@ class NoteFolderRepository:
         """Create a new folder."""
         folder = NoteFolder(user_id=user_id, name=name)
         self.db.add(folder)
-        await self.db.commit()
-        await self.db.refresh(folder)
+        await self.db.flush()
         return folder
     
+    async def create_many(self, user_id: str, names: List[str]) -> List[NoteFolder]:
+        """Create several folders with one multi-row INSERT (e.g. a new user's defaults)."""
+        return await NoteFolder.bulk_insert(
+            self.db, [{"user_id": user_id, "name": name} for name in names]
+        )
+    
     async def update(self, folder: NoteFolder, name: str) -> NoteFolder:
         """Update folder name."""
         folder.name = name
-        await self.db.commit()
-        await self.db.refresh(folder)
+        await self.db.flush()
         return folder
     
     async def delete(self, folder: NoteFolder):
         """Delete a folder."""
         await self.db.delete(folder)
-        await self.db.commit()
+        await self.db.flush()
 
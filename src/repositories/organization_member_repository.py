@@ -1,13 +1,21 @@
 """Organization member repository for database operations."""
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, func, delete
+from sqlalchemy import select, and_, delete
 from sqlalchemy.orm import joinedload
-from typing import Optional, List
+from typing import Optional, List, Dict
 from models.organization_member import OrganizationMember
 from models.organization import Organization
 from models.user import User
 import uuid
 
+# session.info 中按用户缓存的 {org_id: role}（仅未删除组织），生命周期与会话（即单个请求）一致
+MEMBERSHIP_CACHE_KEY = "org_memberships"
+
+
+def invalidate_memberships(db: AsyncSession) -> None:
+    """丢弃会话内缓存的成员关系（成员增删、组织删除后调用）"""
+    db.info.pop(MEMBERSHIP_CACHE_KEY, None)
+
 
 class OrganizationMemberRepository:
     """Repository for OrganizationMember model."""
@@ -15,6 +23,29 @@ class OrganizationMemberRepository:
     def __init__(self, db: AsyncSession):
         self.db = db
     
+    async def _memberships(self, user_id: uuid.UUID | str) -> Dict[uuid.UUID, str]:
+        """
+        {org_id: role} of the user's non-deleted organizations.
+        
+        Loaded with one query the first time it is needed in a session and
+        memoized in session.info, so is_member / count_user_organizations /
+        get_user_org_ids within the same request share that single query.
+        """
+        cache = self.db.info.setdefault(MEMBERSHIP_CACHE_KEY, {})
+        key = str(user_id)
+        memberships = cache.get(key)
+        if memberships is None:
+            result = await self.db.execute(
+                select(OrganizationMember.org_id, OrganizationMember.role)
+                .join(Organization, OrganizationMember.org_id == Organization.id)
+                .where(
+                    OrganizationMember.user_id == user_id,
+                    Organization.is_deleted == False
+                )
+            )
+            memberships = cache[key] = {org_id: role for org_id, role in result.all()}
+        return memberships
+    
     async def add_member(
         self,
         org_id: uuid.UUID,
@@ -38,8 +69,8 @@ class OrganizationMemberRepository:
             role=role,
         )
         self.db.add(member)
-        await self.db.commit()
-        await self.db.refresh(member)
+        await self.db.flush()
+        invalidate_memberships(self.db)
         return member
     
     async def remove_member(self, org_id: uuid.UUID, user_id: uuid.UUID) -> bool:
@@ -60,7 +91,7 @@ class OrganizationMemberRepository:
                 OrganizationMember.user_id == user_id
             ))
         )
-        await self.db.commit()
+        invalidate_memberships(self.db)
         return result.rowcount > 0
     
     async def get_member(self, org_id: uuid.UUID, user_id: uuid.UUID) -> Optional[OrganizationMember]:
@@ -116,17 +147,11 @@ class OrganizationMemberRepository:
         Returns:
             True if member, False otherwise
         """
-        result = await self.db.execute(
-            select(func.count(OrganizationMember.id))
-            .join(Organization, OrganizationMember.org_id == Organization.id)
-            .where(and_(
-                OrganizationMember.org_id == org_id,
-                OrganizationMember.user_id == user_id,
-                Organization.is_deleted == False
-            ))
-        )
-        count = result.scalar() or 0
-        return count > 0
+        try:
+            org_id = org_id if isinstance(org_id, uuid.UUID) else uuid.UUID(str(org_id))
+        except ValueError:
+            return False
+        return org_id in await self._memberships(user_id)
     
     async def count_user_organizations(self, user_id: uuid.UUID, role: Optional[str] = None) -> int:
         """
@@ -139,20 +164,10 @@ class OrganizationMemberRepository:
         Returns:
             Number of organizations
         """
-        query = (
-            select(func.count(OrganizationMember.id))
-            .join(Organization, OrganizationMember.org_id == Organization.id)
-            .where(
-                OrganizationMember.user_id == user_id,
-                Organization.is_deleted == False
-            )
-        )
-        
+        memberships = await self._memberships(user_id)
         if role:
-            query = query.where(OrganizationMember.role == role)
-        
-        result = await self.db.execute(query)
-        return result.scalar() or 0
+            return sum(1 for member_role in memberships.values() if member_role == role)
+        return len(memberships)
     
     async def get_user_organizations(self, user_id: uuid.UUID) -> List[OrganizationMember]:
         """
@@ -177,7 +192,7 @@ class OrganizationMemberRepository:
         )
         return list(result.unique().scalars().all())
     
-    async def get_user_org_ids(self, user_id: uuid.UUID) -> List[uuid.UUID]:
+    async def get_user_org_ids(self, user_id: uuid.UUID | str) -> List[uuid.UUID]:
         """
         Get list of organization IDs a user belongs to (excluding deleted organizations).
         
@@ -187,13 +202,4 @@ class OrganizationMemberRepository:
         Returns:
             List of organization IDs
         """
-        result = await self.db.execute(
-            select(OrganizationMember.org_id)
-            .join(Organization, OrganizationMember.org_id == Organization.id)
-            .where(
-                OrganizationMember.user_id == user_id,
-                Organization.is_deleted == False
-            )
-        )
-        return [row[0] for row in result.all()]
-
+        return list(await self._memberships(user_id))
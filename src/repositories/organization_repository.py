@@ -1,13 +1,18 @@
 """Organization repository for database operations."""
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, func
-from sqlalchemy.orm import joinedload, selectinload
-from typing import Optional, List
+from sqlalchemy import select, update, and_, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import joinedload, raiseload, selectinload
+from typing import Optional, List, Dict, Iterable
 from datetime import datetime
 from models.organization import Organization
 from models.organization_member import OrganizationMember
+from repositories.organization_member_repository import invalidate_memberships
 import uuid
 
+# Mapped column attributes accepted by update(**kwargs)
+_ORGANIZATION_COLUMNS = frozenset(Organization.__mapper__.column_attrs.keys())
+
 
 class OrganizationRepository:
     """Repository for Organization model."""
@@ -23,10 +28,13 @@ class OrganizationRepository:
         avatar: Optional[str],
         org_code: str,
         max_members: int
-    ) -> Organization:
+    ) -> Optional[Organization]:
         """
         Create a new organization.
         
+        Uses INSERT ... ON CONFLICT (org_code) DO NOTHING RETURNING so that an
+        org_code collision costs no extra round trip and no IntegrityError.
+        
         Args:
             owner_id: Owner user ID
             name: Organization name
@@ -36,20 +44,26 @@ class OrganizationRepository:
             max_members: Maximum members
             
         Returns:
-            Created organization
-        """
-        org = Organization(
-            owner_id=owner_id,
-            name=name,
-            description=description,
-            avatar=avatar,
-            org_code=org_code,
-            max_members=max_members,
-            is_deleted=False,
+            Created organization, or None if org_code is already taken
+        """
+        stmt = (
+            insert(Organization)
+            .values(
+                owner_id=owner_id,
+                name=name,
+                description=description,
+                avatar=avatar,
+                org_code=org_code,
+                max_members=max_members,
+                is_deleted=False,
+            )
+            .on_conflict_do_nothing(index_elements=[Organization.org_code])
+            .returning(Organization)
         )
-        self.db.add(org)
-        await self.db.commit()
-        await self.db.refresh(org)
+        result = await self.db.execute(stmt)
+        org = result.scalar_one_or_none()
+        if org is None:
+            return None
         return org
     
     async def get_by_id(self, org_id: uuid.UUID, include_deleted: bool = False) -> Optional[Organization]:
@@ -69,15 +83,53 @@ class OrganizationRepository:
             query = query.where(Organization.is_deleted == False)
         
         # Load relationships to prevent lazy loading
-        # Use selectinload for members to also load nested relationships
+        # Single org: one JOINed query (members -> user, owner) instead of selectin round-trips;
+        # the list getters below keep selectinload to avoid multiplying rows across many orgs
         query = query.options(
-            selectinload(Organization.members).selectinload(OrganizationMember.user),
-            joinedload(Organization.owner)
+            joinedload(Organization.members).joinedload(OrganizationMember.user),
+            joinedload(Organization.owner),
+            raiseload("*")
         )
         
         result = await self.db.execute(query)
         return result.unique().scalar_one_or_none()
     
+    async def get_owner_id(self, org_id: uuid.UUID) -> Optional[uuid.UUID]:
+        """
+        Get the owner ID of a non-deleted organization.
+        
+        For owner checks before mutations, which need neither the members nor
+        the owner row that get_by_id eagerly loads.
+        
+        Args:
+            org_id: Organization ID
+            
+        Returns:
+            Owner user ID, or None if the organization does not exist or is deleted
+        """
+        result = await self.db.execute(
+            select(Organization.owner_id)
+            .where(Organization.id == org_id, Organization.is_deleted == False)
+        )
+        return result.scalar_one_or_none()
+    
+    async def get_names(self, org_ids: Iterable[uuid.UUID]) -> Dict[uuid.UUID, str]:
+        """
+        Batch-load names of (non-deleted) organizations in one query.
+        
+        Unlike get_by_id this loads no members/owner, for list decoration only.
+        """
+        ids = set(org_ids)
+        if not ids:
+            return {}
+        result = await self.db.execute(
+            select(Organization.id, Organization.name).where(
+                Organization.id.in_(ids),
+                Organization.is_deleted == False
+            )
+        )
+        return {row.id: row.name for row in result.all()}
+    
     async def get_by_code(self, org_code: str) -> Optional[Organization]:
         """Get organization by organization code."""
         result = await self.db.execute(
@@ -87,8 +139,9 @@ class OrganizationRepository:
                 Organization.is_deleted == False
             ))
             .options(
-                selectinload(Organization.members).selectinload(OrganizationMember.user),
-                joinedload(Organization.owner)
+                joinedload(Organization.members).joinedload(OrganizationMember.user),
+                joinedload(Organization.owner),
+                raiseload("*")
             )
         )
         return result.unique().scalar_one_or_none()
@@ -103,7 +156,8 @@ class OrganizationRepository:
             ))
             .options(
                 selectinload(Organization.members).selectinload(OrganizationMember.user),
-                joinedload(Organization.owner)
+                joinedload(Organization.owner),
+                raiseload("*")
             )
             .order_by(Organization.created_at.desc())
         )
@@ -129,12 +183,32 @@ class OrganizationRepository:
             ))
             .options(
                 selectinload(Organization.members).selectinload(OrganizationMember.user),
-                joinedload(Organization.owner)
+                joinedload(Organization.owner),
+                raiseload("*")
             )
             .order_by(OrganizationMember.joined_at.desc())
         )
         return list(result.unique().scalars().all())
     
+    async def _update_active(self, org_id: uuid.UUID, **values) -> Optional[Organization]:
+        """
+        单条 UPDATE ... RETURNING 修改未删除组织的列（updated_at 由 onupdate 写入）。
+        
+        不再先 get_by_id（会连带加载全部成员与 owner）；populate_existing 让会话中
+        已加载的同一实例直接拿到新值，已加载的关系保持不变。
+        
+        Returns:
+            更新后的组织，不存在或已删除时返回 None
+        """
+        result = await self.db.execute(
+            update(Organization)
+            .where(Organization.id == org_id, Organization.is_deleted == False)
+            .values(**values)
+            .returning(Organization)
+            .execution_options(populate_existing=True)
+        )
+        return result.scalar_one_or_none()
+    
     async def update(self, org_id: uuid.UUID, **kwargs) -> Organization:
         """
         Update organization fields.
@@ -146,17 +220,10 @@ class OrganizationRepository:
         Returns:
             Updated organization
         """
-        org = await self.get_by_id(org_id)
+        values = {key: value for key, value in kwargs.items() if key in _ORGANIZATION_COLUMNS}
+        org = await self._update_active(org_id, **values)
         if not org:
             raise ValueError("Organization not found")
-        
-        for key, value in kwargs.items():
-            if hasattr(org, key):
-                setattr(org, key, value)
-        
-        org.updated_at = datetime.now()
-        await self.db.commit()
-        await self.db.refresh(org)
         return org
     
     async def delete(self, org_id: uuid.UUID) -> bool:
@@ -169,13 +236,10 @@ class OrganizationRepository:
         Returns:
             True if deleted, False if not found
         """
-        org = await self.get_by_id(org_id)
-        if not org:
-            return False
-        
-        org.is_deleted = True
-        await self.db.commit()
-        return True
+        deleted = await self._update_active(org_id, is_deleted=True) is not None
+        if deleted:
+            invalidate_memberships(self.db)
+        return deleted
     
     async def regenerate_code(self, org_id: uuid.UUID, new_code: str) -> Organization:
         """
@@ -188,14 +252,9 @@ class OrganizationRepository:
         Returns:
             Updated organization
         """
-        org = await self.get_by_id(org_id)
+        org = await self._update_active(org_id, org_code=new_code)
         if not org:
             raise ValueError("Organization not found")
-        
-        org.org_code = new_code
-        org.updated_at = datetime.now()
-        await self.db.commit()
-        await self.db.refresh(org)
         return org
     
     async def update_code_expiry(self, org_id: uuid.UUID, expires_at: Optional[datetime]) -> Organization:
@@ -209,20 +268,16 @@ class OrganizationRepository:
         Returns:
             Updated organization
         """
-        org = await self.get_by_id(org_id)
+        org = await self._update_active(org_id, code_expires_at=expires_at)
         if not org:
             raise ValueError("Organization not found")
-        
-        org.code_expires_at = expires_at
-        org.updated_at = datetime.now()
-        await self.db.commit()
-        await self.db.refresh(org)
         return org
     
     async def count_members(self, org_id: uuid.UUID) -> int:
         """Count the number of members in an organization."""
         result = await self.db.execute(
-            select(func.count(OrganizationMember.id))
+            select(func.count())
+            .select_from(OrganizationMember)
             .where(OrganizationMember.org_id == org_id)
         )
         return result.scalar() or 0
@@ -230,7 +285,8 @@ class OrganizationRepository:
     async def count_all(self) -> int:
         """Count total number of organizations (excluding deleted)."""
         result = await self.db.execute(
-            select(func.count(Organization.id))
+            select(func.count())
+            .select_from(Organization)
             .where(Organization.is_deleted == False)
         )
         return result.scalar() or 0
@@ -1,11 +1,20 @@
 """User repository for database operations."""
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
-from typing import Optional, List
+from sqlalchemy import Row, any_, bindparam, case, exists, func, literal, select, update
+from typing import Optional, List, Dict, Iterable
 from datetime import datetime
 from models.user import User
 import uuid
 
+# Hot point lookup (every authenticated request) built once; only the bound parameter changes
+_GET_BY_ID = select(User).where(User.id == bindparam("user_id"))
+# Login / registration lookups, hoisted the same way
+_GET_BY_EMAIL = select(User).where(User.email == bindparam("email"))
+_GET_BY_NAME = select(User).where(User.name == bindparam("name"))
+
+# Mapped column attributes accepted by update(**kwargs)
+_USER_COLUMNS = frozenset(User.__mapper__.column_attrs.keys())
+
 
 class UserRepository:
     """Repository for User model with membership support."""
@@ -14,26 +23,33 @@ class UserRepository:
         self.db = db
     
     async def get_by_id(self, user_id: uuid.UUID | str) -> Optional[User]:
-        """Get user by ID."""
-        if isinstance(user_id, str):
-            user_id = uuid.UUID(user_id)
+        """Get user by ID (str IDs are bound as-is; asyncpg encodes them natively)."""
+        result = await self.db.execute(_GET_BY_ID, {"user_id": user_id})
+        return result.scalar_one_or_none()
+    
+    async def get_display_info(self, user_ids: Iterable[uuid.UUID]) -> Dict[uuid.UUID, Row]:
+        """
+        Batch-load (id, name, avatar) for many users in one query.
+        
+        Used when decorating lists (e.g. creator of each KB) instead of one
+        get_by_id per item.
+        """
+        ids = set(user_ids)
+        if not ids:
+            return {}
         result = await self.db.execute(
-            select(User).where(User.id == user_id)
+            select(User.id, User.name, User.avatar).where(User.id.in_(ids))
         )
-        return result.scalar_one_or_none()
+        return {row.id: row for row in result.all()}
     
     async def get_by_email(self, email: str) -> Optional[User]:
         """Get user by email."""
-        result = await self.db.execute(
-            select(User).where(User.email == email)
-        )
+        result = await self.db.execute(_GET_BY_EMAIL, {"email": email})
         return result.scalar_one_or_none()
     
     async def get_by_name(self, name: str) -> Optional[User]:
         """Get user by name."""
-        result = await self.db.execute(
-            select(User).where(User.name == name)
-        )
+        result = await self.db.execute(_GET_BY_NAME, {"name": name})
         return result.scalar_one_or_none()
     
     async def check_username_available(self, username: str, exclude_user_id: Optional[uuid.UUID] = None) -> bool:
@@ -47,13 +63,13 @@ class UserRepository:
         Returns:
             True if available, False otherwise
         """
-        query = select(User).where(func.lower(User.name) == func.lower(username))
+        conditions = [func.lower(User.name) == func.lower(username)]
         if exclude_user_id:
-            query = query.where(User.id != exclude_user_id)
+            conditions.append(User.id != exclude_user_id)
         
-        result = await self.db.execute(query)
-        existing_user = result.scalar_one_or_none()
-        return existing_user is None
+        # EXISTS: stops at the first match, no User row materialized
+        result = await self.db.execute(select(exists().where(*conditions)))
+        return not result.scalar()
     
     async def create(self, email: str, password_hash: str, name: str) -> User:
         """Create a new user."""
@@ -65,18 +81,31 @@ class UserRepository:
             is_admin=False,
         )
         self.db.add(user)
-        await self.db.commit()
-        await self.db.refresh(user)
+        await self.db.flush()
         return user
     
+    async def _update_by_id(self, user_id: uuid.UUID | str, **values) -> Optional[User]:
+        """
+        Single UPDATE ... RETURNING for one user (no SELECT first).
+        
+        populate_existing refreshes an instance already loaded in this session
+        (e.g. the current user) from the returned row.
+        """
+        result = await self.db.execute(
+            update(User)
+            .where(User.id == user_id)
+            .values(**values)
+            .returning(User)
+            .execution_options(populate_existing=True)
+        )
+        return result.scalar_one_or_none()
+    
     async def update(self, user: User, **kwargs) -> User:
         """Update user fields."""
-        for key, value in kwargs.items():
-            if hasattr(user, key):
-                setattr(user, key, value)
-        await self.db.commit()
-        await self.db.refresh(user)
-        return user
+        values = {key: value for key, value in kwargs.items() if key in _USER_COLUMNS}
+        if not values:
+            return user
+        return await self._update_by_id(user.id, **values) or user
     
     async def update_password(self, user_id: uuid.UUID, password_hash: str) -> User:
         """
@@ -89,13 +118,9 @@ class UserRepository:
         Returns:
             Updated user
         """
-        user = await self.get_by_id(user_id)
+        user = await self._update_by_id(user_id, password_hash=password_hash)
         if not user:
             raise ValueError("User not found")
-        
-        user.password_hash = password_hash
-        await self.db.commit()
-        await self.db.refresh(user)
         return user
     
     async def update_profile(self, user_id: uuid.UUID, name: Optional[str] = None, avatar: Optional[str] = None) -> User:
@@ -110,17 +135,15 @@ class UserRepository:
         Returns:
             Updated user
         """
-        user = await self.get_by_id(user_id)
-        if not user:
-            raise ValueError("User not found")
-        
+        values = {}
         if name is not None:
-            user.name = name
+            values["name"] = name
         if avatar is not None:
-            user.avatar = avatar
+            values["avatar"] = avatar
         
-        await self.db.commit()
-        await self.db.refresh(user)
+        user = await self._update_by_id(user_id, **values) if values else await self.get_by_id(user_id)
+        if not user:
+            raise ValueError("User not found")
         return user
     
     async def update_user_level(
@@ -142,22 +165,18 @@ class UserRepository:
         Returns:
             Updated user
         """
-        user = await self.get_by_id(user_id)
-        if not user:
-            raise ValueError("User not found")
+        values = {"user_level": level, "membership_expires_at": expires_at}
         
-        user.user_level = level
-        user.membership_expires_at = expires_at
-        
-        # 记录激活码
+        # 记录激活码（数据库侧去重追加）
         if activated_code:
-            if user.activated_codes is None:
-                user.activated_codes = []
-            if activated_code not in user.activated_codes:
-                user.activated_codes = user.activated_codes + [activated_code]
+            values["activated_codes"] = case(
+                (literal(activated_code) == any_(User.activated_codes), User.activated_codes),
+                else_=func.array_append(User.activated_codes, activated_code, type_=User.activated_codes.type)
+            )
         
-        await self.db.commit()
-        await self.db.refresh(user)
+        user = await self._update_by_id(user_id, **values)
+        if not user:
+            raise ValueError("User not found")
         return user
     
     async def set_admin(self, user_id: uuid.UUID, is_admin: bool) -> User:
@@ -171,13 +190,9 @@ class UserRepository:
         Returns:
             Updated user
         """
-        user = await self.get_by_id(user_id)
+        user = await self._update_by_id(user_id, is_admin=is_admin)
         if not user:
             raise ValueError("User not found")
-        
-        user.is_admin = is_admin
-        await self.db.commit()
-        await self.db.refresh(user)
         return user
     
     async def get_users_by_level(self, level: str, limit: int = 100) -> List[User]:
@@ -4,9 +4,18 @@ import asyncpg
 from pathlib import Path
 import sys
 
+# pg_advisory_lock 的键：多个实例同时启动时只允许一个迁移进程执行
+MIGRATION_LOCK_KEY = 4242
+
 
 async def run_migrations():
-    """Execute all SQL migration files in order."""
+    """
+    Execute pending SQL migration files in order.
+    
+    Every file must be safe to re-run: databases migrated before
+    schema_migrations existed have no recorded versions, so their first run
+    replays all files once.
+    """
     
     # Database connection parameters
     DB_CONFIG = {
@@ -24,6 +33,18 @@ async def run_migrations():
         '003_create_organizations.sql',
         '004_create_organization_members.sql',
         '005_add_kb_visibility.sql',
+        '006_add_hot_path_indexes.sql',
+        '007_create_kb_org_shares.sql',
+        '008_add_keyset_pagination_indexes.sql',
+        '009_add_chat_message_indexes.sql',
+        '010_add_kb_search_trgm_indexes.sql',
+        '011_add_kb_owner_lower_name_index.sql',
+        '012_add_kb_owner_created_index.sql',
+        '013_add_document_kb_size_index.sql',
+        '014_add_kb_hot_index.sql',
+        '015_add_note_keyset_indexes.sql',
+        '016_add_users_lower_name_index.sql',
+        '017_add_org_member_covering_indexes.sql',
     ]
     
     migrations_dir = Path(__file__).parent / 'migrations'
@@ -33,14 +54,36 @@ async def run_migrations():
         print("Connecting to database...")
         conn = await asyncpg.connect(**DB_CONFIG)
         print("✓ Connected successfully!")
+    except Exception as e:
+        print(f"\n✗ Database connection error: {str(e)}")
+        sys.exit(1)
+    
+    failed = False
+    try:
+        # 串行化并发的迁移进程（多实例同时启动）
+        await conn.execute("SELECT pg_advisory_lock($1)", MIGRATION_LOCK_KEY)
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version VARCHAR(255) PRIMARY KEY,
+                applied_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+            )
+        """)
+        applied = {
+            row['version']
+            for row in await conn.fetch("SELECT version FROM schema_migrations")
+        }
         
-        # Execute each migration
+        # Execute each pending migration
         for migration_file in migrations:
+            if migration_file in applied:
+                continue
+            
             migration_path = migrations_dir / migration_file
             
             if not migration_path.exists():
                 print(f"✗ Migration file not found: {migration_file}")
-                continue
+                failed = True
+                break
             
             print(f"\nExecuting migration: {migration_file}")
             
@@ -49,20 +92,28 @@ async def run_migrations():
                 sql = f.read()
             
             try:
-                # Execute SQL
-                await conn.execute(sql)
+                # 每个文件一个事务：要么整体生效并记录版本，要么整体回滚
+                async with conn.transaction():
+                    await conn.execute(sql)
+                    await conn.execute(
+                        "INSERT INTO schema_migrations (version) VALUES ($1)",
+                        migration_file
+                    )
                 print(f"✓ Migration {migration_file} completed successfully!")
             except Exception as e:
                 print(f"✗ Error executing {migration_file}: {str(e)}")
-                # Continue with next migration even if one fails
-        
+                # 后续迁移可能依赖这一步，停止执行，修复后重跑只会执行未完成的部分
+                failed = True
+                break
+    finally:
+        await conn.execute("SELECT pg_advisory_unlock($1)", MIGRATION_LOCK_KEY)
         # Close connection
         await conn.close()
-        print("\n✓ All migrations completed!")
-        
-    except Exception as e:
-        print(f"\n✗ Database connection error: {str(e)}")
+    
+    if failed:
+        print("\n✗ Migrations stopped due to an error")
         sys.exit(1)
+    print("\n✓ All migrations completed!")
 
 
 if __name__ == "__main__":
@@ -4,6 +4,7 @@ from fastapi import HTTPException, status
 from repositories.activation_code_repository import ActivationCodeRepository
 from repositories.user_repository import UserRepository
 from models.activation_code import ActivationCode
+from utils.pagination import next_cursor, parse_cursor
 from typing import List, Dict, Optional
 from datetime import datetime, timedelta, timezone
 import uuid
@@ -79,7 +80,8 @@ class ActivationCodeService:
         type: Optional[str] = None,
         is_active: Optional[bool] = None,
         page: int = 1,
-        page_size: int = 20
+        page_size: int = 20,
+        cursor: Optional[str] = None
     ) -> Dict:
         """
         List activation codes.
@@ -90,9 +92,10 @@ class ActivationCodeService:
             is_active: Filter by active status
             page: Page number
             page_size: Page size
+            cursor: Opaque keyset cursor from a previous page's next_cursor
             
         Returns:
-            Dict with items and total
+            Dict with items and next_cursor
         """
         # Check admin permission
         admin = await self.user_repo.get_by_id(admin_id)
@@ -107,13 +110,15 @@ class ActivationCodeService:
             type=type,
             is_active=is_active,
             limit=page_size,
-            offset=offset
+            offset=offset,
+            cursor=parse_cursor(cursor)
         )
         
         return {
-            "items": [code.to_dict() for code in codes],
+            "items": [ActivationCode.row_to_dict(code) for code in codes],
             "page": page,
             "page_size": page_size,
+            "next_cursor": next_cursor(codes, page_size, "created_at"),
         }
     
     async def deactivate_code(self, admin_id: uuid.UUID, code: str) -> Dict:
@@ -228,22 +233,16 @@ class ActivationCodeService:
         if code_expires_in_days:
             expires_at = datetime.now(timezone.utc) + timedelta(days=code_expires_in_days)
         
-        # Generate codes
-        generated_codes = []
-        for _ in range(count):
-            code = ActivationCode.generate_code(12)
-            
-            # Create activation code
-            activation_code = await self.activation_code_repo.create(
-                code=code,
-                type=type,
-                duration_days=duration_days,
-                max_usage=max_usage,
-                created_by=admin_id,
-                expires_at=expires_at
-            )
-            
-            generated_codes.append(activation_code.to_dict())
+        # Generate codes (single multi-row INSERT)
+        activation_codes = await self.activation_code_repo.create_many(
+            codes=[ActivationCode.generate_code(12) for _ in range(count)],
+            type=type,
+            duration_days=duration_days,
+            max_usage=max_usage,
+            created_by=admin_id,
+            expires_at=expires_at
+        )
+        generated_codes = [activation_code.to_dict() for activation_code in activation_codes]
         
         return {
             "count": count,
@@ -113,8 +113,7 @@ class AuthService:
         
         # Create default folders for new user
         folder_repo = NoteFolderRepository(self.db)
-        for folder_name in settings.DEFAULT_USER_FOLDERS:
-            await folder_repo.create(str(user.id), folder_name)
+        await folder_repo.create_many(str(user.id), settings.DEFAULT_USER_FOLDERS)
         
         # Create default knowledge base for new user
         kb_repo = KnowledgeBaseRepository(self.db)
@@ -2,10 +2,12 @@
 聊天会话服务层
 """
 from typing import List, Optional
+from sqlalchemy import Row
 from uuid import UUID
 
 from repositories.chat_repository import ChatRepository
 from models.chat_session import ChatSession, ChatMessage
+from utils.pagination import Cursor
 
 
 class ChatService:
@@ -33,9 +35,15 @@ class ChatService:
             return session
         return None
     
-    async def list_sessions(self, user_id: UUID, page: int = 1, page_size: int = 50) -> List[ChatSession]:
-        """获取用户的所有会话"""
-        return await self.chat_repo.list_user_sessions(user_id, page, page_size)
+    async def list_sessions(
+        self,
+        user_id: UUID,
+        page: int = 1,
+        page_size: int = 50,
+        cursor: Optional[Cursor] = None
+    ) -> List[Row]:
+        """获取用户的所有会话（只读 Row，附带 relative_time 相对时间字符串）"""
+        return await self.chat_repo.list_user_sessions(user_id, page, page_size, cursor)
     
     async def delete_session(self, session_id: UUID, user_id: UUID) -> bool:
         """删除会话（验证所有权）"""
@@ -82,6 +90,15 @@ class ChatService:
         
         return await self.chat_repo.get_session_messages(session_id)
 
+    async def list_messages(
+        self,
+        session_id: UUID,
+        limit: int = 200,
+        cursor: Optional[Cursor] = None
+    ) -> List[ChatMessage]:
+        """分页获取会话消息（不验证所有权，调用方需先通过 get_session 校验）"""
+        return await self.chat_repo.list_session_messages(session_id, limit, cursor)
+
     async def delete_last_assistant_message(
         self,
         session_id: UUID,
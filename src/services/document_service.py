@@ -9,10 +9,12 @@ from repositories.organization_member_repository import OrganizationMemberReposi
 from utils.minio_client import upload_file, delete_file
 from utils.external_services import MineruService, DocumentProcessService
 from utils.es_utils import get_user_es_index
+from utils.pagination import Cursor, next_cursor
+from rag.service import invalidate_kb_doc_ids
 from models.document import Document
 from models.knowledge_base import KnowledgeBase
 from config.settings import settings
-from typing import List, Tuple, Optional
+from typing import AsyncIterator, Dict, List, Tuple, Optional
 import os
 import logging
 import asyncio
@@ -20,6 +22,9 @@ import uuid
 
 logger = logging.getLogger(__name__)
 
+# Max concurrent MinIO downloads per markdown batch
+MARKDOWN_BATCH_CONCURRENCY = 16
+
 
 class DocumentService:
     """Service for document operations."""
@@ -110,9 +115,7 @@ class DocumentService:
                 # 2. Organization-shared KB - check if user is in any shared organization
                 elif kb.visibility == 'organization' and user_org_ids:
                     # Check if any of user's org IDs is in the shared_to_orgs
-                    shared_org_ids = set(kb.shared_to_orgs or [])
-                    user_orgs_set = set(user_org_ids)
-                    if shared_org_ids.intersection(user_orgs_set):
+                    if kb.is_shared_with_any(user_org_ids):
                         has_access = True
                 
                 if not has_access:
@@ -285,6 +288,7 @@ class DocumentService:
             source="upload",
             file_path=file_path
         )
+        invalidate_kb_doc_ids(kb_id)
         
         # Get user's ES index name (user-level, not KB-level)
         user_es_index = get_user_es_index(user_id)
@@ -322,12 +326,12 @@ class DocumentService:
         3. Update status
         """
         # Import here to avoid circular dependency
-        from config.database import AsyncSessionLocal
+        from config.database import BackgroundSessionLocal
         from repositories.document_repository import DocumentRepository
         from repositories.kb_repository import KnowledgeBaseRepository
         
         # Create new DB session for background task
-        async with AsyncSessionLocal() as db:
+        async with BackgroundSessionLocal() as db:
             doc_repo = DocumentRepository(db)
             kb_repo = KnowledgeBaseRepository(db)
             
@@ -588,14 +592,15 @@ class DocumentService:
         kb_id: str,
         user_id: str,
         page: int = 1,
-        page_size: int = 20
-    ) -> Tuple[List[dict], int]:
-        """List documents in knowledge base (admin users can access any KB)."""
+        page_size: int = 20,
+        cursor: Optional[Cursor] = None
+    ) -> Tuple[List[dict], int, Optional[str]]:
+        """List documents in knowledge base (admin users can access any KB); also returns the next-page cursor."""
         # Verify access permission
         await self._verify_kb_access(kb_id, user_id)
         
-        documents, total = await self.doc_repo.list_documents(kb_id, page, page_size)
-        return [doc.to_dict() for doc in documents], total
+        documents, total = await self.doc_repo.list_documents(kb_id, page, page_size, cursor)
+        return [Document.row_to_dict(doc) for doc in documents], total, next_cursor(documents, page_size, "created_at")
     
     async def get_document_status(self, doc_id: str, kb_id: str, user_id: str) -> dict:
         """Get document processing status (admin users can access any KB)."""
@@ -713,10 +718,18 @@ class DocumentService:
         document_names = {}  # 🔑 新增：文档名称映射
         failed = []
         
+        # One query for all document rows; the session must not be shared
+        # across the concurrent download tasks below.
+        docs_by_id = {
+            str(doc.id): doc
+            for doc in await self.doc_repo.get_by_ids(doc_ids, kb_id)
+        }
+        sem = asyncio.Semaphore(MARKDOWN_BATCH_CONCURRENCY)
+        
         # 并发加载所有文档
         async def load_single_doc(doc_id: str):
             try:
-                doc = await self.doc_repo.get_by_id(doc_id, kb_id)
+                doc = docs_by_id.get(doc_id)
                 if not doc:
                     logger.warning(f"Document {doc_id} not found")
                     return doc_id, None, None, "not_found"
@@ -731,7 +744,8 @@ class DocumentService:
                 object_name = doc.markdown_path.replace(f"{settings.MINIO_BUCKET}/", "")
                 
                 # Download markdown from MinIO
-                markdown_bytes = await download_file(object_name)
+                async with sem:
+                    markdown_bytes = await download_file(object_name)
                 markdown_content = markdown_bytes.decode('utf-8')
                 
                 logger.info(f"Loaded markdown for doc {doc_id} ({len(markdown_content)} chars)")
@@ -770,6 +784,60 @@ class DocumentService:
             "failed": failed
         }
     
+    async def stream_documents_markdown(
+        self,
+        doc_ids: List[str],
+        kb_id: str,
+        user_id: str
+    ) -> Tuple[Dict[str, str], AsyncIterator[Tuple[str, bytes]]]:
+        """
+        Like get_documents_markdown_batch, but yields markdown as each download completes.
+        
+        Document rows are loaded up front (one query), so the returned iterator only
+        touches MinIO and can be consumed after this session is done with.
+        
+        Returns:
+            (document_names, iterator of (doc_id, markdown_bytes)); documents that are
+            missing, have no markdown, or fail to download are logged and skipped.
+        """
+        from utils.minio_client import download_file
+        
+        await self._verify_kb_access(kb_id, user_id)
+        
+        docs = await self.doc_repo.get_by_ids(doc_ids, kb_id)
+        document_names = {str(doc.id): doc.name for doc in docs}
+        object_names = {
+            str(doc.id): doc.markdown_path.replace(f"{settings.MINIO_BUCKET}/", "")
+            for doc in docs
+            if doc.markdown_path
+        }
+        skipped = len(doc_ids) - len(object_names)
+        if skipped:
+            logger.warning(f"{skipped} documents in KB {kb_id} not found or have no markdown")
+        
+        async def iter_markdown() -> AsyncIterator[Tuple[str, bytes]]:
+            sem = asyncio.Semaphore(MARKDOWN_BATCH_CONCURRENCY)
+            
+            async def load(doc_id: str, object_name: str):
+                async with sem:
+                    try:
+                        return doc_id, await download_file(object_name)
+                    except Exception as e:
+                        logger.error(f"Failed to load markdown for doc {doc_id}: {e}")
+                        return doc_id, None
+            
+            tasks = [asyncio.ensure_future(load(d, o)) for d, o in object_names.items()]
+            try:
+                for next_done in asyncio.as_completed(tasks):
+                    doc_id, markdown_bytes = await next_done
+                    if markdown_bytes:
+                        yield doc_id, markdown_bytes
+            finally:
+                for task in tasks:
+                    task.cancel()
+        
+        return document_names, iter_markdown()
+    
     async def retry_document(
         self,
         doc_id: str,
@@ -855,11 +923,11 @@ class DocumentService:
         3. Downloads necessary files
         4. Calls appropriate processing pipeline
         """
-        from config.database import AsyncSessionLocal
+        from config.database import BackgroundSessionLocal
         from repositories.document_repository import DocumentRepository
         from utils.minio_client import download_file
         
-        async with AsyncSessionLocal() as db:
+        async with BackgroundSessionLocal() as db:
             doc_repo = DocumentRepository(db)
             
             result = await db.execute(
@@ -929,11 +997,11 @@ class DocumentService:
         Retry only the chunking/embedding step when markdown already exists.
         This is much faster than re-running MinerU conversion.
         """
-        from config.database import AsyncSessionLocal
+        from config.database import BackgroundSessionLocal
         from repositories.document_repository import DocumentRepository
         from repositories.kb_repository import KnowledgeBaseRepository
         
-        async with AsyncSessionLocal() as db:
+        async with BackgroundSessionLocal() as db:
             doc_repo = DocumentRepository(db)
             kb_repo = KnowledgeBaseRepository(db)
             
@@ -1038,6 +1106,7 @@ class DocumentService:
         
         # Delete from DB
         await self.doc_repo.delete(doc)
+        invalidate_kb_doc_ids(kb_id)
         
         # Decrement KB contents count (only for successfully processed documents)
         # 只有成功处理的文档才会在处理完成时增加计数，所以删除时也只减少成功的文档
@@ -1082,6 +1151,8 @@ class DocumentService:
         
         # Move document (update kb_id)
         await self.doc_repo.update_kb_id(doc, target_kb_id)
+        invalidate_kb_doc_ids(source_kb_id)
+        invalidate_kb_doc_ids(target_kb_id)
         
         # Update contents count for both KBs (only for ready documents)
         if doc.status == Document.STATUS_READY:
@@ -8,8 +8,8 @@ from repositories.kb_subscription_repository import KBSubscriptionRepository
 from repositories.organization_member_repository import OrganizationMemberRepository
 from models.favorite import Favorite
 from models.knowledge_base import KnowledgeBase
+from models.document import Document
 from typing import List, Tuple, Optional
-import uuid
 import logging
 
 logger = logging.getLogger(__name__)
@@ -52,17 +52,9 @@ class FavoriteService:
         
         # 4. Check if KB is shared to user's organizations
         if kb.visibility == 'organization':
-            user_uuid = uuid.UUID(user_id) if isinstance(user_id, str) else user_id
-            user_org_ids = await self.org_member_repo.get_user_org_ids(user_uuid)
+            user_org_ids = await self.org_member_repo.get_user_org_ids(user_id)
             
-            if not kb.shared_to_orgs or not user_org_ids:
-                return None
-            
-            # Convert both to string sets for comparison
-            shared_org_ids = set(str(org_id) for org_id in kb.shared_to_orgs)
-            user_orgs_set = set(str(org_id) for org_id in user_org_ids)
-            
-            if shared_org_ids.intersection(user_orgs_set):
+            if kb.is_shared_with_any(user_org_ids):
                 return kb
         
         return None
@@ -94,16 +86,12 @@ class FavoriteService:
     async def unfavorite_kb(self, kb_id: str, user_id: str) -> dict:
         """Unfavorite a knowledge base."""
         # Check if this favorite was from a subscription
-        import uuid
-        user_uuid = uuid.UUID(user_id) if isinstance(user_id, str) else user_id
-        kb_uuid = uuid.UUID(kb_id) if isinstance(kb_id, str) else kb_id
-        
         from sqlalchemy import select
         favorite_result = await self.db.execute(
             select(Favorite).where(
-                Favorite.user_id == user_uuid,
+                Favorite.user_id == user_id,
                 Favorite.item_type == Favorite.ITEM_TYPE_KB,
-                Favorite.item_id == kb_uuid
+                Favorite.item_id == kb_id
             )
         )
         favorite = favorite_result.scalar_one_or_none()
@@ -122,7 +110,9 @@ class FavoriteService:
             # Use subscription_repo directly to avoid circular dependency
             if favorite and favorite.source == Favorite.SOURCE_SUBSCRIPTION:
                 try:
-                    await self.subscription_repo.unsubscribe(user_id, kb_id)
+                    # Savepoint: a failed side write must not abort the unfavorite transaction
+                    async with self.db.begin_nested():
+                        await self.subscription_repo.unsubscribe(user_id, kb_id)
                     logger.info(f"Auto-unsubscribed user {user_id} from KB {kb_id}")
                 except Exception as e:
                     logger.warning(f"Failed to auto-unsubscribe from KB {kb_id}: {e}")
@@ -181,17 +171,20 @@ class FavoriteService:
         from repositories.user_repository import UserRepository
         from repositories.organization_repository import OrganizationRepository
         
-        user_repo = UserRepository(self.db)
-        
         kbs, total = await self.favorite_repo.list_kb_favorites(user_id, page, page_size)
         
-        # Enrich with creator info
+        # Creator / organization info for the whole page in two batched queries
+        creators = await UserRepository(self.db).get_display_info(kb.owner_id for kb in kbs)
+        org_names = await OrganizationRepository(self.db).get_names(
+            kb.shared_to_orgs[0] for kb in kbs
+            if kb.visibility == 'organization' and kb.shared_to_orgs
+        )
+        
         result = []
         for kb in kbs:
-            kb_dict = kb.to_dict(include_owner=True)
+            kb_dict = KnowledgeBase.row_to_dict(kb, include_owner=True)
             
-            # Get creator info
-            creator = await user_repo.get_by_id(kb.owner_id)
+            creator = creators.get(kb.owner_id)
             if creator:
                 kb_dict['creator_name'] = creator.name
                 kb_dict['creator_avatar'] = creator.avatar
@@ -201,10 +194,9 @@ class FavoriteService:
             kb_dict['from_organization'] = kb.visibility == 'organization'
             
             if kb.visibility == 'organization' and kb.shared_to_orgs:
-                org_repo = OrganizationRepository(self.db)
-                org = await org_repo.get_by_id(kb.shared_to_orgs[0])
-                if org:
-                    kb_dict['organization_name'] = org.name
+                org_name = org_names.get(kb.shared_to_orgs[0])
+                if org_name:
+                    kb_dict['organization_name'] = org_name
             
             result.append(kb_dict)
         
@@ -222,7 +214,7 @@ class FavoriteService:
         # Enrich with KB info
         result = []
         for doc in docs:
-            doc_dict = doc.to_dict()
+            doc_dict = Document.row_to_dict(doc)
             # Get KB info
             kb = await self.db.get(KnowledgeBase, doc.kb_id)
             if kb:
@@ -1,20 +1,81 @@
 """Knowledge Base service business logic."""
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import event, select
 from fastapi import HTTPException, status
 from repositories.kb_repository import KnowledgeBaseRepository
 from repositories.document_repository import DocumentRepository
 from repositories.kb_subscription_repository import KBSubscriptionRepository
 from repositories.organization_member_repository import OrganizationMemberRepository
 from repositories.user_repository import UserRepository
+from models.knowledge_base import KnowledgeBase
 from utils.external_services import DocumentProcessService
 from utils.es_utils import get_user_es_index
+from utils.ttl_cache import TTLCache
+from rag.service import invalidate_kb_doc_ids
+from config.redis import get_redis_client
 from typing import List, Tuple, Optional
 import logging
 import uuid
 
 logger = logging.getLogger(__name__)
 
+# Public plaza listing / category stats: identical for every caller and read-heavy.
+# Serialized dicts are cached per worker; writes through this service clear it once
+# their transaction commits, and the short TTL bounds staleness for other workers
+# and for writes made elsewhere.
+_public_listing_cache = TTLCache(maxsize=512, ttl=30)
+# Bumped on every clear; a read only populates the cache if no clear happened while
+# it was querying, so a read that raced a commit cannot re-cache pre-commit rows.
+_public_listing_generation = 0
+_PUBLIC_LISTINGS_DIRTY = "public_listings_dirty"
+
+
+def _clear_public_listings() -> None:
+    global _public_listing_generation
+    _public_listing_generation += 1
+    _public_listing_cache.clear()
+
+
+def _clear_public_listings_after_commit(session) -> None:
+    session.info.pop(_PUBLIC_LISTINGS_DIRTY, None)
+    _clear_public_listings()
+
+
+def _invalidate_public_listings(db: AsyncSession) -> None:
+    """
+    Drop cached public listings once the write's transaction commits.
+    
+    Clearing before the commit would let a concurrent request re-cache the
+    pre-commit rows for a full TTL. Sessions outside a transaction clear now.
+    """
+    sync_session = db.sync_session
+    if not sync_session.in_transaction():
+        _clear_public_listings()
+    elif not sync_session.info.get(_PUBLIC_LISTINGS_DIRTY):
+        sync_session.info[_PUBLIC_LISTINGS_DIRTY] = True
+        event.listen(sync_session, "after_commit", _clear_public_listings_after_commit, once=True)
+
+
+# last_viewed_at is a low-value timestamp: write it at most once per window per (user, kb)
+LAST_VIEWED_WRITE_WINDOW = 60  # seconds
+
+
+async def _claim_last_viewed_write(user_id: str, kb_id: str) -> bool:
+    """
+    True if this view should be written to the DB (first view in the current window).
+    
+    SET NX EX in Redis coalesces repeated views across workers; if Redis is
+    unavailable, fall back to always writing.
+    """
+    try:
+        redis_client = await get_redis_client()
+        return bool(await redis_client.set(
+            f"kb:lastview:{user_id}:{kb_id}", 1, ex=LAST_VIEWED_WRITE_WINDOW, nx=True
+        ))
+    except Exception as e:
+        logger.warning(f"Redis unavailable for last-viewed throttling: {e}")
+        return True
+
 
 class KnowledgeBaseService:
     """Service for knowledge base operations."""
@@ -35,8 +96,8 @@ class KnowledgeBaseService:
         page_size: int = 20
     ) -> Tuple[List[dict], int]:
         """List knowledge bases for user."""
-        kbs, total = await self.kb_repo.list_kbs(user_id, query, page, page_size)
-        return [kb.to_dict() for kb in kbs], total
+        rows, total = await self.kb_repo.list_kbs(user_id, query, page, page_size)
+        return [KnowledgeBase.row_to_dict(row) for row in rows], total
     
     async def _verify_kb_write_access(self, kb_id: str, user_id: str) -> 'KnowledgeBase':
         """
@@ -52,7 +113,7 @@ class KnowledgeBaseService:
         from models.knowledge_base import KnowledgeBase
         
         # Check if user is admin
-        user = await self.user_repo.get_by_id(uuid.UUID(user_id))
+        user = await self.user_repo.get_by_id(user_id)
         is_admin = user and user.is_admin
         
         # Try to get as owner
@@ -89,7 +150,7 @@ class KnowledgeBaseService:
         - Everyone: can access public knowledge bases
         """
         # Check if user is admin
-        user = await self.user_repo.get_by_id(uuid.UUID(user_id))
+        user = await self.user_repo.get_by_id(user_id)
         is_admin = user and user.is_admin
         
         # Try to get as owner first
@@ -103,7 +164,7 @@ class KnowledgeBaseService:
         # If not owner and not admin, check organization-shared or public KB
         if not kb:
             # Get user's organizations
-            user_org_ids = await self.org_member_repo.get_user_org_ids(uuid.UUID(user_id))
+            user_org_ids = await self.org_member_repo.get_user_org_ids(user_id)
             
             # Try to get the KB without access check
             kb = await self.kb_repo.get_by_id_any(kb_id)
@@ -119,9 +180,7 @@ class KnowledgeBaseService:
                 # 2. Organization-shared KB - check if user is in any shared organization
                 elif kb.visibility == 'organization' and user_org_ids:
                     # Check if any of user's org IDs is in the shared_to_orgs
-                    shared_org_ids = set(kb.shared_to_orgs or [])
-                    user_orgs_set = set(user_org_ids)
-                    if shared_org_ids.intersection(user_orgs_set):
+                    if kb.is_shared_with_any(user_org_ids):
                         has_access = True
                 
                 if not has_access:
@@ -147,7 +206,8 @@ class KnowledgeBaseService:
         # Update view count and last_viewed_at for subscribed users (after serialization)
         if not is_owner and is_subscribed:
             await self.kb_repo.increment_view_count(kb_id)
-            await self.subscription_repo.update_last_viewed(user_id, kb_id)
+            if await _claim_last_viewed_write(user_id, kb_id):
+                await self.subscription_repo.update_last_viewed(user_id, kb_id)
         
         return result
     
@@ -230,6 +290,7 @@ class KnowledgeBaseService:
                 )
         
         await self.kb_repo.update(kb, **kwargs)
+        _invalidate_public_listings(self.db)
         return {"success": True}
     
     async def delete_kb(self, kb_id: str, user_id: str):
@@ -258,6 +319,8 @@ class KnowledgeBaseService:
         
         # Delete KB (will cascade delete documents in DB)
         await self.kb_repo.delete(kb)
+        _invalidate_public_listings(self.db)
+        invalidate_kb_doc_ids(kb_id)
         logger.info(f"Deleted knowledge base: {kb_id}")
     
     async def get_quota(self, user_id: str) -> dict:
@@ -306,6 +369,7 @@ class KnowledgeBaseService:
         
         # Update KB avatar with presigned URL
         await self.kb_repo.update(kb, avatar=avatar_url)
+        _invalidate_public_listings(self.db)
         
         logger.info(f"Updated KB {kb_id} avatar: {avatar_url}")
         return {"avatarUrl": avatar_url}
@@ -321,6 +385,7 @@ class KnowledgeBaseService:
         kb = await self._verify_kb_write_access(kb_id, user_id)
         
         kb = await self.kb_repo.toggle_public(kb)
+        _invalidate_public_listings(self.db)
         logger.info(f"KB {kb_id} public status: {kb.is_public}")
         return {
             "isPublic": kb.is_public,
@@ -346,6 +411,7 @@ class KnowledgeBaseService:
         
         # Subscribe
         await self.subscription_repo.subscribe(user_id, kb_id)
+        _invalidate_public_listings(self.db)
         logger.info(f"User {user_id} subscribed to KB {kb_id}")
         
         # Auto-favorite when subscribing
@@ -353,11 +419,13 @@ class KnowledgeBaseService:
         from models.favorite import Favorite
         favorite_service = FavoriteService(self.db)
         try:
-            await favorite_service.favorite_kb(
-                kb_id,
-                user_id,
-                source=Favorite.SOURCE_SUBSCRIPTION
-            )
+            # Savepoint: a failed side write must not abort the subscribe transaction
+            async with self.db.begin_nested():
+                await favorite_service.favorite_kb(
+                    kb_id,
+                    user_id,
+                    source=Favorite.SOURCE_SUBSCRIPTION
+                )
             logger.info(f"Auto-favorited KB {kb_id} for user {user_id}")
         except Exception as e:
             logger.warning(f"Failed to auto-favorite KB {kb_id}: {e}")
@@ -374,6 +442,7 @@ class KnowledgeBaseService:
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail={"error": {"code": "NOT_FOUND", "message": "Subscription not found"}}
             )
+        _invalidate_public_listings(self.db)
         
         logger.info(f"User {user_id} unsubscribed from KB {kb_id}")
         
@@ -382,23 +451,21 @@ class KnowledgeBaseService:
         from models.favorite import Favorite
         favorite_service = FavoriteService(self.db)
         try:
-            # Convert string IDs to UUID
-            user_uuid = uuid.UUID(user_id) if isinstance(user_id, str) else user_id
-            kb_uuid = uuid.UUID(kb_id) if isinstance(kb_id, str) else kb_id
-            
-            # Check if favorite exists and is from subscription
-            favorite = await self.db.execute(
-                select(Favorite).where(
-                    Favorite.user_id == user_uuid,
-                    Favorite.item_type == Favorite.ITEM_TYPE_KB,
-                    Favorite.item_id == kb_uuid,
-                    Favorite.source == Favorite.SOURCE_SUBSCRIPTION
+            # Savepoint: a failed side write must not abort the unsubscribe transaction
+            async with self.db.begin_nested():
+                # Check if favorite exists and is from subscription
+                favorite = await self.db.execute(
+                    select(Favorite).where(
+                        Favorite.user_id == user_id,
+                        Favorite.item_type == Favorite.ITEM_TYPE_KB,
+                        Favorite.item_id == kb_id,
+                        Favorite.source == Favorite.SOURCE_SUBSCRIPTION
+                    )
                 )
-            )
-            fav = favorite.scalar_one_or_none()
-            if fav:
-                await favorite_service.unfavorite_kb(kb_id, user_id)
-                logger.info(f"Auto-removed favorite KB {kb_id} for user {user_id}")
+                fav = favorite.scalar_one_or_none()
+                if fav:
+                    await favorite_service.unfavorite_kb(kb_id, user_id)
+                    logger.info(f"Auto-removed favorite KB {kb_id} for user {user_id}")
         except Exception as e:
             logger.warning(f"Failed to auto-remove favorite KB {kb_id}: {e}")
         
@@ -432,8 +499,17 @@ class KnowledgeBaseService:
         page_size: int = 20
     ) -> Tuple[List[dict], int]:
         """List public knowledge bases."""
+        cache_key = ("public", category, query, page, page_size)
+        cached = _public_listing_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        generation = _public_listing_generation
         kbs, total = await self.kb_repo.list_public_kbs(category, query, page, page_size)
-        return [kb.to_dict(include_owner=True) for kb in kbs], total
+        result = [kb.to_dict(include_owner=True) for kb in kbs], total
+        if generation == _public_listing_generation:
+            _public_listing_cache.set(cache_key, result)
+        return result
     
     async def list_featured_kbs(
         self,
@@ -446,7 +522,7 @@ class KnowledgeBaseService:
         Shows all visible knowledge bases based on user permissions.
         """
         # Get user info
-        user = await self.user_repo.get_by_id(uuid.UUID(user_id))
+        user = await self.user_repo.get_by_id(user_id)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -454,7 +530,7 @@ class KnowledgeBaseService:
             )
         
         # Get user's organizations
-        user_org_ids = await self.org_member_repo.get_user_org_ids(uuid.UUID(user_id))
+        user_org_ids = await self.org_member_repo.get_user_org_ids(user_id)
         
         # Get featured KBs with user's visibility permissions
         kbs, total = await self.kb_repo.list_featured_kbs(
@@ -465,12 +541,18 @@ class KnowledgeBaseService:
             page_size=page_size
         )
         
-        # Enrich with creator info
+        # Creator / organization info for the whole page in two batched queries
+        from repositories.organization_repository import OrganizationRepository
+        creators = await self.user_repo.get_display_info(kb.owner_id for kb in kbs)
+        org_names = await OrganizationRepository(self.db).get_names(
+            kb.shared_to_orgs[0] for kb in kbs
+            if kb.visibility == 'organization' and kb.shared_to_orgs
+        )
+        
         result = []
         for kb in kbs:
             kb_dict = kb.to_dict(include_owner=True)
-            # Get creator info
-            creator = await self.user_repo.get_by_id(kb.owner_id)
+            creator = creators.get(kb.owner_id)
             if creator:
                 kb_dict['creator_name'] = creator.name
                 kb_dict['creator_avatar'] = creator.avatar
@@ -478,18 +560,22 @@ class KnowledgeBaseService:
             kb_dict['is_admin_recommended'] = kb.visibility == 'public' or kb.is_public
             kb_dict['from_organization'] = kb.visibility == 'organization'
             if kb.visibility == 'organization' and kb.shared_to_orgs:
-                from repositories.organization_repository import OrganizationRepository
-                org_repo = OrganizationRepository(self.db)
-                org = await org_repo.get_by_id(kb.shared_to_orgs[0])
-                if org:
-                    kb_dict['organization_name'] = org.name
+                org_name = org_names.get(kb.shared_to_orgs[0])
+                if org_name:
+                    kb_dict['organization_name'] = org_name
             result.append(kb_dict)
         
         return result, total
     
     async def get_categories_stats(self) -> List[dict]:
         """Get statistics for each category."""
-        return await self.kb_repo.get_categories_stats()
+        stats = _public_listing_cache.get(("categories",))
+        if stats is None:
+            generation = _public_listing_generation
+            stats = await self.kb_repo.get_categories_stats()
+            if generation == _public_listing_generation:
+                _public_listing_cache.set(("categories",), stats)
+        return stats
     
     # ============ Organization & Visibility Features ============
     
@@ -507,7 +593,7 @@ class KnowledgeBaseService:
         - Regular users see: admin-shared public KBs + org-shared KBs from their organizations
         """
         # Get user info
-        user = await self.user_repo.get_by_id(uuid.UUID(user_id))
+        user = await self.user_repo.get_by_id(user_id)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -515,7 +601,7 @@ class KnowledgeBaseService:
             )
         
         # Get user's organizations
-        user_org_ids = await self.org_member_repo.get_user_org_ids(uuid.UUID(user_id))
+        user_org_ids = await self.org_member_repo.get_user_org_ids(user_id)
         
         # Get visible KBs based on user permissions
         kbs, total = await self.kb_repo.get_visible_kbs_for_user(
@@ -529,12 +615,25 @@ class KnowledgeBaseService:
         )
         
         # Enrich KB data with creator and badge information
+        # (creators and source orgs for the whole page in two batched queries)
+        from repositories.organization_repository import OrganizationRepository
+        user_org_set = frozenset(user_org_ids)
+        source_org_ids = {}
+        for kb in kbs:
+            if kb.visibility == 'organization' and not kb.is_public and kb.shared_to_orgs:
+                matching_orgs = kb.shared_org_set() & user_org_set
+                if matching_orgs:
+                    # Get org name (just use first matching org for simplicity)
+                    source_org_ids[kb.id] = next(iter(matching_orgs))
+        creators = await self.user_repo.get_display_info(kb.owner_id for kb in kbs)
+        org_names = await OrganizationRepository(self.db).get_names(source_org_ids.values())
+        
         result = []
         for kb in kbs:
             kb_dict = kb.to_dict(include_owner=True)
             
             # Add creator info
-            creator = await self.user_repo.get_by_id(kb.owner_id)
+            creator = creators.get(kb.owner_id)
             if creator:
                 kb_dict['creator_name'] = creator.name
                 kb_dict['creator_avatar'] = creator.avatar
@@ -547,20 +646,14 @@ class KnowledgeBaseService:
             if kb.visibility == 'public' or kb.is_public:
                 kb_dict['badge'] = 'admin_recommended'
                 kb_dict['badge_text'] = '管理员推荐'
-            elif kb.visibility == 'organization' and kb.shared_to_orgs:
-                # Find which org this KB is shared from
-                # Both kb.shared_to_orgs and user_org_ids are List[UUID]
-                matching_orgs = set(kb.shared_to_orgs) & set(user_org_ids)
-                if matching_orgs:
-                    # Get org name (just use first matching org for simplicity)
-                    from repositories.organization_repository import OrganizationRepository
-                    org_repo = OrganizationRepository(self.db)
-                    org = await org_repo.get_by_id(list(matching_orgs)[0])
-                    if org:
-                        kb_dict['badge'] = 'organization'
-                        kb_dict['badge_text'] = f'来自 {org.name}'
-                        kb_dict['source_org_name'] = org.name
-                        kb_dict['organization_name'] = org.name
+            elif kb.id in source_org_ids:
+                # Org this KB is shared from
+                org_name = org_names.get(source_org_ids[kb.id])
+                if org_name:
+                    kb_dict['badge'] = 'organization'
+                    kb_dict['badge_text'] = f'来自 {org_name}'
+                    kb_dict['source_org_name'] = org_name
+                    kb_dict['organization_name'] = org_name
             
             result.append(kb_dict)
         
@@ -586,23 +679,22 @@ class KnowledgeBaseService:
         
         # Check if setting to public (admin only)
         if visibility == 'public':
-            user = await self.user_repo.get_by_id(uuid.UUID(user_id))
+            user = await self.user_repo.get_by_id(user_id)
             if not user or not user.is_admin:
                 raise HTTPException(
                     status_code=status.HTTP_403_FORBIDDEN,
                     detail={"error": {"code": "FORBIDDEN", "message": "只有管理员可以将知识库设置为全局公开"}}
                 )
         
-        # Update visibility
-        await self.kb_repo.update_visibility(uuid.UUID(kb_id), visibility)
-        
-        # Update shared organizations if visibility is organization
+        # One mutation per request (a single UPDATE at flush)
         if visibility == 'organization' and shared_to_orgs is not None:
+            # Replaces the org list and sets visibility (private if the list is empty)
             org_uuids = [uuid.UUID(org_id) for org_id in shared_to_orgs]
             await self.kb_repo.set_shared_organizations(uuid.UUID(kb_id), org_uuids)
-        elif visibility != 'organization':
-            # Clear shared orgs if not organization visibility
-            await self.kb_repo.set_shared_organizations(uuid.UUID(kb_id), [])
+        else:
+            # Also clears shared orgs when not organization visibility
+            await self.kb_repo.update_visibility(uuid.UUID(kb_id), visibility)
+        _invalidate_public_listings(self.db)
         
         # Return updated KB
         updated_kb = await self.kb_repo.get_by_id(kb_id, user_id)
@@ -625,7 +717,7 @@ class KnowledgeBaseService:
         kb = await self._verify_kb_write_access(kb_id, user_id)
         
         # Verify user is member of all specified organizations
-        user_org_ids = await self.org_member_repo.get_user_org_ids(uuid.UUID(user_id))
+        user_org_ids = await self.org_member_repo.get_user_org_ids(user_id)
         user_org_ids_str = [str(org_id) for org_id in user_org_ids]
         
         logger.info(f"User {user_id} is member of organizations: {user_org_ids_str}")
@@ -637,12 +729,10 @@ class KnowledgeBaseService:
                     detail={"error": {"code": "INVALID_OPERATION", "message": f"您不是组织 {org_id} 的成员"}}
                 )
         
-        # Update visibility to organization
-        await self.kb_repo.update_visibility(uuid.UUID(kb_id), 'organization')
-        
-        # Share to organizations
+        # Share to organizations (also sets visibility to organization)
         org_uuids = [uuid.UUID(org_id) for org_id in org_ids]
         await self.kb_repo.share_to_organizations(uuid.UUID(kb_id), org_uuids)
+        _invalidate_public_listings(self.db)
         
         logger.info(f"Successfully shared KB {kb_id} to organizations: {org_ids}")
         
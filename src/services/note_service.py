@@ -4,6 +4,7 @@ from fastapi import HTTPException, status
 from repositories.note_repository import NoteRepository, NoteFolderRepository
 from typing import List, Tuple, Optional
 from models.note import Note, NoteFolder
+from utils.pagination import Cursor, next_cursor
 
 
 class NoteService:
@@ -20,13 +21,16 @@ class NoteService:
         folder_id: Optional[str] = None,
         query: Optional[str] = None,
         page: int = 1,
-        page_size: int = 20
-    ) -> Tuple[List[dict], int]:
-        """List notes for user."""
-        notes, total = await self.note_repo.list_notes(
-            user_id, folder_id, query, page, page_size
+        page_size: int = 20,
+        cursor: Optional[Cursor] = None,
+        include_total: bool = False
+    ) -> Tuple[List[dict], Optional[int], bool, Optional[str]]:
+        """List notes for user; also returns has_more and the next-page cursor (total only on request)."""
+        notes, total, has_more = await self.note_repo.list_notes(
+            user_id, folder_id, query, page, page_size, cursor, include_total
         )
-        return [note.to_dict() for note in notes], total
+        cursor_out = next_cursor(notes, page_size, "updated_at") if has_more else None
+        return [note.to_dict() for note in notes], total, has_more, cursor_out
     
     async def get_note(self, note_id: str, user_id: str) -> dict:
         """Get note details."""
@@ -13,6 +13,9 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# 组织码冲突时的最大重试次数
+ORG_CODE_MAX_ATTEMPTS = 5
+
 
 class OrganizationService:
     """Service for organization operations."""
@@ -70,22 +73,24 @@ class OrganizationService:
                 detail={"error": {"code": "LIMIT_EXCEEDED", "message": f"您最多只能创建 {limits['can_create']} 个组织"}}
             )
         
-        # Generate unique organization code
-        org_code = Organization.generate_org_code()
-        
-        # Ensure code is unique
-        while await self.org_repo.get_by_code(org_code):
-            org_code = Organization.generate_org_code()
-        
-        # Create organization
-        org = await self.org_repo.create(
-            owner_id=user_id,
-            name=name,
-            description=description,
-            avatar=avatar,
-            org_code=org_code,
-            max_members=limits['max_members']
-        )
+        # Create organization; on org_code collision the insert is a no-op, so retry with a new code
+        org = None
+        for _ in range(ORG_CODE_MAX_ATTEMPTS):
+            org = await self.org_repo.create(
+                owner_id=user_id,
+                name=name,
+                description=description,
+                avatar=avatar,
+                org_code=Organization.generate_org_code(),
+                max_members=limits['max_members']
+            )
+            if org:
+                break
+        if not org:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail={"error": {"code": "INTERNAL_ERROR", "message": "生成组织码失败，请重试"}}
+            )
         
         # Add owner as member with 'owner' role
         await self.member_repo.add_member(org.id, user_id, role='owner')
@@ -222,15 +227,15 @@ class OrganizationService:
         Returns:
             Success message
         """
-        org = await self.org_repo.get_by_id(org_id)
-        if not org:
+        owner_id = await self.org_repo.get_owner_id(org_id)
+        if owner_id is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail={"error": {"code": "NOT_FOUND", "message": "Organization not found"}}
             )
         
         # Check if user is owner
-        if org.owner_id != user_id:
+        if owner_id != user_id:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail={"error": {"code": "FORBIDDEN", "message": "仅组织所有者可以解散组织"}}
@@ -322,15 +327,15 @@ class OrganizationService:
         Returns:
             Success message
         """
-        org = await self.org_repo.get_by_id(org_id)
-        if not org:
+        owner_id = await self.org_repo.get_owner_id(org_id)
+        if owner_id is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail={"error": {"code": "NOT_FOUND", "message": "Organization not found"}}
             )
         
         # Check if user is owner
-        if org.owner_id == user_id:
+        if owner_id == user_id:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail={"error": {"code": "OWNER_CANNOT_LEAVE", "message": "组织所有者不能退出组织，请先解散组织"}}
@@ -393,15 +398,15 @@ class OrganizationService:
         Returns:
             Success message
         """
-        org = await self.org_repo.get_by_id(org_id)
-        if not org:
+        owner_id = await self.org_repo.get_owner_id(org_id)
+        if owner_id is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail={"error": {"code": "NOT_FOUND", "message": "Organization not found"}}
             )
         
         # Check if user is owner
-        if org.owner_id != user_id:
+        if owner_id != user_id:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail={"error": {"code": "FORBIDDEN", "message": "仅组织所有者可以移除成员"}}
@@ -441,15 +446,15 @@ class OrganizationService:
         Returns:
             Dict with new org_code
         """
-        org = await self.org_repo.get_by_id(org_id)
-        if not org:
+        owner_id = await self.org_repo.get_owner_id(org_id)
+        if owner_id is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail={"error": {"code": "NOT_FOUND", "message": "Organization not found"}}
             )
         
         # Check if user is owner
-        if org.owner_id != user_id:
+        if owner_id != user_id:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail={"error": {"code": "FORBIDDEN", "message": "仅组织所有者可以重新生成组织码"}}
@@ -482,15 +487,15 @@ class OrganizationService:
         Returns:
             Success message
         """
-        org = await self.org_repo.get_by_id(org_id)
-        if not org:
+        owner_id = await self.org_repo.get_owner_id(org_id)
+        if owner_id is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail={"error": {"code": "NOT_FOUND", "message": "Organization not found"}}
             )
         
         # Check if user is owner
-        if org.owner_id != user_id:
+        if owner_id != user_id:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail={"error": {"code": "FORBIDDEN", "message": "仅组织所有者可以设置组织码有效期"}}
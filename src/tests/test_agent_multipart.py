@@ -0,0 +1,54 @@
+"""AGENT_STREAM_UPLOAD 的 multipart 请求体能被 Agent System 的表单解析还原"""
+import asyncio
+
+import orjson
+from starlette.requests import Request
+
+from rag.agent_client import _iter_multipart
+
+
+def _parse_form(boundary: bytes, meta: bytes, documents):
+    """把 _iter_multipart 的输出交给 Starlette 表单解析（与 Agent /query/stream 相同）"""
+    async def run():
+        body = [chunk async for chunk in _iter_multipart(boundary, meta, documents)]
+
+        async def receive():
+            if body:
+                return {"type": "http.request", "body": body.pop(0), "more_body": bool(body)}
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        request = Request({
+            "type": "http",
+            "method": "POST",
+            "headers": [(b"content-type", b"multipart/form-data; boundary=" + boundary)],
+        }, receive)
+        form = await request.form()
+        uploads = {
+            upload.filename: (await upload.read()).decode("utf-8")
+            for upload in form.getlist("documents")
+        }
+        return orjson.loads(form["meta"]), uploads
+    return asyncio.run(run())
+
+
+def test_meta_and_documents_round_trip():
+    meta = orjson.dumps({"user_query": "对比这两篇", "document_contents": None})
+
+    async def documents():
+        # 与 stream_documents_markdown 一样按下载完成顺序产出
+        yield "doc-2", "# 第二篇\n\r\n--正文".encode()
+        yield "doc-1", b"first"
+
+    parsed_meta, uploads = _parse_form(b"0123456789abcdef", meta, documents())
+    assert parsed_meta == {"user_query": "对比这两篇", "document_contents": None}
+    assert uploads == {"doc-1": "first", "doc-2": "# 第二篇\n\r\n--正文"}
+
+
+def test_meta_only_when_no_documents_load():
+    async def documents():
+        return
+        yield
+
+    parsed_meta, uploads = _parse_form(b"feedface", orjson.dumps({"user_query": "q"}), documents())
+    assert parsed_meta == {"user_query": "q"}
+    assert uploads == {}
@@ -0,0 +1,56 @@
+"""coalesce_sse 合并 SSE token 帧的行为"""
+import asyncio
+
+import pytest
+
+from rag.controller import coalesce_sse, sse_frame
+from rag.schemas import StreamChunk
+
+
+def _collect(chunks, window=0.05):
+    """运行 coalesce_sse，返回 (已写出的字节, 抛出的异常)"""
+    async def run():
+        out = []
+        try:
+            async for frame in coalesce_sse(chunks, window=window):
+                out.append(frame)
+        except Exception as e:
+            return b"".join(out), e
+        return b"".join(out), None
+    return asyncio.run(run())
+
+
+def test_coalesces_tokens_and_keeps_order():
+    tokens = [StreamChunk(type="token", content=c) for c in "abc"]
+    done = StreamChunk(type="done", content="")
+
+    async def chunks():
+        for chunk in (*tokens, done):
+            yield chunk
+
+    out, error = _collect(chunks())
+    assert error is None
+    assert out == b"".join(sse_frame(chunk) for chunk in (*tokens, done))
+
+
+def test_flushes_buffered_tokens_when_upstream_fails():
+    token = StreamChunk(type="token", content="partial")
+
+    async def chunks():
+        yield token
+        raise RuntimeError("agent disconnected")
+
+    out, error = _collect(chunks(), window=10)
+    assert isinstance(error, RuntimeError)
+    assert out == sse_frame(token)
+
+
+@pytest.mark.parametrize("window", [0, 0.05])
+def test_upstream_failure_before_any_token(window):
+    async def chunks():
+        raise RuntimeError("boom")
+        yield  # pragma: no cover
+
+    out, error = _collect(chunks(), window=window)
+    assert isinstance(error, RuntimeError)
+    assert out == b""
@@ -4,6 +4,7 @@ from minio.error import S3Error
 from io import BytesIO
 from datetime import timedelta
 from config.settings import settings
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
@@ -62,6 +63,15 @@ async def upload_file(object_name: str, file_data: bytes, content_type: str = "a
         raise Exception(f"Failed to upload file: {e}")
 
 
+def _download_file_sync(object_name: str) -> bytes:
+    response = minio_client.get_object(settings.MINIO_BUCKET, object_name)
+    try:
+        return response.read()
+    finally:
+        response.close()
+        response.release_conn()
+
+
 async def download_file(object_name: str) -> bytes:
     """
     Download file from MinIO.
@@ -73,11 +83,8 @@ async def download_file(object_name: str) -> bytes:
         File data as bytes
     """
     try:
-        response = minio_client.get_object(settings.MINIO_BUCKET, object_name)
-        data = response.read()
-        response.close()
-        response.release_conn()
-        return data
+        # minio SDK is blocking; run it in a worker thread so concurrent downloads overlap
+        return await asyncio.to_thread(_download_file_sync, object_name)
     
     except S3Error as e:
         logger.error(f"Error downloading file {object_name}: {e}")
@@ -0,0 +1,46 @@
+"""Keyset (cursor) pagination helpers."""
+import base64
+import uuid
+from datetime import datetime
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, status
+
+Cursor = Tuple[datetime, uuid.UUID]
+
+
+def encode_cursor(sort_value: datetime, row_id) -> str:
+    """Encode the (sort column, id) of the last row on a page as an opaque cursor."""
+    raw = f"{sort_value.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str) -> Cursor:
+    """Inverse of encode_cursor; raises ValueError on malformed input."""
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        sort_value, row_id = base64.urlsafe_b64decode(padded).decode().split("|", 1)
+    except Exception as e:
+        raise ValueError(f"Malformed cursor: {e}") from e
+    return datetime.fromisoformat(sort_value), uuid.UUID(row_id)
+
+
+def parse_cursor(cursor: Optional[str]) -> Optional[Cursor]:
+    """Decode an optional cursor query parameter, mapping bad input to 400."""
+    if not cursor:
+        return None
+    try:
+        return decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"error": {"code": "INVALID_CURSOR", "message": "Invalid pagination cursor"}}
+        )
+
+
+def next_cursor(rows: list, page_size: int, sort_attr: str) -> Optional[str]:
+    """Cursor for the page after `rows`, or None when this page is the last one."""
+    if len(rows) < page_size:
+        return None
+    last = rows[-1]
+    return encode_cursor(getattr(last, sort_attr), last.id)
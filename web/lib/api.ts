@@ -739,7 +739,7 @@ export const noteAPI = {
     const params = new URLSearchParams({ page: page.toString(), pageSize: pageSize.toString() });
     if (folderId) params.append('folderId', folderId);
     if (query) params.append('query', query);
-    return request<{ total: number; page: number; pageSize: number; items: any[] }>(
+    return request<{ total: number | null; page: number; pageSize: number; items: any[]; hasMore: boolean; nextCursor: string | null }>(
       `/notes?${params}`,
       { method: 'GET' }
     );
@@ -983,10 +983,10 @@ export const chatAPI = {
   },
 
   /**
-   * 获取会话的所有消息
+   * 获取会话的所有消息（服务端按 keyset 分页，这里逐页取完）
    */
   async getChatMessages(sessionId: string) {
-    return request<{
+    type ChatMessagePage = {
       messages: Array<{
         id: string;
         role: string;
@@ -1003,7 +1003,21 @@ export const chatAPI = {
           from_cache: boolean;
         }>;
       }>;
-    }>(`/chat/sessions/${sessionId}/messages`, { method: 'GET' });
+      nextCursor: string | null;
+    };
+    const messages: ChatMessagePage['messages'] = [];
+    let cursor: string | null = null;
+    do {
+      const params = new URLSearchParams({ limit: '200' });
+      if (cursor) params.append('cursor', cursor);
+      const page: ChatMessagePage = await request<ChatMessagePage>(
+        `/chat/sessions/${sessionId}/messages?${params}`,
+        { method: 'GET' }
+      );
+      messages.push(...page.messages);
+      cursor = page.nextCursor;
+    } while (cursor);
+    return { messages };
   },
 
   /**